@@ -0,0 +1,177 @@
+""" Benchmark of the planning -> evaluation -> tool choice loop, offline
+
+The LLM is a FakeLLM with scripted, deterministic replies, so with the
+default zero latency this measures the overhead of the agents themselves
+(prompt rendering, memo, streaming, parsing), and with --latency how much
+of the model's latency the sequential and concurrent loops hide. Neither the
+disk cache nor the rate limits are used. With --trace, every request is
+traced (see gpt_text_gym.gpt.trace) and summarized per agent; with --profile,
+the time spent in each phase of the loop (see gpt_text_gym.profiling) is.
+Planned goals are mostly ones the spatial index can check (see
+gpt_text_gym.envs.minigrid.spatial); --no-resolver sends every check to the
+evaluation agent instead. Each episode is planned in one decomposition
+call, cached per mission and scene; --no-plan asks the planning agent for
+every goal instead. Goals are only evaluated after steps that changed the
+state they depend on; --no-filter evaluates after every step.
+
+Run from the repository root with `python -m benchmarks.bench_agent_loop`.
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import random
+import re
+import time
+
+from typing import List
+from minigrid.core.actions import Actions
+from gpt_text_gym.examples import minigrid_tools
+from gpt_text_gym.gpt import (
+    FakeLLM,
+    PromptMemo,
+    RawMessage,
+    RequestScheduler,
+    load_trace,
+    summarize_trace,
+    tracing,
+)
+from gpt_text_gym.profiling import count, profiling, timer
+from gpt_text_gym.runner import EpisodeRunner
+
+
+def scripted_reply(messages: List[RawMessage]) -> str:
+    """Replies of each agent, varying with (a hash of) the prompt"""
+    prompt = messages[-1]["content"]
+    bucket = int(hashlib.md5(prompt.encode()).hexdigest(), 16) % 10
+    if "Identify the appropriate tool" in prompt:
+        return (
+            "Rationale: the coordinates of both objects.\n"
+            "Next tool to use: is_next_to((1, 2), (2, 3))\n"
+            "Anything after the tool is never streamed."
+        )
+    mission = re.search(r"put the (\w+ \w+) near the (\w+ \w+)", prompt)
+    if "Describe a sequence of intermediate objectives" in prompt:
+        moved, target = mission.groups()
+        return (
+            f"Thought: I need to carry the {moved} to the {target}.\n"
+            "The objectives are:\n"
+            f"1. pick up the {moved}\n"
+            f"2. go to the {target}\n"
+            f"3. put down the {moved}"
+        )
+    if "Answer the question" in prompt:
+        if "The result of" in prompt or bucket >= 4:
+            return "no"
+        return "yes" if bucket < 2 else "need more information"
+    if mission is None or bucket >= 8:
+        return f"go to object {bucket}"
+    moved, target = mission.groups()
+    if bucket < 3:
+        return f"pick up the {moved}"
+    if bucket < 6:
+        return f"put the {moved} near the {target}"
+    return f"go to the {moved}"
+
+
+def run_sequential(steps: int, seed: int) -> int:
+    """minigrid_tools.main without rendering, for `steps` steps"""
+    rng = random.Random(seed)
+    env = minigrid_tools.make_env()
+    obs, _ = env.reset(seed=seed)
+    previous_goal = ""
+    plan, current_goal = minigrid_tools.plan_episode(env, obs)
+    evaluation_filter = minigrid_tools.make_evaluation_filter()
+    for _ in range(steps):
+        with timer("env.step"):
+            obs, _, terminated, truncated, _ = env.step(rng.randrange(len(Actions)))
+        count("steps")
+        evaluation = minigrid_tools.filtered_evaluation(
+            env, obs, current_goal, evaluation_filter
+        )
+        if evaluation == "yes":
+            previous_goal = current_goal
+            current_goal = minigrid_tools.next_goal(env, obs, plan, previous_goal)
+        if terminated or truncated:
+            obs, _ = env.reset()
+            previous_goal = ""
+            plan, current_goal = minigrid_tools.plan_episode(env, obs)
+            evaluation_filter.reset()
+    return steps
+
+
+def run_concurrent(steps: int, seed: int, episodes: int) -> int:
+    """EpisodeRunner with PutNearAgent, `steps` steps in total"""
+    runner = EpisodeRunner(
+        minigrid_tools.make_env,
+        minigrid_tools.PutNearAgent,
+        max_steps=max(1, steps // episodes),
+        max_concurrency=episodes,
+        observe=minigrid_tools.observe_env,
+    )
+    results = runner.run(range(seed, seed + episodes))
+    assert all(result.error is None for result in results), results
+    return sum(result.steps for result in results)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--steps", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--episodes", type=int, default=16)
+    parser.add_argument("--no-memo", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-resolver", action="store_true")
+    parser.add_argument("--no-plan", action="store_true")
+    parser.add_argument("--no-filter", action="store_true")
+    parser.add_argument("--trace", help="JSON Lines file to trace requests to")
+    parser.add_argument("--profile", action="store_true")
+    parser.add_argument("--chrome-trace", help="Chrome trace file of the phases")
+    args = parser.parse_args()
+
+    minigrid_tools.COMPLETION_CACHE = None
+    minigrid_tools.OPENAI_SCHEDULER = RequestScheduler()
+    minigrid_tools.RESOLVE_GOALS_LOCALLY = not args.no_resolver
+    minigrid_tools.PLAN_EPISODES = not args.no_plan
+    minigrid_tools.FILTER_EVALUATIONS = not args.no_filter
+
+    print(
+        f"{'loop':>12} {'steps':>6} {'prompts':>8} {'requests':>9}"
+        f" {'steps/s':>9} {'prompts/s':>10} {'requests/s':>11}"
+    )
+    modes = {
+        "sequential": lambda: run_sequential(args.steps, args.seed),
+        "concurrent": lambda: run_concurrent(args.steps, args.seed, args.episodes),
+    }
+    for name, run in modes.items():
+        memo = PromptMemo(max_size=0 if args.no_memo else 1024)
+        minigrid_tools.PROMPT_MEMO = memo
+        minigrid_tools.PLAN_CACHE = PromptMemo()
+        llm = FakeLLM(respond=scripted_reply, latency=args.latency)
+        minigrid_tools.LLM_BACKEND = llm
+        trace_path = f"{args.trace}.{name}" if args.trace else None
+        tracer = tracing(trace_path) if trace_path else contextlib.nullcontext()
+        profile = args.profile or args.chrome_trace is not None
+        profiler = (
+            profiling(trace_events=args.chrome_trace is not None)
+            if profile
+            else contextlib.nullcontext()
+        )
+        with contextlib.redirect_stdout(io.StringIO()), tracer, profiler as profiler:
+            start = time.perf_counter()
+            steps = run()
+            elapsed = time.perf_counter() - start
+        prompts = sum(memo.hits.values()) + sum(memo.misses.values())
+        print(
+            f"{name:>12} {steps:>6} {prompts:>8} {llm.calls:>9}"
+            f" {steps / elapsed:>9.1f} {prompts / elapsed:>10.1f}"
+            f" {llm.calls / elapsed:>11.1f}"
+        )
+        if trace_path:
+            print(summarize_trace(load_trace(trace_path)))
+        if profile:
+            print(profiler.summary())
+        if args.chrome_trace is not None:
+            profiler.write_chrome_trace(f"{args.chrome_trace}.{name}")
@@ -0,0 +1,45 @@
+""" Micro-benchmark of minigrid_tools.describe_environment across grid sizes
+
+Run from the repository root with `python -m benchmarks.bench_describe`.
+"""
+
+import argparse
+import timeit
+
+from minigrid.core.actions import Actions
+from gpt_text_gym.examples import minigrid_tools
+
+
+def bench(fn, number: int) -> float:
+    """Best-of-5 seconds per call"""
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number
+
+
+def step_and_describe(env, action) -> str:
+    obs, *_ = env.step(action)
+    return minigrid_tools.describe_environment(env, obs)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[6, 8, 16, 32])
+    parser.add_argument("--number", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(
+        f"{'grid':>8} {'objects':>8} {'get_objects (us)':>17} {'step (us)':>10}"
+        f" {'step + describe (us)':>21}"
+    )
+    for size in args.sizes:
+        env = minigrid_tools.PutNearEnv(size=size, numObjs=min(2 + size // 4, 6))
+        obs, _ = env.reset(seed=args.seed)
+        objects = bench(lambda: minigrid_tools.get_objects(env), args.number)
+        # Turning in place: a real step that leaves the grid unchanged
+        step = bench(lambda: env.step(Actions.left), args.number)
+        describe = bench(lambda: step_and_describe(env, Actions.left), args.number)
+        print(
+            f"{size:>3}x{size:<4} {len(minigrid_tools.get_objects(env)):>8}"
+            f" {objects * 1e6:>17.1f} {step * 1e6:>10.1f} {describe * 1e6:>21.1f}"
+        )
@@ -0,0 +1,99 @@
+""" Benchmark of get_grid_objects against the old str(env)-scraping parser
+
+Run from the repository root with `python -m benchmarks.bench_grid_objects`.
+"""
+
+import argparse
+import timeit
+
+import gymnasium as gym
+
+from typing import List
+from minigrid.envs import PutNearEnv
+from gpt_text_gym.envs.minigrid.parse_obs import get_grid_objects
+
+
+def get_objects_from_string(env: gym.Env) -> List[str]:
+    """Previous minigrid_tools.get_objects; only correct for 6x6 grids"""
+
+    env_str = str(env.unwrapped)
+
+    objects = []
+    OBJECT_TO_STR = {
+        "wall": "W",
+        "floor": "F",
+        "door": "D",
+        "key": "K",
+        "ball": "A",
+        "box": "B",
+        "goal": "G",
+        "lava": "V",
+    }
+    STR_TO_OBJECT = {v: k for k, v in OBJECT_TO_STR.items()}
+
+    # Map agent's direction to short string
+    AGENT_DIR_TO_STR = {0: ">", 1: "V", 2: "<", 3: "^"}
+    STR_TO_AGENT_DIR = {v: k for k, v in AGENT_DIR_TO_STR.items()}
+
+    # Map of colors to short string
+    COLOR_TO_STR = {
+        "red": "R",
+        "green": "G",
+        "blue": "B",
+        "purple": "P",
+        "yellow": "Y",
+    }
+    STR_TO_COLOR = {v: k for k, v in COLOR_TO_STR.items()}
+
+    rows = env_str.split("\n")
+    n_rows = 6
+    n_cols = 6
+    for row in range(n_rows):
+        for col in range(n_cols):
+            cell = rows[row][2 * col : 2 * col + 2]
+            if cell == "  ":
+                continue
+            elif cell[0] in STR_TO_AGENT_DIR and cell[0] == cell[1]:
+                continue
+            elif cell[0] in ("W", "F", "V"):
+                continue
+            else:
+                object_type = STR_TO_OBJECT[cell[0]]
+                object_color = STR_TO_COLOR[cell[1]]
+                object_name = f"{object_color} {object_type}"
+            objects.append(object_name)
+
+    return objects
+
+
+def get_objects_from_grid(env: gym.Env) -> List[str]:
+    return [obj.name for obj in get_grid_objects(env.unwrapped.grid)]
+
+
+def bench(fn, env: gym.Env, number: int) -> float:
+    """Best-of-5 seconds per call"""
+    return min(timeit.repeat(lambda: fn(env), number=number, repeat=5)) / number
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[6, 8, 16, 32])
+    parser.add_argument("--number", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'grid':>8} {'str(env) (us)':>14} {'grid (us)':>10} {'speedup':>8}")
+    for size in args.sizes:
+        env = PutNearEnv(size=size, numObjs=min(2 + size // 4, 6))
+        env.reset(seed=args.seed)
+        grid = bench(get_objects_from_grid, env, args.number)
+        if size == 6:
+            assert get_objects_from_string(env) == get_objects_from_grid(env)
+            string = bench(get_objects_from_string, env, args.number)
+            print(
+                f"{size:>3}x{size:<4} {string * 1e6:>14.1f} {grid * 1e6:>10.1f}"
+                f" {string / grid:>7.1f}x"
+            )
+        else:
+            print(f"{size:>3}x{size:<4} {'n/a':>14} {grid * 1e6:>10.1f} {'':>8}")
@@ -0,0 +1,68 @@
+""" Micro-benchmark of parse_obs.get_objects across grid sizes
+
+Run from the repository root with `python -m benchmarks.bench_parse_obs`.
+"""
+
+import argparse
+import timeit
+
+import numpy as np
+
+from gpt_text_gym.envs.minigrid.parse_obs import (
+    get_object_array,
+    get_objects,
+    get_objects_batch,
+    get_objects_reference,
+)
+
+
+def random_img_obs(size: int, rng: np.random.Generator) -> np.ndarray:
+    """Random (size, size, 3) observation with valid object/color/state ids"""
+    return np.stack(
+        [
+            rng.integers(0, 11, (size, size)),
+            rng.integers(0, 6, (size, size)),
+            rng.integers(0, 3, (size, size)),
+        ],
+        axis=-1,
+    ).astype(np.uint8)
+
+
+def bench(fn, img_obs: np.ndarray, number: int) -> float:
+    """Best-of-5 seconds per call"""
+    return min(timeit.repeat(lambda: fn(img_obs), number=number, repeat=5)) / number
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[7, 11, 19, 25, 35])
+    parser.add_argument("--number", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'grid':>8} {'reference (us)':>15} {'vectorized (us)':>16} {'speedup':>8}")
+    for size in args.sizes:
+        img_obs = random_img_obs(size, rng)
+        assert get_objects(img_obs) == get_objects_reference(img_obs)
+        reference = bench(get_objects_reference, img_obs, max(1, args.number // 10))
+        vectorized = bench(get_objects, img_obs, args.number)
+        print(
+            f"{size:>3}x{size:<4} {reference * 1e6:>15.1f} {vectorized * 1e6:>16.1f}"
+            f" {reference / vectorized:>7.1f}x"
+        )
+
+    print(f"\nbatch of {args.batch_size} observations (ms per batch)")
+    print(f"{'grid':>8} {'loop':>8} {'batch':>8} {'array':>8}")
+    for size in args.sizes:
+        batch = np.stack([random_img_obs(size, rng) for _ in range(args.batch_size)])
+        number = max(1, args.number // 10)
+        loop = bench(lambda b: [get_objects(obs) for obs in b], batch, number)
+        batched = bench(get_objects_batch, batch, number)
+        array = bench(get_object_array, batch, number)
+        print(
+            f"{size:>3}x{size:<4} {loop * 1e3:>8.2f} {batched * 1e3:>8.2f}"
+            f" {array * 1e3:>8.2f}"
+        )
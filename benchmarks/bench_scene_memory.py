@@ -0,0 +1,45 @@
+""" Memory used by stored scenes: lists of strings vs Scene
+
+Run from the repository root with `python -m benchmarks.bench_scene_memory`.
+"""
+
+import argparse
+import tracemalloc
+
+import numpy as np
+
+from benchmarks.bench_parse_obs import random_img_obs
+from gpt_text_gym.envs.minigrid.parse_obs import get_objects
+from gpt_text_gym.envs.minigrid.scene import Scene
+
+
+def measure(build, observations) -> int:
+    """Bytes still allocated after storing build(obs) for every observation"""
+    tracemalloc.start()
+    stored = [build(obs) for obs in observations]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del stored
+    return current
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenes", type=int, default=10_000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[7, 19])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    exclude = ("unseen", "empty", "wall")
+    print(f"memory for {args.scenes} stored scenes (MiB)")
+    print(f"{'grid':>8} {'strings':>9} {'Scene':>9} {'ratio':>7}")
+    for size in args.sizes:
+        observations = [random_img_obs(size, rng) for _ in range(args.scenes)]
+        strings = measure(lambda obs: get_objects(obs, exclude), observations)
+        scenes = measure(lambda obs: Scene.from_img_obs(obs, exclude), observations)
+        print(
+            f"{size:>3}x{size:<4} {strings / 2**20:>9.1f} {scenes / 2**20:>9.1f}"
+            f" {strings / scenes:>6.1f}x"
+        )
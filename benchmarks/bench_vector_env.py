@@ -0,0 +1,41 @@
+""" Benchmark of PutNearVectorEnv against SyncVectorEnv over PutNearEnv
+
+Run from the repository root with `python -m benchmarks.bench_vector_env`.
+"""
+
+import argparse
+import time
+
+import gymnasium as gym
+import numpy as np
+
+from gpt_text_gym.envs.minigrid.vector import PutNearVectorEnv
+from gpt_text_gym.examples.minigrid_tools import PutNearEnv
+
+
+def bench(env: gym.vector.VectorEnv, steps: int, seed: int) -> float:
+    """Environment steps per second, autoresets included"""
+    env.reset(seed=seed)
+    rng = np.random.default_rng(seed)
+    actions = rng.integers(0, 7, (steps, env.num_envs))
+    start = time.perf_counter()
+    for step_actions in actions:
+        env.step(step_actions)
+    return steps * env.num_envs / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-envs", type=int, nargs="+", default=[1, 16, 256])
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'envs':>6} {'sync (steps/s)':>15} {'vector (steps/s)':>17} {'speedup':>8}")
+    for num_envs in args.num_envs:
+        sync = bench(
+            gym.vector.SyncVectorEnv([PutNearEnv] * num_envs), args.steps, args.seed
+        )
+        vector = bench(PutNearVectorEnv(num_envs), args.steps, args.seed)
+        print(f"{num_envs:>6} {sync:>15.0f} {vector:>17.0f} {vector / sync:>7.1f}x")
@@ -1,4 +1,4 @@
 """
 GPT for text-based Gym environments
 """
-from gpt_text_gym.config import ROOT_DIR, __version__
+from gpt_text_gym.config import ROOT_DIR, __version__, get_api_key
@@ -1,4 +1,15 @@
+import functools
+
 from pathlib import Path
+from typing import Optional
 
 ROOT_DIR: Path = Path(__file__).parent.parent.absolute()
 __version__ = "0.0.1"
+
+
+@functools.lru_cache(maxsize=None)
+def get_api_key() -> Optional[str]:
+    """API_KEY from the .env file at the repository root, read once per process"""
+    import dotenv
+
+    return dotenv.get_key(ROOT_DIR / ".env", "API_KEY")
@@ -1,15 +1,179 @@
 """ Utilities to parse the observation """
 
+import functools
 import minigrid
 import numpy as np
 import gymnasium as gym
 
+from dataclasses import dataclass
+from typing import List, Sequence
+from minigrid.core.grid import Grid
 from minigrid.minigrid_env import MiniGridEnv
-from minigrid.core.constants import IDX_TO_OBJECT, IDX_TO_COLOR
+from minigrid.core.constants import (
+    IDX_TO_OBJECT,
+    IDX_TO_COLOR,
+    OBJECT_TO_IDX,
+    STATE_TO_IDX,
+)
 
+IDX_TO_STATE = {v: k for k, v in STATE_TO_IDX.items()}
+DOOR_IDX = OBJECT_TO_IDX["door"]
 
-def get_objects(img_obs: np.ndarray):
-    """Parse Minigrid observation"""
+
+def _build_prefix_table() -> np.ndarray:
+    """Text of every (object, color, state) triple, e.g. 'closed red door'"""
+    table = np.empty(
+        (len(IDX_TO_OBJECT), len(IDX_TO_COLOR), len(IDX_TO_STATE)), dtype=object
+    )
+    for obj_idx, type in IDX_TO_OBJECT.items():
+        for color_idx, color in IDX_TO_COLOR.items():
+            for state_idx, state in IDX_TO_STATE.items():
+                text = type
+                if type != "unseen":
+                    text = f"{color} {text}"
+                if type == "door":
+                    text = f"{state} {text}"
+                table[obj_idx, color_idx, state_idx] = text
+    table.flags.writeable = False
+    return table
+
+
+# Indexed by (obj_idx, color_idx, state_idx); state is only meaningful for doors
+PREFIX_TABLE = _build_prefix_table()
+
+
+@functools.lru_cache(maxsize=None)
+def _coordinate_table(rows: int, cols: int) -> np.ndarray:
+    """Suffix ' at (row, col)' of every cell of a (rows, cols) grid"""
+    table = np.empty((rows, cols), dtype=object)
+    for row in range(rows):
+        for col in range(cols):
+            table[row, col] = f" at ({row}, {col})"
+    table.flags.writeable = False
+    return table
+
+
+# One row per object of a batch of observations, see get_object_array
+OBJECT_DTYPE = np.dtype(
+    [
+        ("env", np.int32),
+        ("type", np.uint8),
+        ("color", np.uint8),
+        ("state", np.uint8),
+        ("row", np.int16),
+        ("col", np.int16),
+    ]
+)
+
+
+def _state_idx(img_obs: np.ndarray) -> np.ndarray:
+    """State channel with everything but door states zeroed out"""
+    return np.where(img_obs[..., 0] == DOOR_IDX, img_obs[..., 2], 0)
+
+
+def _keep_mask(img_obs: np.ndarray, exclude: Sequence[str]) -> np.ndarray:
+    """True for every cell whose type is not listed in `exclude`"""
+    return ~np.isin(img_obs[..., 0], [OBJECT_TO_IDX[type] for type in exclude])
+
+
+def get_objects(img_obs: np.ndarray, exclude: Sequence[str] = ()) -> List[str]:
+    """Parse Minigrid observation
+
+    Works on the whole (rows, cols, 3) image at once: every cell is looked up in
+    PREFIX_TABLE and strings are only built for cells whose type is not listed
+    in `exclude` (e.g. ("unseen", "empty", "wall")).
+    """
+    rows, cols, _ = img_obs.shape
+    prefixes = PREFIX_TABLE[img_obs[..., 0], img_obs[..., 1], _state_idx(img_obs)]
+    coordinates = _coordinate_table(rows, cols)
+    if exclude:
+        keep = _keep_mask(img_obs, exclude)
+        prefixes, coordinates = prefixes[keep], coordinates[keep]
+    return (prefixes + coordinates).ravel().tolist()
+
+
+def get_objects_batch(
+    img_obs: np.ndarray, exclude: Sequence[str] = ()
+) -> List[List[str]]:
+    """Parse a stacked (N, rows, cols, 3) observation from a vector env
+
+    Equivalent to [get_objects(obs, exclude) for obs in img_obs], but all N
+    observations are parsed in a single vectorized pass.
+    """
+    n_envs, rows, cols, _ = img_obs.shape
+    prefixes = PREFIX_TABLE[img_obs[..., 0], img_obs[..., 1], _state_idx(img_obs)]
+    coordinates = np.broadcast_to(_coordinate_table(rows, cols), prefixes.shape)
+    if not exclude:
+        return (prefixes + coordinates).reshape(n_envs, rows * cols).tolist()
+
+    keep = _keep_mask(img_obs, exclude)
+    texts = (prefixes[keep] + coordinates[keep]).tolist()
+    ends = np.cumsum(keep.reshape(n_envs, rows * cols).sum(axis=1)).tolist()
+    return [texts[start:end] for start, end in zip([0] + ends[:-1], ends)]
+
+
+def get_object_array(img_obs: np.ndarray, exclude: Sequence[str] = ()) -> np.ndarray:
+    """Parse a stacked (N, rows, cols, 3) observation into a structured array
+
+    Returns one OBJECT_DTYPE record per kept cell, ordered by env then row-major
+    cell position. No strings are built; PREFIX_TABLE[type, color, state] gives
+    the text of a record when it is needed.
+    """
+    keep = _keep_mask(img_obs, exclude)
+    env, row, col = np.nonzero(keep)
+    cells = img_obs[keep]
+
+    objects = np.empty(len(env), dtype=OBJECT_DTYPE)
+    objects["env"] = env
+    objects["type"] = cells[:, 0]
+    objects["color"] = cells[:, 1]
+    objects["state"] = np.where(cells[:, 0] == DOOR_IDX, cells[:, 2], 0)
+    objects["row"] = row
+    objects["col"] = col
+    return objects
+
+
+# Grid cells that get_grid_objects skips by default
+BACKGROUND_TYPES = ("empty", "wall", "floor", "lava")
+
+
+@dataclass(frozen=True)
+class GridObject:
+    type: str
+    color: str
+    # "open", "closed" or "locked" for doors, "" otherwise
+    state: str
+    x: int
+    y: int
+
+    @property
+    def name(self) -> str:
+        return f"{self.color} {self.type}"
+
+    def __str__(self):
+        return f"{self.name} at ({self.x}, {self.y})"
+
+
+def get_grid_objects(
+    grid: Grid, exclude: Sequence[str] = BACKGROUND_TYPES
+) -> List[GridObject]:
+    """Objects on a Minigrid grid (e.g. env.unwrapped.grid), in row-major order
+
+    Reads the grid's object list directly instead of rendering it to text, so
+    it works for any grid size. The agent is not part of the grid.
+    """
+    objects = []
+    for idx, obj in enumerate(grid.grid):
+        if obj is None or obj.type in exclude:
+            continue
+        y, x = divmod(idx, grid.width)
+        state = IDX_TO_STATE[obj.encode()[2]] if obj.type == "door" else ""
+        objects.append(GridObject(obj.type, obj.color, state, x, y))
+    return objects
+
+
+def get_objects_reference(img_obs: np.ndarray) -> List[str]:
+    """Per-cell implementation of get_objects, kept for testing and benchmarking"""
     rows, cols, _ = img_obs.shape
 
     objects = []
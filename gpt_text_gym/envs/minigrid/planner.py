@@ -0,0 +1,118 @@
+""" Episode plans in the format of descriptions/decomposition_template.txt
+
+The template asks for the whole list of objectives for a mission at once
+("1. pick up the red key", "2. go to the blue ball", ...). This module
+renders that prompt, parses the reply into Subgoals, and computes the scene
+signature under which a plan can be reused.
+"""
+
+import dataclasses
+import functools
+import re
+
+from pathlib import Path
+from typing import Hashable, List, Optional, Tuple
+from gpt_text_gym.envs.minigrid.parse_obs import GridObject
+from gpt_text_gym.envs.minigrid.spatial import SpatialIndex, normalize_name
+
+DECOMPOSITION_TEMPLATE_PATH = (
+    Path(__file__).parent / "descriptions" / "decomposition_template.txt"
+)
+# Rule 2 of the template
+ALLOWED_VERBS = ("go to", "pick up", "put down", "open", "close")
+
+_PLACEHOLDER = re.compile(r"^\.\.\.$", re.MULTILINE)
+_OBJECTIVES = re.compile(r"the objectives are:", re.IGNORECASE)
+_NUMBERED = re.compile(r"^\s*\[?\s*\d+\s*[.)]\s*(.+?)\]?\s*$", re.MULTILINE)
+_OBJECTIVE = re.compile(
+    rf"^({'|'.join(ALLOWED_VERBS)})\s+(?:the\s+)?(.+?)"
+    r"(?:\s+at\s+\(?\s*(\d+)\s*,\s*(\d+)\s*\)?)?$"
+)
+
+
+@functools.lru_cache(maxsize=None)
+def load_decomposition_template() -> str:
+    return DECOMPOSITION_TEMPLATE_PATH.read_text()
+
+
+def decomposition_prompt(mission: str, environment: str) -> str:
+    """The template with the mission and the environment filled in"""
+    prompt = _PLACEHOLDER.sub(lambda _: mission, load_decomposition_template(), 1)
+    return _PLACEHOLDER.sub(lambda _: environment, prompt, 1)
+
+
+@dataclasses.dataclass(frozen=True)
+class Subgoal:
+    """One objective of a plan, e.g. 'pick up the red key'
+
+    verb and object are None if the objective does not follow the template's
+    "{verb} the {object}" rule; `text` is then the objective as written.
+    """
+
+    text: str
+    verb: Optional[str] = None
+    object: Optional[str] = None
+    coordinate: Optional[Tuple[int, int]] = None
+
+
+def parse_subgoal(text: str) -> Subgoal:
+    text = normalize_name(text)
+    match = _OBJECTIVE.match(text)
+    if match is None:
+        return Subgoal(text)
+    verb, name, x, y = match.groups()
+    coordinate = (int(x), int(y)) if x is not None else None
+    return Subgoal(text, verb, normalize_name(name), coordinate)
+
+
+def parse_plan(reply: str) -> List[Subgoal]:
+    """Objectives listed after 'The objectives are:' (or anywhere, if absent)"""
+    sections = _OBJECTIVES.split(reply)
+    objectives = sections[-1]
+    return [parse_subgoal(text) for text in _NUMBERED.findall(objectives)]
+
+
+def normalize_mission(mission: str) -> str:
+    return " ".join(mission.lower().strip(" .").split())
+
+
+def scene_signature(index: SpatialIndex) -> Hashable:
+    """What a plan for a scene may depend on
+
+    The objects' names and states (e.g. of doors) and what the agent
+    carries. Per the template's rules a plan only gives coordinates to tell
+    apart objects with the same name, so only those objects' coordinates are
+    part of the signature: scenes that differ only in where uniquely named
+    objects are share plans.
+    """
+    names = tuple(sorted(_label(obj) for obj in index.objects))
+    ambiguous = tuple(
+        (name, tuple(sorted(coordinates)))
+        for name, coordinates in sorted(index.positions.items())
+        if " " in name and len(coordinates) > 1
+    )
+    carrying = index.carrying.name if index.carrying is not None else None
+    return names, ambiguous, carrying
+
+
+def describe_scene(index: SpatialIndex) -> str:
+    """The environment part of the prompt; a function of scene_signature alone
+
+    Coordinates are given only for objects that share their name, so the
+    prompt, and hence the plan, is the same for every scene with the same
+    signature.
+    """
+    lines = []
+    for obj in sorted(index.objects, key=lambda obj: (obj.name, obj.x, obj.y)):
+        label = _label(obj)
+        if len(index.positions[obj.name]) > 1:
+            label += f" at ({obj.x}, {obj.y})"
+        lines.append(label)
+    carrying = index.carrying.name if index.carrying is not None else "nothing"
+    lines.append(f"You are holding: {carrying}")
+    return "\n".join(lines)
+
+
+def _label(obj: GridObject) -> str:
+    """'locked yellow door', 'red key'"""
+    return f"{obj.state} {obj.name}" if obj.state else obj.name
@@ -0,0 +1,105 @@
+""" Which steps could have changed whether a goal is achieved
+
+A goal like "pick up the red key" can only become achieved when what the
+agent carries changes; turning on the spot cannot achieve it. EvaluationFilter
+tracks the part of the state each kind of goal depends on, classified by the
+verbs of descriptions/decomposition_template.txt, and lets an evaluation
+through only when that part changed (or after a budget of skipped steps).
+"""
+
+import functools
+import re
+
+from typing import Hashable, Optional, Tuple
+from gpt_text_gym.envs.minigrid.planner import parse_subgoal
+from gpt_text_gym.envs.minigrid.spatial import SpatialIndex, normalize_name
+
+_PUT_NEAR = re.compile(
+    r"^(?:put|place|move|bring) (?:the )?(.+?) (?:near|next to|beside) (?:the )?(.+)$"
+)
+
+
+@functools.lru_cache(maxsize=1024)
+def classify_goal(goal: str) -> Tuple[Optional[str], Tuple[str, ...]]:
+    """(verb, object names) of a goal; verb is None if it is not recognized
+
+    Verbs are those of the template ("go to", "pick up", "put down", "open",
+    "close"), plus "put near" for goals phrased like the PutNear mission.
+    """
+    goal = normalize_name(goal)
+    match = _PUT_NEAR.match(goal)
+    if match is not None:
+        return "put near", match.groups()
+    subgoal = parse_subgoal(goal)
+    if subgoal.verb is None:
+        return None, ()
+    return subgoal.verb, (subgoal.object,)
+
+
+def _cell(index: SpatialIndex, coord: Tuple[int, int]) -> Optional[Tuple[str, str]]:
+    obj = index.at(coord)
+    return None if obj is None else (obj.name, obj.state)
+
+
+def relevant_state(goal: str, index: SpatialIndex) -> Hashable:
+    """The part of the state that decides whether `goal` is achieved
+
+    go to: where the agent is, what it faces, and where the object is
+    pick up, put down: what the agent carries, and where the object is
+    open, close: the states of the doors
+    put near: what the agent carries, and where both objects are
+    Any other goal depends on the whole scene.
+    """
+    verb, names = classify_goal(goal)
+    carrying = index.carrying.name if index.carrying is not None else None
+    positions = tuple(tuple(index.find(name)) for name in names)
+    if verb == "go to":
+        return verb, index.agent_pos, _cell(index, index.front_pos), positions
+    if verb in ("pick up", "put down", "put near"):
+        return verb, carrying, positions
+    if verb in ("open", "close"):
+        return verb, tuple(
+            (obj.x, obj.y, obj.state) for obj in index.objects if obj.type == "door"
+        )
+    scene = tuple((obj.name, obj.state, obj.x, obj.y) for obj in index.objects)
+    return None, index.agent_pos, index.agent_dir, carrying, scene
+
+
+class EvaluationFilter:
+    """Skips goal evaluations after steps that left the goal's state unchanged
+
+    step_budget: evaluate anyway after this many consecutive skipped steps
+        (None: never); a safety net for goals the classification misjudges.
+    evaluated and skipped count the decisions since the last reset().
+    """
+
+    def __init__(self, step_budget: Optional[int] = 10):
+        self.step_budget = step_budget
+        self.reset()
+
+    def reset(self):
+        """Call at the start of every episode"""
+        self.evaluated = 0
+        self.skipped = 0
+        self._last: Optional[Hashable] = None
+        self._since_evaluation = 0
+
+    def should_evaluate(self, goal: str, index: SpatialIndex) -> bool:
+        state = (goal, relevant_state(goal, index))
+        if state == self._last and (
+            self.step_budget is None or self._since_evaluation < self.step_budget
+        ):
+            self._since_evaluation += 1
+            self.skipped += 1
+            return False
+        self._last = state
+        self._since_evaluation = 0
+        self.evaluated += 1
+        return True
+
+    def summary(self) -> str:
+        total = self.evaluated + self.skipped
+        share = self.skipped / total if total else 0.0
+        return (
+            f"evaluations: {self.evaluated} made, {self.skipped} skipped ({share:.0%})"
+        )
@@ -0,0 +1,81 @@
+""" Compact, array-backed scene representation """
+
+import functools
+import sys
+import numpy as np
+
+from typing import Iterator, List, Sequence, Tuple
+from gpt_text_gym.envs.minigrid.parse_obs import PREFIX_TABLE, _keep_mask, _state_idx
+
+# One record per object in a scene: 5 bytes instead of a formatted string
+SCENE_DTYPE = np.dtype(
+    [
+        ("type", np.uint8),
+        ("color", np.uint8),
+        ("state", np.uint8),
+        ("row", np.uint8),
+        ("col", np.uint8),
+    ]
+)
+
+
+@functools.lru_cache(maxsize=None)
+def object_text(type_idx: int, color_idx: int, state_idx: int) -> str:
+    """Interned text of an (object, color, state) triple, e.g. 'closed red door'"""
+    return sys.intern(PREFIX_TABLE[type_idx, color_idx, state_idx])
+
+
+class Scene:
+    """Objects seen in one observation, stored as a SCENE_DTYPE structured array
+
+    Text is only rendered on demand (str(scene), scene[i], iteration) and is
+    identical to what get_objects returns for the same image and `exclude`.
+    """
+
+    __slots__ = ("objects",)
+
+    def __init__(self, objects: np.ndarray):
+        self.objects = objects
+
+    @staticmethod
+    def from_img_obs(img_obs: np.ndarray, exclude: Sequence[str] = ()) -> "Scene":
+        """Build a scene from a (rows, cols, 3) Minigrid image"""
+        if max(img_obs.shape[:2]) > 256:
+            raise ValueError(f"Grid of shape {img_obs.shape[:2]} is too large")
+        keep = _keep_mask(img_obs, exclude)
+        row, col = np.nonzero(keep)
+        objects = np.empty(len(row), dtype=SCENE_DTYPE)
+        objects["type"] = img_obs[..., 0][keep]
+        objects["color"] = img_obs[..., 1][keep]
+        objects["state"] = _state_idx(img_obs)[keep]
+        objects["row"] = row
+        objects["col"] = col
+        return Scene(objects)
+
+    def _render(self, record: Tuple[int, int, int, int, int]) -> str:
+        type_idx, color_idx, state_idx, row, col = record
+        return f"{object_text(type_idx, color_idx, state_idx)} at ({row}, {col})"
+
+    def texts(self) -> List[str]:
+        return [self._render(record) for record in self.objects.tolist()]
+
+    @property
+    def nbytes(self) -> int:
+        return self.objects.nbytes
+
+    def __len__(self) -> int:
+        return len(self.objects)
+
+    def __getitem__(self, idx: int) -> str:
+        return self._render(self.objects[idx].tolist())
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.texts())
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Scene):
+            return NotImplemented
+        return np.array_equal(self.objects, other.objects)
+
+    def __str__(self):
+        return "\n".join(self.texts())
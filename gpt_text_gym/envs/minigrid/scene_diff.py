@@ -0,0 +1,185 @@
+""" Incremental scene description across consecutive observations """
+
+import gymnasium as gym
+import numpy as np
+
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from minigrid.core.constants import OBJECT_TO_IDX
+from gpt_text_gym.envs.minigrid.parse_obs import (
+    BACKGROUND_TYPES,
+    DOOR_IDX,
+    IDX_TO_STATE,
+    PREFIX_TABLE,
+    _coordinate_table,
+    _keep_mask,
+    _state_idx,
+)
+from gpt_text_gym.envs.minigrid.recording import EMPTY_CELL, encode_grid
+
+
+def _with_article(text: str) -> str:
+    return f"an {text}" if text[0] in "aeiou" else f"a {text}"
+
+
+class IncrementalDescriber:
+    """Describes a Minigrid observation, re-describing only the cells that changed
+
+    Between two steps only a handful of cells of obs["image"] change (the agent
+    moves, an object is picked up, a door is toggled). `update` diffs the new
+    image against the previous one and only rebuilds the text of those cells.
+    The changes themselves are exposed as sentences in `delta`, e.g.
+    "the red door at (1, 3) is now open", so prompts can carry only the changes.
+    Callers that know which cells a step touched can skip the diff with
+    `update_cells`.
+    """
+
+    def __init__(self, exclude: Sequence[str] = ()):
+        self.exclude = tuple(exclude)
+        self._excluded = frozenset(OBJECT_TO_IDX[type] for type in self.exclude)
+        self.delta: List[str] = []
+        self._img_obs: Optional[np.ndarray] = None
+        self._prefixes: Optional[np.ndarray] = None
+        self._texts: Optional[np.ndarray] = None
+        self._objects: Optional[List[str]] = None
+
+    @classmethod
+    def of(cls, env: gym.Env) -> "IncrementalDescriber":
+        """The env's describer over its full grid, up to date with its last step
+
+        One describer is kept per env and reset when the env resets (a new
+        grid). Envs that call observe_step after every step keep it up to date
+        at the cost of the cells they report, and `delta` holds the changes of
+        their last step. For other envs the whole grid is diffed here, once
+        per step however often it is asked for, so `delta` holds the changes
+        since the last step that was described.
+        """
+        env = env.unwrapped
+        grid, step_count = env.grid, env.step_count
+        cached = getattr(env, "_describer", None)
+        if cached is None:
+            describer = cls(exclude=BACKGROUND_TYPES)
+            describer.reset(encode_grid(grid))
+        elif cached[0] is not grid:
+            describer = cached[2]
+            describer.reset(encode_grid(grid))
+        elif cached[1] != step_count:
+            describer = cached[2]
+            describer.update(encode_grid(grid))
+        else:
+            return cached[2]
+        env._describer = (grid, step_count, describer)
+        return describer
+
+    @staticmethod
+    def observe_step(env: gym.Env, positions: Iterable[Tuple[int, int]]):
+        """Update the env's describer, if any, after a step of `env`
+
+        `positions` are the only grid cells the step may have changed, e.g.
+        the cell in front of the agent after a pickup, drop or toggle. Does
+        nothing if the describer was not up to date with the previous step;
+        `of` then diffs the whole grid.
+        """
+        env = env.unwrapped
+        cached = getattr(env, "_describer", None)
+        if (
+            cached is None
+            or cached[0] is not env.grid
+            or cached[1] != env.step_count - 1
+        ):
+            return
+        grid, _, describer = cached
+        cells = {}
+        for x, y in positions:
+            obj = grid.get(x, y)
+            cells[x, y] = EMPTY_CELL if obj is None else obj.encode()
+        describer.update_cells(cells)
+        env._describer = (grid, env.step_count, describer)
+
+    def reset(self, img_obs: np.ndarray) -> List[str]:
+        """Describe `img_obs` from scratch; returns the object list"""
+        rows, cols, _ = img_obs.shape
+        self._img_obs = img_obs.copy()
+        keep = _keep_mask(img_obs, self.exclude).ravel()
+        prefixes = PREFIX_TABLE[img_obs[..., 0], img_obs[..., 1], _state_idx(img_obs)]
+        self._prefixes = np.where(keep, prefixes.ravel(), None)
+        self._texts = np.full(len(keep), None, dtype=object)
+        self._texts[keep] = (
+            self._prefixes[keep] + _coordinate_table(rows, cols).ravel()[keep]
+        )
+        self._objects = None
+        self.delta = []
+        return self.objects
+
+    def update(self, img_obs: np.ndarray) -> List[str]:
+        """Apply the next observation; returns the sentences describing the changes"""
+        if self._img_obs is None or self._img_obs.shape != img_obs.shape:
+            self.reset(img_obs)
+            return self.delta
+
+        rows, cols, _ = img_obs.shape
+        changed = np.flatnonzero((self._img_obs != img_obs).any(axis=-1))
+        self._img_obs = img_obs.copy()
+        self.delta = []
+        if len(changed) == 0:
+            return self.delta
+
+        cells = img_obs.reshape(-1, 3)[changed]
+        coordinates = _coordinate_table(rows, cols).ravel()[changed]
+        for idx, cell, coordinate in zip(changed.tolist(), cells.tolist(), coordinates):
+            self._change(idx, cell, coordinate)
+        return self.delta
+
+    def update_cells(self, cells: Dict[Tuple[int, int], Sequence[int]]) -> List[str]:
+        """Like update, given the new encoding of the only cells that may have changed
+
+        Costs O(len(cells)) instead of a pass over the whole image.
+        """
+        rows, cols, _ = self._img_obs.shape
+        self.delta = []
+        for (row, col), cell in cells.items():
+            cell = list(cell)
+            if self._img_obs[row, col].tolist() == cell:
+                continue
+            self._img_obs[row, col] = cell
+            self._change(
+                row * cols + col, cell, _coordinate_table(rows, cols)[row, col]
+            )
+        return self.delta
+
+    def _change(self, idx: int, cell: List[int], coordinate: str):
+        """Re-describe the cell at flat index `idx`, recording the change in delta"""
+        old = self._prefixes[idx]
+        if cell[0] in self._excluded:
+            new = None
+        else:
+            state = cell[2] if cell[0] == DOOR_IDX else 0
+            new = PREFIX_TABLE[cell[0], cell[1], state]
+        if new == old:
+            return
+        self._prefixes[idx] = new
+        self._texts[idx] = None if new is None else new + coordinate
+        self._objects = None
+        self.delta.append(self._describe_change(old, new, cell, coordinate))
+
+    @staticmethod
+    def _describe_change(
+        old: Optional[str], new: Optional[str], cell: List[int], coordinate: str
+    ) -> str:
+        if old is None:
+            return f"there is now {_with_article(new)}{coordinate}"
+        if new is None:
+            return f"the {old}{coordinate} is gone"
+        if cell[0] == DOOR_IDX and old.partition(" ")[2] == new.partition(" ")[2]:
+            # Same door, only its state changed
+            return f"the {new.partition(' ')[2]}{coordinate} is now {IDX_TO_STATE[cell[2]]}"
+        return f"the {old}{coordinate} is now {_with_article(new)}"
+
+    @property
+    def objects(self) -> List[str]:
+        """Current object list, identical to get_objects(img_obs, exclude)"""
+        if self._objects is None:
+            self._objects = [text for text in self._texts.tolist() if text is not None]
+        return self._objects
+
+    def describe(self) -> str:
+        return "\n".join(self.objects)
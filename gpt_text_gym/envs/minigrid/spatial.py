@@ -0,0 +1,209 @@
+""" Spatial index over a Minigrid grid, and goal checks answered from it """
+
+import re
+import numpy as np
+import gymnasium as gym
+
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+from minigrid.core.constants import DIR_TO_VEC
+from minigrid.core.grid import Grid
+from gpt_text_gym.envs.minigrid.parse_obs import (
+    BACKGROUND_TYPES,
+    GridObject,
+    get_grid_objects,
+)
+
+Coordinate = Tuple[int, int]
+# An object name (e.g. "red key", "the key") or its (x, y) coordinate
+Target = Union[str, Coordinate]
+
+_ARTICLE = re.compile(r"^(?:the|a|an)\s+")
+
+
+def normalize_name(name: str) -> str:
+    """'The Red  key.' -> 'red key'"""
+    name = " ".join(name.lower().strip(" .,!?'\"").split())
+    return _ARTICLE.sub("", name)
+
+
+def is_next_to(coord1: Coordinate, coord2: Coordinate) -> bool:
+    """Whether two cells touch, including diagonally (as PutNear's success check)"""
+    x1, y1 = coord1
+    x2, y2 = coord2
+    return abs(x1 - x2) <= 1 and abs(y1 - y2) <= 1
+
+
+class SpatialIndex:
+    """Where everything is on a grid at one step
+
+    Built from get_grid_objects (a few microseconds for PutNear
+    grids); answers name lookups from a dict and neighbor queries from an
+    occupancy bitmap, so tools and goal checks need no further scans.
+    Coordinates are (x, y), as in GridObject and agent_pos.
+    """
+
+    def __init__(
+        self,
+        grid: Grid,
+        agent_pos: Coordinate,
+        agent_dir: int,
+        carrying: Optional[GridObject] = None,
+        exclude: Sequence[str] = BACKGROUND_TYPES,
+    ):
+        self.width, self.height = grid.width, grid.height
+        self.agent_pos: Coordinate = (int(agent_pos[0]), int(agent_pos[1]))
+        self.agent_dir = int(agent_dir)
+        self.carrying = carrying
+        self.objects: List[GridObject] = get_grid_objects(grid, exclude)
+        # Full name ("red key") and bare type ("key") -> coordinates
+        self.positions: Dict[str, List[Coordinate]] = {}
+        # occupancy[y, x]: whether an object (not background) is at (x, y)
+        self.occupancy = np.zeros((self.height, self.width), dtype=bool)
+        self._at: Dict[Coordinate, GridObject] = {}
+        for grid_object in self.objects:
+            x, y = grid_object.x, grid_object.y
+            self._at[(x, y)] = grid_object
+            self.occupancy[y, x] = True
+            self.positions.setdefault(grid_object.name, []).append((x, y))
+            self.positions.setdefault(grid_object.type, []).append((x, y))
+
+    @classmethod
+    def from_env(cls, env: gym.Env) -> "SpatialIndex":
+        env = env.unwrapped
+        carrying = None
+        if env.carrying is not None:
+            carrying = GridObject(env.carrying.type, env.carrying.color, "", -1, -1)
+        return cls(env.grid, env.agent_pos, env.agent_dir, carrying)
+
+    @classmethod
+    def of(cls, env: gym.Env) -> "SpatialIndex":
+        """from_env, cached until the env steps or resets"""
+        env = env.unwrapped
+        key = (env.grid, env.step_count)
+        cached = getattr(env, "_spatial_index", None)
+        if cached is None or cached[0] != key:
+            cached = env._spatial_index = (key, cls.from_env(env))
+        return cached[1]
+
+    @property
+    def front_pos(self) -> Coordinate:
+        dx, dy = DIR_TO_VEC[self.agent_dir]
+        return self.agent_pos[0] + int(dx), self.agent_pos[1] + int(dy)
+
+    def find(self, name: str) -> List[Coordinate]:
+        """Coordinates of every object called `name` ("red key", "key", ...)"""
+        name = normalize_name(name)
+        if name in ("agent", "me", "you", "yourself", "myself"):
+            return [self.agent_pos]
+        return list(self.positions.get(name, ()))
+
+    def get_coordinate(self, name: str) -> Optional[Coordinate]:
+        """Coordinate of the object called `name`; None if absent or ambiguous"""
+        found = self.find(name)
+        return found[0] if len(found) == 1 else None
+
+    def at(self, coord: Coordinate) -> Optional[GridObject]:
+        return self._at.get((int(coord[0]), int(coord[1])))
+
+    def neighbors(self, coord: Coordinate) -> List[GridObject]:
+        """Objects in the 8 cells around `coord`"""
+        x, y = int(coord[0]), int(coord[1])
+        x0, y0 = max(x - 1, 0), max(y - 1, 0)
+        window = self.occupancy[y0 : y + 2, x0 : x + 2]
+        return [
+            self._at[(x0 + int(dx), y0 + int(dy))]
+            for dy, dx in zip(*np.nonzero(window))
+            if (x0 + int(dx), y0 + int(dy)) != (x, y)
+        ]
+
+    def _coordinates(self, target: Target) -> List[Coordinate]:
+        if isinstance(target, str):
+            return self.find(target)
+        return [(int(target[0]), int(target[1]))]
+
+    def is_next_to(self, target1: Target, target2: Target) -> Optional[bool]:
+        """Whether any object matching target1 touches one matching target2
+
+        None if either is not on the grid (e.g. it is being carried).
+        """
+        coords1, coords2 = self._coordinates(target1), self._coordinates(target2)
+        if not coords1 or not coords2:
+            return None
+        return any(
+            is_next_to(coord1, coord2)
+            for coord1 in coords1
+            for coord2 in coords2
+            if coord1 != coord2
+        )
+
+    def is_facing(self, name: str) -> bool:
+        """Whether an object called `name` is in the cell in front of the agent"""
+        return self.front_pos in self.find(name)
+
+    def is_holding(self, name: Optional[str] = None) -> bool:
+        """Whether the agent carries an object called `name` (anything if None)"""
+        if self.carrying is None:
+            return False
+        if name is None:
+            return True
+        name = normalize_name(name)
+        return name in (self.carrying.name, self.carrying.type)
+
+    def knows(self, name: str) -> bool:
+        """Whether `name` refers to an object on the grid or carried"""
+        return bool(self.find(name)) or self.is_holding(name)
+
+
+_OBJECT = r"(?:the |a |an )?([a-z]+(?: [a-z]+)?)"
+# (pattern, check); each check gets the index and the captured object names
+_GOAL_CHECKS = [
+    (
+        rf"^(?:put|place|drop|move|bring|carry|take) {_OBJECT}"
+        rf" (?:near|next to|beside|adjacent to|close to|by) {_OBJECT}$",
+        # Not achieved while the object is still being carried
+        lambda index, moved, target: not index.is_holding(moved)
+        and bool(index.is_next_to(moved, target)),
+    ),
+    (
+        rf"^(?:is )?{_OBJECT} (?:is )?(?:near|next to|beside|adjacent to) {_OBJECT}$",
+        lambda index, name1, name2: index.is_next_to(name1, name2),
+    ),
+    (
+        rf"^(?:pick up|pickup|grab|get|take|hold|collect) {_OBJECT}(?: up)?$",
+        lambda index, name: index.is_holding(name),
+    ),
+    (
+        rf"^(?:am i |are you |is the agent )?(?:holding|carrying) {_OBJECT}$",
+        lambda index, name: index.is_holding(name),
+    ),
+    (
+        rf"^(?:drop|put down|release) {_OBJECT}$",
+        lambda index, name: not index.is_holding(name),
+    ),
+    (
+        rf"^(?:go|move|walk|navigate|head) (?:to|towards|toward) {_OBJECT}$",
+        lambda index, name: index.is_facing(name),
+    ),
+]
+_GOAL_CHECKS = [(re.compile(pattern), check) for pattern, check in _GOAL_CHECKS]
+
+
+def resolve_goal(goal: str, index: SpatialIndex) -> Optional[bool]:
+    """Whether `goal` is achieved, for goals simple enough to check locally
+
+    Understands e.g. "put the red key near the blue ball", "is the key next
+    to the ball", "pick up the red key", "am I holding the key", "drop the
+    key" and "go to the ball" (achieved when facing it). Returns None when
+    the goal is not of these forms or names an object that is neither on the
+    grid nor carried; the caller should then ask the LLM.
+    """
+    goal = normalize_name(goal.split("\n", 1)[0])
+    for pattern, check in _GOAL_CHECKS:
+        match = pattern.match(goal)
+        if match is None:
+            continue
+        names = match.groups()
+        if not all(index.knows(name) for name in names):
+            return None
+        return check(index, *names)
+    return None
@@ -0,0 +1,334 @@
+""" PutNear for many episodes at once, stepped with array operations
+
+PutNearVectorEnv keeps the state of N PutNear episodes in NumPy arrays:
+grids encoded as Grid.encode does (object type, color, state per cell),
+agent positions and directions, and the encoding of what each agent
+carries. One step() moves all agents, applies the PutNear rules (picking
+up the wrong object or dropping anything ends the episode; dropping the
+right object near the target is rewarded) and builds all observations,
+without a Python loop over episodes. It is a gymnasium VectorEnv and
+returns what SyncVectorEnv over PutNearEnv returns, autoreset included.
+
+Layouts are generated in a batch too. They follow PutNearEnv's
+distribution (distinct objects, no two objects adjacent, the agent on a
+free cell) but draw from one generator, so a seed gives different layouts
+than PutNearEnv with the same seed. To compare the two, load_state() copies
+a PutNearEnv's state into one of the episodes.
+"""
+
+import numpy as np
+import gymnasium as gym
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from gymnasium import spaces
+from gymnasium.vector import VectorEnv
+from minigrid.core.actions import Actions
+from minigrid.core.constants import (
+    COLOR_NAMES,
+    COLOR_TO_IDX,
+    DIR_TO_VEC,
+    OBJECT_TO_IDX,
+)
+from minigrid.core.mission import MissionSpace
+from gpt_text_gym.envs.minigrid.recording import encode_grid
+
+# As PutNearEnv
+TYPES = ("key", "ball", "box")
+COLORS = tuple(color for color in COLOR_NAMES if color != "grey")
+AGENT_VIEW_SIZE = 7
+
+EMPTY_CELL = (OBJECT_TO_IDX["empty"], 0, 0)
+WALL_CELL = (OBJECT_TO_IDX["wall"], COLOR_TO_IDX["grey"], 0)
+_EMPTY = OBJECT_TO_IDX["empty"]
+_BOX = OBJECT_TO_IDX["box"]
+_TYPE_IDX = np.array([OBJECT_TO_IDX[name] for name in TYPES], dtype=np.uint8)
+_COLOR_IDX = np.array([COLOR_TO_IDX[name] for name in COLORS], dtype=np.uint8)
+_CAN_PICKUP = np.isin(np.arange(256), _TYPE_IDX)
+_DIR_TO_VEC = np.array(DIR_TO_VEC, dtype=np.int64)
+_NEIGHBORHOOD = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+
+
+def put_near_mission(
+    move_color: str, move_type: str, target_color: str, target_type: str
+) -> str:
+    return f"put the {move_color} {move_type} near the {target_color} {target_type}"
+
+
+def _view_offsets(view_size: int) -> np.ndarray:
+    """(4, view, view, 2): grid offset from the agent of each observed cell
+
+    Per direction, as MiniGridEnv.gen_obs_grid: the view's top-left corner
+    (get_view_exts), then one more left rotation than the direction.
+    """
+    half = view_size // 2
+    tops = [(0, -half), (-half, 0), (1 - view_size, -half), (-half, 1 - view_size)]
+    offsets = np.zeros((4, view_size, view_size, 2), dtype=np.int64)
+    for direction, (top_x, top_y) in enumerate(tops):
+        i, j = np.meshgrid(np.arange(view_size), np.arange(view_size), indexing="ij")
+        view = np.stack([top_x + i, top_y + j], axis=-1)
+        for _ in range(direction + 1):
+            # Grid.rotate_left: the cell at (i, j) moves to (j, width - 1 - i)
+            rotated = np.empty_like(view)
+            rotated[j, view_size - 1 - i] = view[i, j]
+            view = rotated
+        offsets[direction] = view
+    return offsets
+
+
+class PutNearVectorEnv(VectorEnv):
+    """`num_envs` PutNearEnv(size, numObjs, max_steps) episodes as arrays
+
+    State, for episode n (grid coordinates are (x, y), as in minigrid):
+        grid[n, x, y]: encoding of the cell, as Grid.encode
+        agent_pos[n], agent_dir[n]
+        carrying[n]: encoding of the carried object; zeros if none
+        move[n], target[n]: (type, color) encodings of the objects to move
+            and to move it near; target_pos[n]: where the target is
+        step_count[n], missions[n]
+    """
+
+    def __init__(
+        self,
+        num_envs: int,
+        size: int = 6,
+        numObjs: int = 2,
+        max_steps: Optional[int] = None,
+    ):
+        self.size = size
+        self.numObjs = numObjs
+        self.max_steps = 5 * size if max_steps is None else max_steps
+        view = AGENT_VIEW_SIZE
+        mission_space = MissionSpace(
+            mission_func=put_near_mission,
+            ordered_placeholders=[list(COLORS), list(TYPES)] * 2,
+        )
+        observation_space = spaces.Dict(
+            {
+                "image": spaces.Box(0, 255, (view, view, 3), dtype=np.uint8),
+                "direction": spaces.Discrete(4),
+                "mission": mission_space,
+            }
+        )
+        super().__init__(num_envs, observation_space, spaces.Discrete(len(Actions)))
+
+        # The grids sit inside a border of walls as wide as the view, so
+        # observations are a single gather even at the edges
+        self._pad = view - 1
+        self._padded = np.empty(
+            (num_envs, size + 2 * self._pad, size + 2 * self._pad, 3), dtype=np.uint8
+        )
+        self._padded[:] = WALL_CELL
+        self.grid = self._padded[:, self._pad : -self._pad, self._pad : -self._pad]
+        self.agent_pos = np.zeros((num_envs, 2), dtype=np.int64)
+        self.agent_dir = np.zeros(num_envs, dtype=np.int64)
+        self.carrying = np.zeros((num_envs, 3), dtype=np.uint8)
+        self.move = np.zeros((num_envs, 2), dtype=np.uint8)
+        self.target = np.zeros((num_envs, 2), dtype=np.uint8)
+        self.target_pos = np.zeros((num_envs, 2), dtype=np.int64)
+        self.step_count = np.zeros(num_envs, dtype=np.int64)
+        self.missions: List[str] = [""] * num_envs
+        self._offsets = _view_offsets(view) + self._pad
+        self._envs = np.arange(num_envs)
+        self._actions = np.zeros(num_envs, dtype=np.int64)
+
+    # Layout generation
+
+    def _sample_cells(self, valid: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Uniformly one True cell of each (width, height) mask in `valid`
+
+        What place_obj's rejection sampling converges to, in one draw.
+        """
+        if not valid.any(axis=(1, 2)).all():
+            raise RuntimeError("No free cell left to place an object on")
+        keys = self.np_random.random(valid.shape)
+        keys[~valid] = -1.0
+        flat = keys.reshape(len(valid), -1).argmax(axis=1)
+        return np.divmod(flat, valid.shape[2])
+
+    def _generate(self, envs: np.ndarray):
+        """New layouts, as PutNearEnv._gen_grid, for the episodes `envs`"""
+        count, size, rows = len(envs), self.size, np.arange(len(envs))
+        grids = np.empty((count, size, size, 3), dtype=np.uint8)
+        grids[:] = WALL_CELL
+        grids[:, 1:-1, 1:-1] = EMPTY_CELL
+        free = np.zeros((count, size, size), dtype=bool)
+        free[:, 1:-1, 1:-1] = True
+        near = np.zeros_like(free)
+
+        # Distinct (type, color) pairs
+        kinds = self.np_random.random((count, len(TYPES) * len(COLORS)))
+        kinds = kinds.argsort(axis=1)[:, : self.numObjs]
+        types, colors = _TYPE_IDX[kinds // len(COLORS)], _COLOR_IDX[kinds % len(COLORS)]
+        positions = np.zeros((count, self.numObjs, 2), dtype=np.int64)
+        for k in range(self.numObjs):
+            # Objects are not placed next to each other
+            x, y = self._sample_cells(free & ~near)
+            grids[rows, x, y] = np.stack(
+                [types[:, k], colors[:, k], np.zeros(count, np.uint8)], axis=1
+            )
+            free[rows, x, y] = False
+            for dx, dy in _NEIGHBORHOOD:
+                near[
+                    rows, np.clip(x + dx, 0, size - 1), np.clip(y + dy, 0, size - 1)
+                ] = True
+            positions[:, k] = np.stack([x, y], axis=1)
+
+        x, y = self._sample_cells(free)
+        self.agent_pos[envs] = np.stack([x, y], axis=1)
+        self.agent_dir[envs] = self.np_random.integers(0, 4, count)
+
+        # The object to move, and another one to move it near
+        move = self.np_random.integers(0, self.numObjs, count)
+        target = (move + self.np_random.integers(1, self.numObjs, count)) % self.numObjs
+        self.move[envs] = np.stack([types[rows, move], colors[rows, move]], axis=1)
+        self.target[envs] = np.stack(
+            [types[rows, target], colors[rows, target]], axis=1
+        )
+        self.target_pos[envs] = positions[rows, target]
+
+        self.grid[envs] = grids
+        self.carrying[envs] = 0
+        self.step_count[envs] = 0
+        for env, move_kind, target_kind in zip(
+            envs, kinds[rows, move], kinds[rows, target]
+        ):
+            self.missions[env] = put_near_mission(
+                COLORS[move_kind % len(COLORS)],
+                TYPES[move_kind // len(COLORS)],
+                COLORS[target_kind % len(COLORS)],
+                TYPES[target_kind // len(COLORS)],
+            )
+
+    def load_state(self, index: int, env: gym.Env):
+        """Copy the state of a PutNearEnv into episode `index`"""
+        env = env.unwrapped
+        self.grid[index] = encode_grid(env.grid)
+        self.agent_pos[index] = env.agent_pos
+        self.agent_dir[index] = env.agent_dir
+        self.carrying[index] = env.carrying.encode() if env.carrying else 0
+        self.move[index] = (OBJECT_TO_IDX[env.move_type], COLOR_TO_IDX[env.moveColor])
+        self.target[index] = (
+            OBJECT_TO_IDX[env.target_type],
+            COLOR_TO_IDX[env.target_color],
+        )
+        self.target_pos[index] = env.target_pos
+        self.step_count[index] = env.step_count
+        self.missions[index] = env.mission
+
+    # Observations
+
+    def _images(self, envs: np.ndarray) -> np.ndarray:
+        """(len(envs), view, view, 3) partial views, as MiniGridEnv.gen_obs"""
+        offsets = self._offsets[self.agent_dir[envs]]
+        xs = self.agent_pos[envs, 0, None, None] + offsets[..., 0]
+        ys = self.agent_pos[envs, 1, None, None] + offsets[..., 1]
+        images = self._padded[envs[:, None, None], xs, ys]
+        # The agent sees what it carries in its own cell
+        carried = self.carrying[envs]
+        images[:, AGENT_VIEW_SIZE // 2, AGENT_VIEW_SIZE - 1] = np.where(
+            carried[:, :1] != 0, carried, EMPTY_CELL
+        )
+        return images
+
+    def _observations(self) -> Dict[str, Any]:
+        return {
+            "image": self._images(self._envs),
+            "direction": self.agent_dir.copy(),
+            "mission": tuple(self.missions),
+        }
+
+    def _observation(self, observations: Dict[str, Any], index: int) -> Dict:
+        """Episode `index`'s observation, copied out of the batch"""
+        return {
+            "image": observations["image"][index].copy(),
+            "direction": observations["direction"][index],
+            "mission": observations["mission"][index],
+        }
+
+    # VectorEnv
+
+    def reset_wait(
+        self,
+        seed: Optional[int] = None,
+        options: Optional[dict] = None,
+    ):
+        """New layouts for all episodes; `seed` seeds the shared generator"""
+        if seed is not None:
+            self._np_random, _ = gym.utils.seeding.np_random(seed)
+        self._generate(self._envs)
+        return self._observations(), {}
+
+    def step_async(self, actions: Sequence[int]):
+        self._actions = np.asarray(actions, dtype=np.int64)
+
+    def step_wait(self):
+        actions, envs = self._actions, self._envs
+        self.step_count += 1
+
+        front = self.agent_pos + _DIR_TO_VEC[self.agent_dir]
+        fx, fy = front[:, 0], front[:, 1]
+        front_type = self.grid[envs, fx, fy, 0]
+        carried = self.carrying[:, 0] != 0
+
+        self.agent_dir = np.where(
+            actions == Actions.left,
+            (self.agent_dir - 1) % 4,
+            np.where(
+                actions == Actions.right, (self.agent_dir + 1) % 4, self.agent_dir
+            ),
+        )
+        forward = (actions == Actions.forward) & (front_type == _EMPTY)
+        self.agent_pos[forward] = front[forward]
+
+        pickup = (actions == Actions.pickup) & _CAN_PICKUP[front_type] & ~carried
+        self.carrying[pickup] = self.grid[envs[pickup], fx[pickup], fy[pickup]]
+        self.grid[envs[pickup], fx[pickup], fy[pickup]] = EMPTY_CELL
+
+        dropping = (actions == Actions.drop) & carried
+        dropped = dropping & (front_type == _EMPTY)
+        self.grid[envs[dropped], fx[dropped], fy[dropped]] = self.carrying[dropped]
+        self.carrying[dropped] = 0
+
+        # Toggling a box replaces it with its contents: nothing, in PutNear
+        opened = (actions == Actions.toggle) & (front_type == _BOX)
+        self.grid[envs[opened], fx[opened], fy[opened]] = EMPTY_CELL
+
+        # PutNear: picking up the wrong object, or dropping anything, ends
+        # the episode; dropping the object near the target is rewarded
+        wrong = (
+            (actions == Actions.pickup)
+            & (self.carrying[:, 0] != 0)
+            & (self.carrying[:, :2] != self.move).any(axis=1)
+        )
+        near_target = (np.abs(fx - self.target_pos[:, 0]) <= 1) & (
+            np.abs(fy - self.target_pos[:, 1]) <= 1
+        )
+        success = dropped & near_target
+        rewards = np.where(success, 1 - 0.9 * (self.step_count / self.max_steps), 0.0)
+        terminated = wrong | dropping
+        truncated = self.step_count >= self.max_steps
+
+        observations = self._observations()
+        infos: Dict[str, Any] = {}
+        done = np.flatnonzero(terminated | truncated)
+        if len(done):
+            # As SyncVectorEnv: the last observation of a finished episode is
+            # in the info; the returned one is that of the next episode
+            final_observations = np.full(self.num_envs, None, dtype=object)
+            final_infos = np.full(self.num_envs, None, dtype=object)
+            for index in done:
+                final_observations[index] = self._observation(observations, index)
+                final_infos[index] = {}
+            mask = np.zeros(self.num_envs, dtype=bool)
+            mask[done] = True
+            infos = {
+                "final_observation": final_observations,
+                "_final_observation": mask,
+                "final_info": final_infos,
+                "_final_info": mask.copy(),
+            }
+            self._generate(done)
+            observations["image"][done] = self._images(done)
+            observations["direction"][done] = self.agent_dir[done]
+            observations["mission"] = tuple(self.missions)
+        return observations, rewards, terminated, truncated, infos
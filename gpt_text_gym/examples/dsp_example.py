@@ -1,15 +1,14 @@
 import dsp
 import openai
-import dotenv
 
-from gpt_text_gym import ROOT_DIR
+from gpt_text_gym import get_api_key
 
 LLM_MODEL = "text-davinci-002"
 colbert_server = (
     "http://ec2-44-228-128-229.us-west-2.compute.amazonaws.com:8893/api/search"
 )
 OPENAI_TEMPERATURE = 0.0
-OPENAI_API_KEY = dotenv.get_key(ROOT_DIR / ".env", "API_KEY")
+OPENAI_API_KEY = get_api_key()
 
 train = [
     (
@@ -1,9 +1,6 @@
-import openai
-import time
 import minigrid  # noqa
 import gymnasium as gym
 import re
-import dotenv
 
 from typing import Dict, List, Tuple, Optional
 
@@ -11,14 +8,28 @@ from minigrid.core.constants import COLOR_NAMES
 from minigrid.core.grid import Grid
 from minigrid.core.mission import MissionSpace
 from minigrid.core.world_object import Door, Goal, Key, Wall, Ball, Box
-from minigrid.manual_control import ManualControl
 from minigrid.minigrid_env import MiniGridEnv
-from gpt_text_gym import ROOT_DIR
+from gpt_text_gym.envs.minigrid.parse_obs import get_grid_objects
+from gpt_text_gym.gpt import (
+    CompletionCache,
+    OpenAIBackend,
+    RequestScheduler,
+    limit_tokens_from_string,
+    prompt_limit,
+    openai_chat_completion_create,
+)
 
 LLM_MODEL = "gpt-4"
 OPENAI_TEMPERATURE = 0.0
+# Where completions come from; e.g. a LocalBackend for offline evaluation
+LLM_BACKEND = OpenAIBackend()
+# Identical prompts are answered from disk, so re-running an experiment is free
+COMPLETION_CACHE = CompletionCache()
+# Account rate limits: requests beyond them wait; transient errors back off and retry
+OPENAI_SCHEDULER = RequestScheduler(requests_per_minute=200, tokens_per_minute=40_000)
 
-openai.api_key = dotenv.get_key(ROOT_DIR / ".env", "API_KEY")
+# Colors of PutNear objects (a copy: COLOR_NAMES is shared with all of minigrid)
+PUT_NEAR_COLORS = [color for color in COLOR_NAMES if color != "grey"]
 
 
 class PutNearEnv(MiniGridEnv):
@@ -82,16 +93,15 @@ class PutNearEnv(MiniGridEnv):
     """
 
     def __init__(self, size=6, numObjs=2, max_steps: int | None = None, **kwargs):
-        COLOR_NAMES.remove("grey")
         self.size = size
         self.numObjs = numObjs
         self.obj_types = ["key", "ball", "box"]
         mission_space = MissionSpace(
             mission_func=self._gen_mission,
             ordered_placeholders=[
-                COLOR_NAMES,
+                PUT_NEAR_COLORS,
                 self.obj_types,
-                COLOR_NAMES,
+                PUT_NEAR_COLORS,
                 self.obj_types,
             ],
         )
@@ -141,7 +151,7 @@ class PutNearEnv(MiniGridEnv):
         # Until we have generated all the objects
         while len(objs) < self.numObjs:
             objType = self._rand_elem(types)
-            objColor = self._rand_elem(COLOR_NAMES)
+            objColor = self._rand_elem(PUT_NEAR_COLORS)
 
             # If this object already exists, try again
             if (objType, objColor) in objs:
@@ -215,137 +225,35 @@ class PutNearEnv(MiniGridEnv):
         return obs, reward, terminated, truncated, info
 
 
-def limit_tokens_from_string(string: str, model: str, limit: int) -> str:
-    """Limits the string to a number of tokens (estimated)."""
-
-    import tiktoken
-
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-    except:
-        encoding = tiktoken.encoding_for_model("gpt2")  # Fallback for others.
-
-    encoded = encoding.encode(string)
-
-    return encoding.decode(encoded[:limit])
-
-
 def openai_call(
     prompt: str,
     model: str = LLM_MODEL,
     temperature: float = OPENAI_TEMPERATURE,
     max_tokens: int = 100,
 ):
-    while True:
-        try:
-            trimmed_prompt = prompt
-            # TODO: Enable trimmed prompt.
-            # Use 4000 instead of the real limit (4097) to give a bit of wiggle room for the encoding of roles.
-            # TODO: different limits for different models.
-            # trimmed_prompt = limit_tokens_from_string(prompt, model, 4000 - max_tokens)
-
-            # Use chat completion API
-            messages = [{"role": "system", "content": trimmed_prompt}]
-            response = openai.ChatCompletion.create(
-                model=model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens,
-                n=1,
-                stop=None,
-            )
-            return response.choices[0].message.content.strip()
-        except openai.error.RateLimitError:
-            print(
-                "   *** The OpenAI API rate limit has been exceeded. Waiting 10 seconds and trying again. ***"
-            )
-            time.sleep(10)  # Wait 10 seconds and try again
-        except openai.error.Timeout:
-            print(
-                "   *** OpenAI API timeout occurred. Waiting 10 seconds and trying again. ***"
-            )
-            time.sleep(10)  # Wait 10 seconds and try again
-        except openai.error.APIError:
-            print(
-                "   *** OpenAI API error occurred. Waiting 10 seconds and trying again. ***"
-            )
-            time.sleep(10)  # Wait 10 seconds and try again
-        except openai.error.APIConnectionError:
-            print(
-                "   *** OpenAI API connection error occurred. Check your network settings, proxy configuration, SSL certificates, or firewall rules. Waiting 10 seconds and trying again. ***"
-            )
-            time.sleep(10)  # Wait 10 seconds and try again
-        except openai.error.InvalidRequestError:
-            print(
-                "   *** OpenAI API invalid request. Check the documentation for the specific API method you are calling and make sure you are sending valid and complete parameters. Waiting 10 seconds and trying again. ***"
-            )
-            time.sleep(10)  # Wait 10 seconds and try again
-        except openai.error.ServiceUnavailableError:
-            print(
-                "   *** OpenAI API service unavailable. Waiting 10 seconds and trying again. ***"
-            )
-            time.sleep(10)  # Wait 10 seconds and try again
-        else:
-            break
+    # Leave room for the reply and the encoding of roles.
+    trimmed_prompt = limit_tokens_from_string(
+        prompt, model, prompt_limit(model, max_tokens)
+    )
+
+    # Use chat completion API
+    messages = [{"role": "system", "content": trimmed_prompt}]
+    response = openai_chat_completion_create(
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        n=1,
+        stop=None,
+        cache=COMPLETION_CACHE,
+        scheduler=OPENAI_SCHEDULER,
+        backend=LLM_BACKEND,
+    )
+    return response.choices[0].message.content.strip()
 
 
 def get_objects(env: gym.Env) -> List[str]:
-
-    env_str = str(env.unwrapped)
-
-    objects = []
-    OBJECT_TO_STR = {
-        "wall": "W",
-        "floor": "F",
-        "door": "D",
-        "key": "K",
-        "ball": "A",
-        "box": "B",
-        "goal": "G",
-        "lava": "V",
-    }
-    STR_TO_OBJECT = {v: k for k, v in OBJECT_TO_STR.items()}
-
-    # Map agent's direction to short string
-    AGENT_DIR_TO_STR = {0: ">", 1: "V", 2: "<", 3: "^"}
-    STR_TO_AGENT_DIR = {v: k for k, v in AGENT_DIR_TO_STR.items()}
-
-    # Map of colors to short string
-    COLOR_TO_STR = {
-        "red": "R",
-        "green": "G",
-        "blue": "B",
-        "purple": "P",
-        "yellow": "Y",
-    }
-    STR_TO_COLOR = {v: k for k, v in COLOR_TO_STR.items()}
-
-    rows = env_str.split("\n")
-    n_rows = 6
-    n_cols = 6
-    for row in range(n_rows):
-        for col in range(n_cols):
-            cell = rows[row][2 * col : 2 * col + 2]
-            if cell == "  ":
-                # empty cell
-                continue
-            elif cell[0] in STR_TO_AGENT_DIR and cell[0] == cell[1]:
-                # agent
-                continue
-            elif cell[0] in ("W", "F", "V"):
-                # wall, floor, or lava
-
-                # Skip for now
-                continue
-                # object_name = STR_TO_OBJECT[cell[0]]
-            else:
-                # interactable object
-                object_type = STR_TO_OBJECT[cell[0]]
-                object_color = STR_TO_COLOR[cell[1]]
-                object_name = f"{object_color} {object_type}"
-            objects.append(object_name)
-
-    return objects
+    return [obj.name for obj in get_grid_objects(env.unwrapped.grid)]
 
 
 def get_objects_in_view(obs: Dict) -> List[str]:
@@ -1,10 +1,9 @@
-import openai
-import time
+import asyncio
+import contextlib
+import logging
 import minigrid  # noqa
 import gymnasium as gym
-import re
-import dotenv
-import sympy
+import random
 
 from typing import Dict, List, Tuple, Optional, Any
 
@@ -12,14 +11,84 @@ from minigrid.core.constants import COLOR_NAMES
 from minigrid.core.grid import Grid
 from minigrid.core.mission import MissionSpace
 from minigrid.core.world_object import Door, Goal, Key, Wall, Ball, Box
-from minigrid.manual_control import ManualControl
 from minigrid.minigrid_env import MiniGridEnv
-from gpt_text_gym import ROOT_DIR
+from gpt_text_gym.envs.minigrid.parse_obs import get_grid_objects
+from gpt_text_gym.envs.minigrid.planner import (
+    Subgoal,
+    decomposition_prompt,
+    describe_scene,
+    normalize_mission,
+    parse_plan,
+    scene_signature,
+)
+from gpt_text_gym.envs.minigrid.recording import FrameRecorder
+from gpt_text_gym.envs.minigrid.relevance import EvaluationFilter
+from gpt_text_gym.envs.minigrid.scene_diff import IncrementalDescriber
+from gpt_text_gym.envs.minigrid.spatial import SpatialIndex, resolve_goal
+from gpt_text_gym.envs.minigrid import spatial
+from gpt_text_gym.gpt import (
+    CompletionCache,
+    OpenAIBackend,
+    PromptMemo,
+    EarlyStop,
+    RequestScheduler,
+    limit_tokens_from_string,
+    prompt_limit,
+    complete_stream,
+    match_line,
+    match_prefix,
+    openai_aiosession,
+    openai_chat_completion_acreate,
+    openai_chat_completion_astream,
+    openai_chat_completion_create,
+    openai_chat_completion_stream,
+)
+from gpt_text_gym.gpt.streaming import acomplete_stream, early_stop_key
+from gpt_text_gym.gpt.trace import (
+    get_tracer,
+    load_trace,
+    prompt_hash,
+    record,
+    summarize_trace,
+    trace_context,
+    tracing,
+)
+from gpt_text_gym.profiling import count, profiling, timer
+from gpt_text_gym.runner import EpisodeAgent, EpisodeResult, EpisodeRunner, JSONLSink
+from gpt_text_gym.tools import ToolError, ToolRegistry, ToolSession
+
+logger = logging.getLogger(__name__)
 
 LLM_MODEL = "gpt-4"
 OPENAI_TEMPERATURE = 0.0
-
-openai.api_key = dotenv.get_key(ROOT_DIR / ".env", "API_KEY")
+# Where completions come from; e.g. a LocalBackend for offline evaluation
+LLM_BACKEND = OpenAIBackend()
+# Identical prompts are answered from disk, so re-running an experiment is free
+COMPLETION_CACHE = CompletionCache()
+# Account rate limits: requests beyond them wait; transient errors back off and retry
+OPENAI_SCHEDULER = RequestScheduler(requests_per_minute=200, tokens_per_minute=40_000)
+# Within a run, an unchanged prompt (e.g. after a no-op step) reuses the last answer
+PROMPT_MEMO = PromptMemo(max_size=1024)
+# Agents that only need part of the reply stop streaming once it is decidable
+EVALUATION_EARLY_STOP = match_prefix(("yes", "no", "need more information"))
+TOOL_CHOICE_EARLY_STOP = match_line(r"next tool to use: (.*)")
+# Goal checks simple enough for the spatial index (e.g. "pick up the red key")
+# are answered locally; the evaluation agent only sees the rest
+RESOLVE_GOALS_LOCALLY = True
+# Tool choice rounds per evaluation; after the last, the goal counts as not achieved
+MAX_TOOL_ROUNDS = 2
+# Plan every subgoal of an episode in one call (decomposition_template.txt);
+# the planning agent is only asked for a next goal once the plan runs out
+PLAN_EPISODES = True
+# Plans by (mission, scene signature), so recurring layouts are not planned again
+PLAN_CACHE = PromptMemo(max_size=1024)
+# Goals are only evaluated after steps that changed the state they depend on
+# (see envs/minigrid/relevance.py), and at least every EVALUATION_STEP_BUDGET steps
+FILTER_EVALUATIONS = True
+EVALUATION_STEP_BUDGET = 10
+
+# Colors of PutNear objects (a copy: COLOR_NAMES is shared with all of minigrid)
+PUT_NEAR_COLORS = [color for color in COLOR_NAMES if color != "grey"]
 
 
 class PutNearEnv(MiniGridEnv):
@@ -83,16 +152,15 @@ class PutNearEnv(MiniGridEnv):
     """
 
     def __init__(self, size=6, numObjs=2, max_steps: int | None = None, **kwargs):
-        COLOR_NAMES.remove("grey")
         self.size = size
         self.numObjs = numObjs
         self.obj_types = ["key", "ball", "box"]
         mission_space = MissionSpace(
             mission_func=self._gen_mission,
             ordered_placeholders=[
-                COLOR_NAMES,
+                PUT_NEAR_COLORS,
                 self.obj_types,
-                COLOR_NAMES,
+                PUT_NEAR_COLORS,
                 self.obj_types,
             ],
         )
@@ -142,7 +210,7 @@ class PutNearEnv(MiniGridEnv):
         # Until we have generated all the objects
         while len(objs) < self.numObjs:
             objType = self._rand_elem(types)
-            objColor = self._rand_elem(COLOR_NAMES)
+            objColor = self._rand_elem(PUT_NEAR_COLORS)
 
             # If this object already exists, try again
             if (objType, objColor) in objs:
@@ -213,125 +281,144 @@ class PutNearEnv(MiniGridEnv):
                     reward = self._reward()
             terminated = True
 
+        # Only pickup, drop and toggle change the grid, at the cell in front
+        actions = self.actions
+        changed = (
+            [(ox, oy)]
+            if action in (actions.pickup, actions.drop, actions.toggle)
+            else []
+        )
+        IncrementalDescriber.observe_step(self, changed)
+
         return obs, reward, terminated, truncated, info
 
 
+def record_memo_hit(prompt: str, model: str, agent: str):
+    """Trace a prompt answered by PROMPT_MEMO, i.e. without a request"""
+    if get_tracer() is None:
+        return
+    record(
+        agent=agent,
+        prompt_hash=prompt_hash([{"role": "system", "content": prompt}]),
+        model=model,
+        stream=False,
+        latency=0.0,
+        retries=0,
+        prompt_tokens=0,
+        completion_tokens=0,
+        cache_hit="memo",
+    )
+
+
 def openai_call(
     prompt: str,
     model: str = LLM_MODEL,
     temperature: float = OPENAI_TEMPERATURE,
     max_tokens: int = 100,
+    agent: str = "",
+    early_stop: Optional[EarlyStop] = None,
 ):
-    while True:
-        try:
-            trimmed_prompt = prompt
-            # TODO: Enable trimmed prompt.
-            # Use 4000 instead of the real limit (4097) to give a bit of wiggle room for the encoding of roles.
-            # TODO: different limits for different models.
-            # trimmed_prompt = limit_tokens_from_string(prompt, model, 4000 - max_tokens)
-
-            # Use chat completion API
-            messages = [{"role": "system", "content": trimmed_prompt}]
-            response = openai.ChatCompletion.create(
+    memo_key = (prompt, model, temperature, max_tokens, early_stop)
+    response = PROMPT_MEMO.get(memo_key, tag=agent)
+    if response is not None:
+        count("memo_hit")
+        record_memo_hit(prompt, model, agent)
+        return response
+
+    # Leave room for the reply and the encoding of roles.
+    with timer("prompt_trim"):
+        trimmed_prompt = limit_tokens_from_string(
+            prompt, model, prompt_limit(model, max_tokens)
+        )
+
+    # Use chat completion API
+    messages = [{"role": "system", "content": trimmed_prompt}]
+    with trace_context(agent=agent), timer("llm_wait"):
+        if early_stop is None:
+            response = openai_chat_completion_create(
                 model=model,
                 messages=messages,
                 temperature=temperature,
                 max_tokens=max_tokens,
                 n=1,
                 stop=None,
+                cache=COMPLETION_CACHE,
+                scheduler=OPENAI_SCHEDULER,
+                backend=LLM_BACKEND,
             )
-            return response.choices[0].message.content.strip()
-        except openai.error.RateLimitError:
-            print(
-                "   *** The OpenAI API rate limit has been exceeded. Waiting 10 seconds and trying again. ***"
-            )
-            time.sleep(10)  # Wait 10 seconds and try again
-        except openai.error.Timeout:
-            print(
-                "   *** OpenAI API timeout occurred. Waiting 10 seconds and trying again. ***"
-            )
-            time.sleep(10)  # Wait 10 seconds and try again
-        except openai.error.APIError:
-            print(
-                "   *** OpenAI API error occurred. Waiting 10 seconds and trying again. ***"
-            )
-            time.sleep(10)  # Wait 10 seconds and try again
-        except openai.error.APIConnectionError:
-            print(
-                "   *** OpenAI API connection error occurred. Check your network settings, proxy configuration, SSL certificates, or firewall rules. Waiting 10 seconds and trying again. ***"
-            )
-            time.sleep(10)  # Wait 10 seconds and try again
-        except openai.error.InvalidRequestError:
-            print(
-                "   *** OpenAI API invalid request. Check the documentation for the specific API method you are calling and make sure you are sending valid and complete parameters. Waiting 10 seconds and trying again. ***"
+            response = response.choices[0].message.content.strip()
+        else:
+            # The text read until the early stop decided is cached
+            deltas = openai_chat_completion_stream(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stop=None,
+                cache=COMPLETION_CACHE,
+                stop_key=early_stop_key(early_stop),
+                scheduler=OPENAI_SCHEDULER,
+                backend=LLM_BACKEND,
             )
-            time.sleep(10)  # Wait 10 seconds and try again
-        except openai.error.ServiceUnavailableError:
-            print(
-                "   *** OpenAI API service unavailable. Waiting 10 seconds and trying again. ***"
+            response = complete_stream(deltas, early_stop).strip()
+    PROMPT_MEMO.set(memo_key, response)
+    return response
+
+
+async def aopenai_call(
+    prompt: str,
+    model: str = LLM_MODEL,
+    temperature: float = OPENAI_TEMPERATURE,
+    max_tokens: int = 100,
+    agent: str = "",
+    early_stop: Optional[EarlyStop] = None,
+):
+    """Async counterpart of openai_call"""
+    memo_key = (prompt, model, temperature, max_tokens, early_stop)
+    response = PROMPT_MEMO.get(memo_key, tag=agent)
+    if response is not None:
+        count("memo_hit")
+        record_memo_hit(prompt, model, agent)
+        return response
+
+    with timer("prompt_trim"):
+        trimmed_prompt = limit_tokens_from_string(
+            prompt, model, prompt_limit(model, max_tokens)
+        )
+    messages = [{"role": "system", "content": trimmed_prompt}]
+    with trace_context(agent=agent), timer("llm_wait"):
+        if early_stop is None:
+            response = await openai_chat_completion_acreate(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                n=1,
+                stop=None,
+                cache=COMPLETION_CACHE,
+                scheduler=OPENAI_SCHEDULER,
+                backend=LLM_BACKEND,
             )
-            time.sleep(10)  # Wait 10 seconds and try again
+            response = response.choices[0].message.content.strip()
         else:
-            break
+            deltas = openai_chat_completion_astream(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stop=None,
+                cache=COMPLETION_CACHE,
+                stop_key=early_stop_key(early_stop),
+                scheduler=OPENAI_SCHEDULER,
+                backend=LLM_BACKEND,
+            )
+            response = (await acomplete_stream(deltas, early_stop)).strip()
+    PROMPT_MEMO.set(memo_key, response)
+    return response
 
 
 def get_objects(env: gym.Env) -> List[str]:
-
-    env_str = str(env.unwrapped)
-
-    objects = []
-    OBJECT_TO_STR = {
-        "wall": "W",
-        "floor": "F",
-        "door": "D",
-        "key": "K",
-        "ball": "A",
-        "box": "B",
-        "goal": "G",
-        "lava": "V",
-    }
-    STR_TO_OBJECT = {v: k for k, v in OBJECT_TO_STR.items()}
-
-    # Map agent's direction to short string
-    AGENT_DIR_TO_STR = {0: ">", 1: "V", 2: "<", 3: "^"}
-    STR_TO_AGENT_DIR = {v: k for k, v in AGENT_DIR_TO_STR.items()}
-
-    # Map of colors to short string
-    COLOR_TO_STR = {
-        "red": "R",
-        "green": "G",
-        "blue": "B",
-        "purple": "P",
-        "yellow": "Y",
-    }
-    STR_TO_COLOR = {v: k for k, v in COLOR_TO_STR.items()}
-
-    rows = env_str.split("\n")
-    n_rows = 6
-    n_cols = 6
-    for row in range(n_rows):
-        for col in range(n_cols):
-            cell = rows[row][2 * col : 2 * col + 2]
-            if cell == "  ":
-                # empty cell
-                continue
-            elif cell[0] in STR_TO_AGENT_DIR and cell[0] == cell[1]:
-                # agent
-                continue
-            elif cell[0] in ("W", "F", "V"):
-                # wall, floor, or lava
-
-                # Skip for now
-                continue
-                # object_name = STR_TO_OBJECT[cell[0]]
-            else:
-                # interactable object
-                object_type = STR_TO_OBJECT[cell[0]]
-                object_color = STR_TO_COLOR[cell[1]]
-                object_name = f"{object_color} {object_type}"
-            objects.append(object_name)
-
-    return objects
+    return [obj.name for obj in get_grid_objects(env.unwrapped.grid)]
 
 
 def get_objects_in_view(obs: Dict) -> List[str]:
@@ -350,37 +437,57 @@ def get_inventory(env: gym.Env) -> str:
 
 
 def describe_environment(env: gym.Env, obs: Dict) -> str:
-    objects = get_objects(env)
-    inventory = get_inventory(env)
-
-    # TODO: Only get visible objects
-    env_description = f"""
+    with timer("describe_environment"):
+        # The describer is updated on every step (see PutNearEnv.step)
+        describer = IncrementalDescriber.of(env)
+        inventory = get_inventory(env)
+        changes = f"Since the last step: {'; '.join(describer.delta)}.\n"
+
+        # TODO: Only get visible objects
+        env_description = f"""
 You are in a room. 
-You see: {', '.join(objects)}.
-You are facing: {obs["direction"]}.
+You see: {', '.join(describer.objects)}.
+{changes if describer.delta else ""}You are facing: {obs["direction"]}.
 You are currently holding: {inventory}.
 """
     return env_description
 
 
-def planning_agent(env, obs, previous_goal: str) -> str:
-    prompt = f"""
+# Tools; each gets the step's SpatialIndex, then the arguments the model chose
+TOOLS = ToolRegistry()
+
+
+@TOOLS.tool("get_coordinate")
+def get_coordinate_tool(index: SpatialIndex, object_name: str) -> Tuple[int, int]:
+    coordinate = index.get_coordinate(object_name)
+    if coordinate is None:
+        raise ToolError(f"there is no single object called {object_name!r}")
+    return coordinate
+
+
+@TOOLS.tool("is_next_to")
+def is_next_to_tool(
+    index: SpatialIndex, coord1: Tuple[int, int], coord2: Tuple[int, int]
+) -> bool:
+    return spatial.is_next_to(coord1, coord2)
+
+
+def planning_prompt(description: str, mission: str, previous_goal: str) -> str:
+    return f"""
 You are controlling a simulated agent to complete tasks. 
-The overall goal is: {obs["mission"]}.
+The overall goal is: {mission}.
 The previous goal was: {previous_goal}. 
 
-{describe_environment(env, obs)}
+{description}
 
 Describe the next goal in one sentence. Be concise.
 """
-    print(f"\n****PLANNING AGENT PROMPT****\n{prompt}\n")
-    response = openai_call(prompt)
-    print(f"\n****PLANNING AGENT RESPONSE****\n{response}\n")
-    return response.strip().lower()
 
 
-def evaluation_agent(env, obs, current_goal: str, additional_context: str = ""):
-    prompt = (
+def evaluation_prompt(
+    description: str, mission: str, current_goal: str, additional_context: str
+) -> str:
+    return (
         """
 Answer the question. 
 
@@ -399,50 +506,17 @@ Answer: ${yes / no / need more information}
         + f"""
 
 Question: Has the current goal been achieved? 
-Tools: get_coordinate(object_name: str) -> Tuple[int, int], is_next_to(coord1: Tuple[int, int], coord2: Tuple[int, int]) -> bool
-Context: {describe_environment(env, obs)} {additional_context}. The overall goal is: {obs["mission"]}. The current goal is: {current_goal}
+Tools: {TOOLS.describe()}
+Context: {description} {additional_context}. The overall goal is: {mission}. The current goal is: {current_goal}
 Answer: 
 """
     )
-    print(f"\n****EVALUATION AGENT PROMPT****\n{prompt}\n")
-    response = openai_call(prompt)
-    print(f"\n****EVALUATION AGENT RESPONSE****\n{response}\n")
-
-    # Define tools which require local variables
-    def get_coordinate(object_name: str) -> Tuple[int, int]:
-        return get_coordinate_of_object(obs, object_name)
-
-    if response.lower() == "need more information":
-        tool_choice_response = tool_choice_agent(
-            env, obs, current_goal, additional_context
-        )
-        tool_choice = re.search(r"next tool to use: (.*)", tool_choice_response).group(
-            1
-        )
-        tool_result = eval(tool_choice)
-        additional_context += f"The result of {tool_choice} is {tool_result}."
-        return evaluation_agent(env, obs, current_goal, additional_context)
-    elif response.lower() in ("yes", "no"):
-        return response.strip().lower()
-    else:
-        raise ValueError(f"Invalid response: {response}")
-
-
-# Tools
-def get_coordinate_of_object(obs: Dict[str, Any], object_name: str) -> Tuple[int, int]:
-    """Get the coordinate of an object"""
-    return (0, 0)
-
-
-def is_next_to(coord1: Tuple[int, int], coord2: Tuple[int, int]) -> bool:
-    """Check if two coordinates are next to each other"""
-    x1, y1 = coord1
-    x2, y2 = coord2
-    return abs(x1 - x2) <= 1 and abs(y1 - y2) <= 1
 
 
-def tool_choice_agent(env, obs, current_goal: str, additional_context: str) -> str:
-    prompt = (
+def tool_choice_prompt(
+    description: str, mission: str, current_goal: str, additional_context: str
+) -> str:
+    return (
         """
 Identify the appropriate tool that will help answer a complex question. 
 
@@ -451,7 +525,7 @@ Rules:
 ---
 Example of writing 'next tool to use'. 
 
-Next tool to use: get_coordinate(obs, "green key")
+Next tool to use: get_coordinate("green key")
 Next tool to use: is_next_to((0,2), (3,4))
 ---
 
@@ -466,15 +540,265 @@ Next tool to use: ${the name and invocation arguments of the tool}
 """
         + f"""
 Question: Has the current goal been achieved?
-Tools: get_coordinate(object_name: str) -> Tuple[int, int], is_next_to(coord1: Tuple[int, int], coord2: Tuple[int, int]) -> bool,
-Context: {describe_environment(env, obs)} {additional_context}. The overall goal is: {obs["mission"]}. The current goal is: {current_goal}. 
+Tools: {TOOLS.describe()},
+Context: {description} {additional_context}. The overall goal is: {mission}. The current goal is: {current_goal}. 
 Rationale: Let's think step by step. To answer this question, we first need to find out
 """
     )
-    print(f"\n****TOOL CHOICE AGENT PROMPT****\n{prompt}\n")
-    response = openai_call(prompt)
-    print(f"\n****TOOL CHOICE AGENT RESPONSE****\n{response}\n")
-    return response.strip().lower()
+
+
+def run_tool_choice(
+    obs, tool_choice_response: str, session: Optional[ToolSession] = None
+) -> str:
+    """Run the tools chosen by the tool choice agent; returns their results as context
+
+    session: the step's ToolSession (by default, a new one over obs["index"]);
+        calls repeated across tool rounds are then answered from its memo.
+    """
+    if session is None:
+        session = TOOLS.session(obs["index"])
+    with timer("tool"):
+        try:
+            results = session.run_reply(tool_choice_response)
+        except ToolError as error:
+            return f"The chosen tool could not be used: {error}."
+    count("tool_calls", len(results))
+    return " ".join(map(str, results))
+
+
+def planning_agent(env, obs, previous_goal: str) -> str:
+    description = describe_environment(env, obs)
+    with timer("prompt"):
+        prompt = planning_prompt(description, obs["mission"], previous_goal)
+    logger.info("\n****PLANNING AGENT PROMPT****\n%s\n", prompt)
+    with trace_context(step=env.unwrapped.step_count):
+        response = openai_call(prompt, agent="planning_agent")
+    logger.info("\n****PLANNING AGENT RESPONSE****\n%s\n", response)
+    with timer("parse"):
+        return response.strip().lower()
+
+
+def plan_key(index: SpatialIndex, mission: str) -> Tuple:
+    return normalize_mission(mission), scene_signature(index)
+
+
+def cached_plan(key: Tuple) -> Optional[List[Subgoal]]:
+    plan = PLAN_CACHE.get(key, tag="decomposition_agent")
+    if plan is None:
+        return None
+    count("plan_cache_hit")
+    return list(plan)
+
+
+def cache_plan(key: Tuple, plan: List[Subgoal]):
+    # A reply without objectives (off-template, a refusal) is not cached, so
+    # the scene is planned again next episode
+    if plan:
+        PLAN_CACHE.set(key, tuple(plan))
+
+
+def decomposition_agent(env, obs) -> List[Subgoal]:
+    """Every subgoal of the episode, planned in one call"""
+    index = SpatialIndex.of(env)
+    key = plan_key(index, obs["mission"])
+    plan = cached_plan(key)
+    if plan is not None:
+        return plan
+    with timer("prompt"):
+        prompt = decomposition_prompt(obs["mission"], describe_scene(index))
+    logger.info("\n****DECOMPOSITION AGENT PROMPT****\n%s\n", prompt)
+    with trace_context(step=env.unwrapped.step_count):
+        response = openai_call(prompt, agent="decomposition_agent", max_tokens=300)
+    logger.info("\n****DECOMPOSITION AGENT RESPONSE****\n%s\n", response)
+    with timer("parse"):
+        plan = parse_plan(response)
+    cache_plan(key, plan)
+    return plan
+
+
+def plan_episode(env, obs) -> Tuple[List[Subgoal], str]:
+    """The episode's plan and its first goal; call after each reset"""
+    plan = decomposition_agent(env, obs) if PLAN_EPISODES else []
+    return plan, next_goal(env, obs, plan, previous_goal="")
+
+
+def next_goal(env, obs, plan: List[Subgoal], previous_goal: str) -> str:
+    """The plan's next subgoal (taken off the plan) or, once it is empty, the
+    planning agent's next goal"""
+    if plan:
+        return plan.pop(0).text
+    return planning_agent(env, obs, previous_goal)
+
+
+def make_evaluation_filter() -> EvaluationFilter:
+    # With a budget of 0 every step is evaluated
+    return EvaluationFilter(EVALUATION_STEP_BUDGET if FILTER_EVALUATIONS else 0)
+
+
+def filtered_evaluation(
+    env, obs, current_goal: str, evaluation_filter: EvaluationFilter
+) -> str:
+    """evaluation_agent's answer, or "no" if the last step cannot have changed it"""
+    if not evaluation_filter.should_evaluate(current_goal, SpatialIndex.of(env)):
+        count("evaluations_skipped")
+        return "no"
+    return evaluation_agent(env, obs, current_goal)
+
+
+def resolve_goal_locally(index: SpatialIndex, current_goal: str) -> Optional[str]:
+    """'yes' or 'no' if the spatial index decides the goal, else None"""
+    if not RESOLVE_GOALS_LOCALLY:
+        return None
+    with timer("resolve_goal"):
+        achieved = resolve_goal(current_goal, index)
+    if achieved is None:
+        return None
+    count("goals_resolved_locally")
+    return "yes" if achieved else "no"
+
+
+def parse_evaluation(response: str) -> str:
+    with timer("parse"):
+        answer = response.strip().lower()
+    if answer not in ("yes", "no", "need more information"):
+        raise ValueError(f"Invalid response: {response}")
+    return answer
+
+
+def out_of_tool_rounds() -> str:
+    count("tool_rounds_exhausted")
+    logger.info("No answer after %d tool rounds; goal not achieved", MAX_TOOL_ROUNDS)
+    return "no"
+
+
+def evaluation_agent(env, obs, current_goal: str, additional_context: str = ""):
+    index = SpatialIndex.of(env)
+    if not additional_context:
+        answer = resolve_goal_locally(index, current_goal)
+        if answer is not None:
+            return answer
+    session = TOOLS.session(index)
+    description = describe_environment(env, obs)
+    for tool_round in range(MAX_TOOL_ROUNDS + 1):
+        with timer("prompt"):
+            prompt = evaluation_prompt(
+                description, obs["mission"], current_goal, additional_context
+            )
+        logger.info("\n****EVALUATION AGENT PROMPT****\n%s\n", prompt)
+        with trace_context(step=env.unwrapped.step_count):
+            response = openai_call(
+                prompt, agent="evaluation_agent", early_stop=EVALUATION_EARLY_STOP
+            )
+        logger.info("\n****EVALUATION AGENT RESPONSE****\n%s\n", response)
+
+        answer = parse_evaluation(response)
+        if answer != "need more information":
+            return answer
+        if tool_round == MAX_TOOL_ROUNDS:
+            break
+        tool_choice_response = tool_choice_agent(
+            env, obs, current_goal, additional_context
+        )
+        additional_context += run_tool_choice(obs, tool_choice_response, session)
+    return out_of_tool_rounds()
+
+
+def tool_choice_agent(env, obs, current_goal: str, additional_context: str) -> str:
+    description = describe_environment(env, obs)
+    with timer("prompt"):
+        prompt = tool_choice_prompt(
+            description, obs["mission"], current_goal, additional_context
+        )
+    logger.info("\n****TOOL CHOICE AGENT PROMPT****\n%s\n", prompt)
+    with trace_context(step=env.unwrapped.step_count):
+        response = openai_call(
+            prompt, agent="tool_choice_agent", early_stop=TOOL_CHOICE_EARLY_STOP
+        )
+    logger.info("\n****TOOL CHOICE AGENT RESPONSE****\n%s\n", response)
+    with timer("parse"):
+        return response.strip().lower()
+
+
+# Async agents, for running many episodes at once. They see the env through
+# observe_env, so they also work when the env lives in another process.
+def observe_env(env: gym.Env, obs: Dict) -> Dict:
+    return {
+        **obs,
+        "description": describe_environment(env, obs),
+        "index": SpatialIndex.from_env(env),
+    }
+
+
+async def aplanning_agent(obs, previous_goal: str) -> str:
+    with timer("prompt"):
+        prompt = planning_prompt(obs["description"], obs["mission"], previous_goal)
+    response = await aopenai_call(prompt, agent="planning_agent")
+    with timer("parse"):
+        return response.strip().lower()
+
+
+async def adecomposition_agent(obs) -> List[Subgoal]:
+    key = plan_key(obs["index"], obs["mission"])
+    plan = cached_plan(key)
+    if plan is not None:
+        return plan
+    with timer("prompt"):
+        prompt = decomposition_prompt(obs["mission"], describe_scene(obs["index"]))
+    response = await aopenai_call(prompt, agent="decomposition_agent", max_tokens=300)
+    with timer("parse"):
+        plan = parse_plan(response)
+    cache_plan(key, plan)
+    return plan
+
+
+async def aplan_episode(obs) -> Tuple[List[Subgoal], str]:
+    plan = await adecomposition_agent(obs) if PLAN_EPISODES else []
+    return plan, await anext_goal(obs, plan, previous_goal="")
+
+
+async def anext_goal(obs, plan: List[Subgoal], previous_goal: str) -> str:
+    if plan:
+        return plan.pop(0).text
+    return await aplanning_agent(obs, previous_goal)
+
+
+async def aevaluation_agent(obs, current_goal: str, additional_context: str = ""):
+    if not additional_context:
+        answer = resolve_goal_locally(obs["index"], current_goal)
+        if answer is not None:
+            return answer
+    session = TOOLS.session(obs["index"])
+    for tool_round in range(MAX_TOOL_ROUNDS + 1):
+        with timer("prompt"):
+            prompt = evaluation_prompt(
+                obs["description"], obs["mission"], current_goal, additional_context
+            )
+        response = await aopenai_call(
+            prompt, agent="evaluation_agent", early_stop=EVALUATION_EARLY_STOP
+        )
+
+        answer = parse_evaluation(response)
+        if answer != "need more information":
+            return answer
+        if tool_round == MAX_TOOL_ROUNDS:
+            break
+        tool_choice_response = await atool_choice_agent(
+            obs, current_goal, additional_context
+        )
+        additional_context += run_tool_choice(obs, tool_choice_response, session)
+    return out_of_tool_rounds()
+
+
+async def atool_choice_agent(obs, current_goal: str, additional_context: str) -> str:
+    with timer("prompt"):
+        prompt = tool_choice_prompt(
+            obs["description"], obs["mission"], current_goal, additional_context
+        )
+    response = await aopenai_call(
+        prompt, agent="tool_choice_agent", early_stop=TOOL_CHOICE_EARLY_STOP
+    )
+    with timer("parse"):
+        return response.strip().lower()
 
 
 from minigrid.core.actions import Actions
@@ -512,7 +836,8 @@ def manual_control():
     obs, _ = env.reset()
     env.render()
     previous_goal = ""
-    current_goal = planning_agent(env, obs, previous_goal)
+    plan, current_goal = plan_episode(env, obs)
+    evaluation_filter = make_evaluation_filter()
 
     while True:
         # Step the agent
@@ -527,39 +852,233 @@ def manual_control():
                 env.render()
 
                 # Evaluate the agent
-                evaluation = evaluation_agent(env, obs, current_goal)
+                evaluation = filtered_evaluation(
+                    env, obs, current_goal, evaluation_filter
+                )
                 if evaluation == "yes":
                     previous_goal = current_goal
-                    current_goal = planning_agent(env, obs, previous_goal)
+                    current_goal = next_goal(env, obs, plan, previous_goal)
                 elif evaluation == "no":
                     pass
                 else:
                     raise ValueError(f"Invalid evaluation: {evaluation}")
 
+                if terminated or truncated:
+                    print(
+                        f"\n****EPISODE FINISHED****\n{PROMPT_MEMO.summary()}\n"
+                        f"{evaluation_filter.summary()}\n"
+                    )
+                    PROMPT_MEMO.reset_stats()
+                    obs, _ = env.reset()
+                    env.render()
+                    previous_goal = ""
+                    plan, current_goal = plan_episode(env, obs)
+                    evaluation_filter.reset()
 
-def main():
-    env = PutNearEnv(size=6, numObjs=2, max_steps=50, render_mode="human")
-    obs, _ = env.reset()
-    env.render()
+
+def make_env() -> gym.Env:
+    return PutNearEnv(size=6, numObjs=2, max_steps=50)
+
+
+class PutNearAgent(EpisodeAgent):
+    """The planning/evaluation loop of main(), for EpisodeRunner
+
+    Actions are random (seeded); goals are planned and evaluated by the LLM.
+    """
+
+    def __init__(self, seed: Optional[int] = None):
+        self.rng = random.Random(seed)
+        self.previous_goal = ""
+        self.current_goal = ""
+        self.plan: List[Subgoal] = []
+        self.goals_achieved = 0
+        self.evaluation_filter = make_evaluation_filter()
+
+    async def reset(self, obs):
+        self.plan, self.current_goal = await aplan_episode(obs)
+
+    async def act(self, obs):
+        return self.rng.randrange(len(Actions))
+
+    async def observe(self, obs, reward, terminated, truncated):
+        if terminated or truncated:
+            # No need for a next goal
+            return
+        if not self.evaluation_filter.should_evaluate(self.current_goal, obs["index"]):
+            count("evaluations_skipped")
+            return
+        evaluation = await aevaluation_agent(obs, self.current_goal)
+        if evaluation == "yes":
+            self.goals_achieved += 1
+            self.previous_goal = self.current_goal
+            self.current_goal = await anext_goal(obs, self.plan, self.previous_goal)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "goals_achieved": self.goals_achieved,
+            "goal": self.current_goal,
+            "evaluations": self.evaluation_filter.evaluated,
+            "evaluations_skipped": self.evaluation_filter.skipped,
+        }
+
+
+def evaluate(
+    num_episodes: int = 100,
+    seed: int = 0,
+    max_steps: Optional[int] = None,
+    max_concurrency: int = 16,
+    num_workers: int = 0,
+    results_path: Optional[str] = None,
+    trace_path: Optional[str] = None,
+) -> List[EpisodeResult]:
+    """Run PutNearAgent on seeds seed, ..., seed + num_episodes - 1 concurrently
+
+    Each result is appended to `results_path` (JSON Lines) as its episode ends.
+    If `trace_path` is given, every LLM request is traced to it (JSON Lines,
+    see gpt_text_gym.gpt.trace) and summarized per agent at the end.
+    """
+    sink = JSONLSink(results_path) if results_path is not None else None
+    runner = EpisodeRunner(
+        make_env,
+        PutNearAgent,
+        max_steps=max_steps,
+        max_concurrency=max_concurrency,
+        num_workers=num_workers,
+        observe=observe_env,
+        sink=sink,
+    )
+
+    async def run():
+        async with openai_aiosession(max_connections=max_concurrency):
+            return await runner.arun(range(seed, seed + num_episodes))
+
+    tracer = tracing(trace_path) if trace_path is not None else contextlib.nullcontext()
+    try:
+        with tracer:
+            results = asyncio.run(run())
+    finally:
+        if sink is not None:
+            sink.close()
+
+    successes = sum(result.reward > 0 for result in results)
+    errors = sum(result.error is not None for result in results)
+    print("\n****EVALUATION FINISHED****")
+    print(f"{successes}/{len(results)} episodes succeeded, {errors} failed")
+    print(PROMPT_MEMO.summary())
+    if trace_path is not None:
+        print(summarize_trace(load_trace(trace_path)))
+    return results
+
+
+def main(
+    max_episodes: Optional[int] = None,
+    headless: bool = False,
+    record_path: Optional[str] = None,
+    profile: bool = False,
+    chrome_trace_path: Optional[str] = None,
+):
+    """Random actions, goals planned and evaluated by the LLM
+
+    Runs until `max_episodes` episodes have ended (forever if None).
+    headless: never render (no display needed), for full speed on servers.
+        Otherwise the env renders itself in a window on every reset and step.
+    record_path: save a compact recording of every frame there (.npz), to
+        render offline with gpt_text_gym.envs.minigrid.recording.
+    profile: print the time spent in each phase of the loop at the end;
+        chrome_trace_path: also write the phases there as a Chrome trace.
+    """
+    env = PutNearEnv(
+        size=6, numObjs=2, max_steps=50, render_mode=None if headless else "human"
+    )
+    if record_path is not None:
+        env = FrameRecorder(env)
+    profile = profile or chrome_trace_path is not None
+    profiler = (
+        profiling(trace_events=chrome_trace_path is not None)
+        if profile
+        else contextlib.nullcontext()
+    )
+    with profiler as profiler:
+        try:
+            _main_loop(env, max_episodes)
+        finally:
+            env.close()
+            if record_path is not None:
+                env.save(record_path)
+            if profile:
+                print(f"\n****PROFILE****\n{profiler.summary()}\n")
+            if chrome_trace_path is not None:
+                profiler.write_chrome_trace(chrome_trace_path)
+
+
+def _main_loop(env: gym.Env, max_episodes: Optional[int]):
+    # In "human" render mode, reset and step also render (at most at the
+    # env's render_fps), so their timers include rendering
+    with timer("env.reset"):
+        obs, _ = env.reset()
     previous_goal = ""
-    current_goal = planning_agent(env, obs, previous_goal)
+    plan, current_goal = plan_episode(env, obs)
+    evaluation_filter = make_evaluation_filter()
 
-    while True:
+    episodes = 0
+    while max_episodes is None or episodes < max_episodes:
         # Step the agent
         action = env.action_space.sample()
-        obs, _, terminated, truncated, _ = env.step(action)
-        env.render()
+        with timer("env.step"):
+            obs, _, terminated, truncated, _ = env.step(action)
+        count("steps")
 
         # Evaluate the agent
-        evaluation = evaluation_agent(env, obs, current_goal)
+        evaluation = filtered_evaluation(env, obs, current_goal, evaluation_filter)
         if evaluation == "yes":
             previous_goal = current_goal
-            current_goal = planning_agent(env, obs, previous_goal)
+            current_goal = next_goal(env, obs, plan, previous_goal)
         elif evaluation == "no":
             pass
         else:
             raise ValueError(f"Invalid evaluation: {evaluation}")
 
+        if terminated or truncated:
+            episodes += 1
+            count("episodes")
+            print(
+                f"\n****EPISODE FINISHED****\n{PROMPT_MEMO.summary()}\n"
+                f"{evaluation_filter.summary()}\n"
+            )
+            PROMPT_MEMO.reset_stats()
+            with timer("env.reset"):
+                obs, _ = env.reset()
+            previous_goal = ""
+            plan, current_goal = plan_episode(env, obs)
+            evaluation_filter.reset()
+
 
 if __name__ == "__main__":
-    manual_control()
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Manual control by default; random actions with --auto"
+    )
+    parser.add_argument("--auto", action="store_true", help="run main()")
+    parser.add_argument("--headless", action="store_true", help="never render")
+    parser.add_argument("--episodes", type=int, default=None)
+    parser.add_argument("--record", help="save a compact recording (.npz) here")
+    parser.add_argument("--profile", action="store_true")
+    parser.add_argument("--chrome-trace", help="write the loop phases here")
+    parser.add_argument("--quiet", action="store_true", help="don't log prompts")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.WARNING if args.quiet else logging.INFO, format="%(message)s"
+    )
+    if args.auto or args.headless:
+        main(
+            max_episodes=args.episodes,
+            headless=args.headless,
+            record_path=args.record,
+            profile=args.profile,
+            chrome_trace_path=args.chrome_trace,
+        )
+    else:
+        manual_control()
@@ -1,5 +1,48 @@
+from gpt_text_gym.gpt.backends import (
+    Backend,
+    HTTPBackend,
+    LocalBackend,
+    OpenAIBackend,
+)
+from gpt_text_gym.gpt.budget import (
+    PromptBudget,
+    count_tokens,
+    context_limit,
+    limit_tokens_from_string,
+    prompt_limit,
+)
+from gpt_text_gym.gpt.cache import CompletionCache, PromptMemo
 from gpt_text_gym.gpt.chat_completer import (
     GPTChatCompleter,
+    openai_aiosession,
+    openai_chat_completion_acreate,
+    openai_chat_completion_astream,
     openai_chat_completion_create,
+    openai_chat_completion_stream,
+)
+from gpt_text_gym.gpt.fake import FakeLLM
+from gpt_text_gym.gpt.history import (
+    Compaction,
+    FixedWindow,
+    HistoryPolicy,
+    TokenWindow,
+    pin,
+)
+from gpt_text_gym.gpt.scheduler import RequestScheduler, TokenBucket
+from gpt_text_gym.gpt.streaming import (
+    EarlyStop,
+    complete_stream,
+    early_stop_key,
+    match_line,
+    match_prefix,
+)
+from gpt_text_gym.gpt.trace import (
+    TraceWriter,
+    disable_tracing,
+    enable_tracing,
+    load_trace,
+    summarize_trace,
+    trace_context,
+    tracing,
 )
 from gpt_text_gym.gpt.message import Message, RawMessage, default_system_message
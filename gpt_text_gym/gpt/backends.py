@@ -0,0 +1,253 @@
+""" Backends that produce chat completions """
+
+import abc
+import asyncio
+import contextvars
+import re
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+)
+from gpt_text_gym.config import get_api_key
+from gpt_text_gym.gpt.message import RawMessage
+
+# Request parameters: model, messages, n, temperature, max_tokens and extras
+Params = Dict[str, Any]
+# Sends one request: call(backend.create, params), e.g. through a scheduler
+Call = Callable[[Callable[..., Any], Params], Any]
+ACall = Callable[[Callable[..., Awaitable], Params], Awaitable]
+# Maps the messages of a request to the reply
+Respond = Callable[[List[RawMessage]], str]
+
+
+def direct_call(fn: Callable[..., Any], params: Params) -> Any:
+    return fn(**params)
+
+
+async def adirect_call(fn: Callable[..., Awaitable], params: Params) -> Any:
+    return await fn(**params)
+
+
+class Backend(abc.ABC):
+    """Interface between the completion helpers and a model
+
+    Responses and streamed chunks follow the OpenAI chat completion format,
+    so callers do not depend on the backend. Subclasses implement create,
+    acreate, stream and astream; batch and abatch send the requests of a
+    batch concurrently unless overridden, e.g. by a model that answers a
+    batch in one pass.
+    """
+
+    @abc.abstractmethod
+    def create(self, **params):
+        ...
+
+    @abc.abstractmethod
+    async def acreate(self, **params):
+        ...
+
+    @abc.abstractmethod
+    def stream(self, **params) -> Iterator[Dict]:
+        ...
+
+    @abc.abstractmethod
+    async def astream(self, **params) -> AsyncIterator[Dict]:
+        ...
+
+    def batch(
+        self, requests: Sequence[Params], max_workers: int = 8, call: Call = direct_call
+    ) -> List:
+        """Responses to `requests`, in order; each is sent with call(create, params)"""
+        # Each request runs in a copy of the caller's context (e.g. trace_context)
+        contexts = [contextvars.copy_context() for _ in requests]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(
+                executor.map(
+                    lambda context, params: context.run(call, self.create, params),
+                    contexts,
+                    requests,
+                )
+            )
+
+    async def abatch(
+        self, requests: Sequence[Params], call: ACall = adirect_call
+    ) -> List:
+        """Async counterpart of batch"""
+        return list(
+            await asyncio.gather(*(call(self.acreate, params) for params in requests))
+        )
+
+
+class OpenAIBackend(Backend):
+    """The OpenAI API, through openai.ChatCompletion
+
+    openai is imported on the first request. Unless openai.api_key is already
+    set (e.g. from OPENAI_API_KEY), it is then set from the .env file.
+    api_key, api_base: override openai.api_key / openai.api_base for this
+    backend's requests only.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, api_base: Optional[str] = None):
+        self.overrides = {}
+        if api_key is not None:
+            self.overrides["api_key"] = api_key
+        if api_base is not None:
+            self.overrides["api_base"] = api_base
+
+    def _api(self):
+        import openai
+
+        if openai.api_key is None and "api_key" not in self.overrides:
+            openai.api_key = get_api_key()
+        return openai.ChatCompletion
+
+    def create(self, **params):
+        return self._api().create(**params, **self.overrides)
+
+    async def acreate(self, **params):
+        return await self._api().acreate(**params, **self.overrides)
+
+    def stream(self, **params) -> Iterator[Dict]:
+        return self._api().create(stream=True, **params, **self.overrides)
+
+    async def astream(self, **params) -> AsyncIterator[Dict]:
+        return await self._api().acreate(stream=True, **params, **self.overrides)
+
+
+class HTTPBackend(OpenAIBackend):
+    """A local server speaking the OpenAI chat completion protocol
+
+    e.g. a stand-in server for tests, or a local model served by vLLM or
+    llama.cpp. Such servers usually ignore the API key.
+    """
+
+    def __init__(
+        self, base_url: str = "http://localhost:8000/v1", api_key: str = "local"
+    ):
+        super().__init__(api_key=api_key, api_base=base_url)
+        self.base_url = base_url
+
+
+def stream_pieces(reply: str) -> List[str]:
+    """Split a reply into word-sized stream chunks"""
+    return re.findall(r"\s*\S+|\s+", reply) or [reply]
+
+
+def stream_chunk(content: str) -> Dict:
+    return {"choices": [{"index": 0, "delta": {"content": content}}]}
+
+
+class LocalBackend(Backend):
+    """In-process backend, e.g. a small local model or a rule-based policy
+
+    respond(messages) produces each reply. If given, respond_batch(list of
+    messages) answers a whole batch in one call, e.g. one forward pass.
+    Nothing leaves the process: no network, threads or event loop round trips.
+    concurrent: send the requests of a batch one by one through `call`, as
+        Backend.batch does, e.g. to simulate a remote model's latency.
+    Calls and (estimated) token usage are counted.
+    """
+
+    def __init__(
+        self,
+        respond: Respond,
+        respond_batch: Optional[Callable[[List[List[RawMessage]]], List[str]]] = None,
+        concurrent: bool = False,
+    ):
+        self.respond = respond
+        self.respond_batch = respond_batch
+        self.concurrent = concurrent
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def reply(self, messages: List[RawMessage]) -> str:
+        return self.respond(messages)
+
+    def _usage(self, messages: List[RawMessage], replies: List[str]) -> Dict[str, int]:
+        # Same ~4 characters/token estimate as the scheduler
+        usage = {
+            "prompt_tokens": sum(len(m["content"]) // 4 + 4 for m in messages),
+            "completion_tokens": sum(len(reply) // 4 + 1 for reply in replies),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        self.calls += 1
+        self.prompt_tokens += usage["prompt_tokens"]
+        self.completion_tokens += usage["completion_tokens"]
+        return usage
+
+    def _response(self, model: str, messages: List[RawMessage], replies: List[str]):
+        from openai.openai_object import OpenAIObject
+
+        return OpenAIObject.construct_from(
+            {
+                "object": "chat.completion",
+                "model": model,
+                "choices": [
+                    {
+                        "index": idx,
+                        "message": {"role": "assistant", "content": reply},
+                        "finish_reason": "stop",
+                    }
+                    for idx, reply in enumerate(replies)
+                ],
+                "usage": self._usage(messages, replies),
+            }
+        )
+
+    def create(self, model: str, messages: List[RawMessage], n: int = 1, **kwargs):
+        replies = [self.reply(messages) for _ in range(n)]
+        return self._response(model, messages, replies)
+
+    async def acreate(self, **params):
+        return self.create(**params)
+
+    def stream(self, messages: List[RawMessage], **kwargs) -> Iterator[Dict]:
+        reply = self.reply(messages)
+        self._usage(messages, [reply])
+        return (stream_chunk(piece) for piece in stream_pieces(reply))
+
+    async def astream(self, messages: List[RawMessage], **kwargs):
+        reply = self.reply(messages)
+        self._usage(messages, [reply])
+
+        async def chunks() -> AsyncIterator[Dict]:
+            for piece in stream_pieces(reply):
+                yield stream_chunk(piece)
+
+        return chunks()
+
+    def batch(
+        self, requests: Sequence[Params], max_workers: int = 8, call: Call = direct_call
+    ) -> List:
+        """Answers the batch in this thread; requests are not sent through `call`
+        unless the backend is concurrent"""
+        if self.concurrent:
+            return super().batch(requests, max_workers, call)
+        if self.respond_batch is None or any(p.get("n", 1) != 1 for p in requests):
+            return [self.create(**params) for params in requests]
+        replies = self.respond_batch([params["messages"] for params in requests])
+        return [
+            self._response(params["model"], params["messages"], [reply])
+            for params, reply in zip(requests, replies)
+        ]
+
+    async def abatch(
+        self, requests: Sequence[Params], call: ACall = adirect_call
+    ) -> List:
+        if self.concurrent:
+            return await super().abatch(requests, call)
+        return self.batch(requests)
+
+
+# Used by the completion helpers when no backend is given
+DEFAULT_BACKEND = OpenAIBackend()
@@ -0,0 +1,186 @@
+""" Token budgets for prompts and chat histories """
+
+import functools
+
+from typing import Callable, List, Optional, Sequence
+from gpt_text_gym.gpt.message import Message, is_system
+
+# Context window of each model, in tokens
+MODEL_CONTEXT_LIMITS = {
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+    "gpt-3.5-turbo": 4096,
+    "gpt-3.5-turbo-16k": 16384,
+}
+DEFAULT_CONTEXT_LIMIT = 4096
+
+# Formatting overhead of every message in a request, and of priming the reply
+TOKENS_PER_MESSAGE = 4
+TOKENS_PER_REPLY = 3
+
+
+def context_limit(model: str) -> int:
+    return MODEL_CONTEXT_LIMITS.get(model, DEFAULT_CONTEXT_LIMIT)
+
+
+def prompt_limit(model: str, max_tokens: Optional[int]) -> int:
+    """Tokens left for a single-message prompt once the reply is reserved"""
+    return (
+        context_limit(model) - (max_tokens or 0) - TOKENS_PER_MESSAGE - TOKENS_PER_REPLY
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model: str):
+    """tiktoken encoding for `model`, created once; None if tiktoken is missing"""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")  # Fallback for others.
+
+
+def count_tokens(text: str, model: str) -> int:
+    encoding = get_encoding(model)
+    if encoding is None:
+        # Rough estimate of ~4 characters per token
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text))
+
+
+def limit_tokens_from_string(string: str, model: str, limit: int) -> str:
+    """Limits the string to a number of tokens (estimated)."""
+    if len(string) <= limit:
+        # Every token is at least one character, so the string already fits
+        return string
+    encoding = get_encoding(model)
+    if encoding is None:
+        return string[: 4 * limit]
+    return encoding.decode(encoding.encode(string)[:limit])
+
+
+class PromptBudget:
+    """Keeps a chat history within a model's context window
+
+    Token counts are computed once per message as it is added, so tracking
+    the total costs one encode of the new message rather than re-encoding
+    the whole history. When the history no longer fits, the oldest messages
+    are dropped: pinned messages (by default system messages) and the latest
+    message are never dropped.
+    If `summarize` is given, the dropped messages are replaced by the
+    message it returns; give it a non-system role so that it can itself be
+    dropped or summarized later.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        max_tokens: Optional[int] = None,
+        limit: Optional[int] = None,
+        summarize: Optional[Callable[[List[Message]], Message]] = None,
+        count: Callable[[str, str], int] = count_tokens,
+        pinned: Callable[[Message], bool] = is_system,
+    ):
+        """
+        max_tokens: tokens reserved for the reply.
+        limit: context window; defaults to MODEL_CONTEXT_LIMITS[model].
+        pinned: messages for which it returns True are never dropped.
+        """
+        self.model = model
+        self.limit = (
+            (context_limit(model) if limit is None else limit)
+            - (max_tokens or 0)
+            - TOKENS_PER_REPLY
+        )
+        self.summarize = summarize
+        self.count = count
+        self.pinned = pinned
+        self.messages: List[Message] = []
+        self.counts: List[int] = []
+        self.total = 0
+
+    def message_tokens(self, message: Message) -> int:
+        return self.count(message.content, self.model) + TOKENS_PER_MESSAGE
+
+    def add(self, message: Message):
+        tokens = self.message_tokens(message)
+        self.messages.append(message)
+        self.counts.append(tokens)
+        self.total += tokens
+
+    def reset(self, history: Sequence[Message] = ()):
+        self.messages = list(history)
+        self.counts = [self.message_tokens(message) for message in history]
+        self.total = sum(self.counts)
+
+    def sync(self, history: Sequence[Message]):
+        """Recount `history` after it was changed other than through add and fit
+
+        If messages were only appended since the budget last saw it (the last
+        known message is still at its position), just those are added, so a
+        step costs O(new messages). Otherwise (messages were dropped or
+        inserted) messages counted before keep their count, so only new ones
+        are encoded. Replacing a message in place is not detected; call
+        reset(history) after that.
+        """
+        seen = len(self.messages)
+        if len(history) >= seen and (
+            seen == 0 or history[seen - 1] is self.messages[-1]
+        ):
+            for message in history[seen:]:
+                self.add(message)
+            return
+        known = {id(message): n for message, n in zip(self.messages, self.counts)}
+        self.messages = list(history)
+        self.counts = [
+            known[id(message)] if id(message) in known else self.message_tokens(message)
+            for message in history
+        ]
+        self.total = sum(self.counts)
+
+    def _oldest_droppable(self, history: List[Message]) -> Optional[int]:
+        for idx, message in enumerate(history[:-1]):
+            if not self.pinned(message):
+                return idx
+        return None
+
+    def fit(self, history: List[Message]) -> List[Message]:
+        """Drop the oldest messages of `history` in place until it fits
+
+        `history` must be the list whose messages were passed to add(), in
+        order. Returns the dropped messages. With `summarize`, the summary
+        replaces them where the first one was; if the summary does not fit,
+        more messages are dropped and summarize is called again.
+        """
+        dropped: List[Message] = []
+        first_idx = None
+        # Room to leave for the summary of the dropped messages
+        reserve = 0
+        while True:
+            while self.total + reserve > self.limit:
+                idx = self._oldest_droppable(history)
+                if idx is None:
+                    break
+                first_idx = idx if first_idx is None else first_idx
+                dropped.append(history.pop(idx))
+                self.messages.pop(idx)
+                self.total -= self.counts.pop(idx)
+
+            if not dropped or self.summarize is None:
+                return dropped
+            summary = self.summarize(dropped)
+            tokens = self.message_tokens(summary)
+            if (
+                self.total + tokens <= self.limit
+                or self._oldest_droppable(history) is None
+            ):
+                history.insert(first_idx, summary)
+                self.messages.insert(first_idx, summary)
+                self.counts.insert(first_idx, tokens)
+                self.total += tokens
+                return dropped
+            reserve = tokens
@@ -0,0 +1,186 @@
+""" Persistent cache of chat completion responses """
+
+import collections
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from pathlib import Path
+from typing import Any, Dict, Hashable, Optional, Union
+from gpt_text_gym import ROOT_DIR
+
+DEFAULT_CACHE_PATH = ROOT_DIR / ".cache" / "completions.sqlite"
+
+
+class CompletionCache:
+    """SQLite-backed cache of chat completion responses
+
+    Responses are keyed on a stable hash of every request parameter (model,
+    messages, n, temperature, max_tokens and extra kwargs). With temperature 0
+    this makes re-running an experiment free: every repeated request is served
+    from disk. Entries older than `max_age` seconds are ignored and evicted, and
+    the oldest entries are dropped once there are more than `max_entries`.
+    Eviction runs every `EVICT_EVERY` writes, so the cache may briefly exceed
+    `max_entries` by that many entries.
+    """
+
+    EVICT_EVERY = 64
+
+    def __init__(
+        self,
+        path: Union[str, Path] = DEFAULT_CACHE_PATH,
+        max_entries: Optional[int] = None,
+        max_age: Optional[float] = None,
+    ):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # Opened on first use so that creating a cache has no side effects
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS completions "
+                "(key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS completions_created ON completions (created)"
+            )
+        return self._conn
+
+    @staticmethod
+    def key(**params: Any) -> str:
+        """Stable hash of the request parameters"""
+        serialized = json.dumps(params, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        """The cached response as an OpenAIObject, or None"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT response, created FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or self._expired(row[1]):
+            self.misses += 1
+            return None
+        self.hits += 1
+        from openai.openai_object import OpenAIObject
+
+        return OpenAIObject.construct_from(json.loads(row[0]))
+
+    def set(self, key: str, response: Dict[str, Any]):
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO completions VALUES (?, ?, ?)",
+                (key, json.dumps(response), time.time()),
+            )
+            self._writes += 1
+            if self._writes % self.EVICT_EVERY == 0:
+                self._evict()
+            self.conn.commit()
+
+    def _expired(self, created: float) -> bool:
+        return self.max_age is not None and time.time() - created > self.max_age
+
+    def _evict(self):
+        if self.max_age is not None:
+            self.conn.execute(
+                "DELETE FROM completions WHERE created < ?",
+                (time.time() - self.max_age,),
+            )
+        if self.max_entries is not None:
+            self.conn.execute(
+                "DELETE FROM completions WHERE key NOT IN "
+                "(SELECT key FROM completions ORDER BY created DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self):
+        with self._lock:
+            self.conn.execute("DELETE FROM completions")
+            self.conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+
+    def __str__(self):
+        return f"CompletionCache({self.path}, hits={self.hits}, misses={self.misses})"
+
+
+class PromptMemo:
+    """In-memory LRU memo of completions keyed on the rendered prompt
+
+    Sits in front of the completion call within a process: when an agent
+    renders exactly the same prompt again (e.g. the environment description
+    did not change after a step), the previous answer is reused without a
+    round trip. Entries expire after `ttl` seconds if given. Hits and misses
+    are counted per tag (e.g. per agent) so skipped calls can be reported.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits: collections.Counter = collections.Counter()
+        self.misses: collections.Counter = collections.Counter()
+        self._entries: "collections.OrderedDict[Hashable, Any]" = (
+            collections.OrderedDict()
+        )
+
+    def get(self, key: Hashable, tag: str = "") -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is not None and (
+            self.ttl is None or time.monotonic() - entry[0] <= self.ttl
+        ):
+            self._entries.move_to_end(key)
+            self.hits[tag] += 1
+            return entry[1]
+        if entry is not None:
+            del self._entries[key]
+        self.misses[tag] += 1
+        return None
+
+    def set(self, key: Hashable, value: Any):
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def reset_stats(self):
+        self.hits.clear()
+        self.misses.clear()
+
+    def clear(self):
+        self._entries.clear()
+        self.reset_stats()
+
+    def summary(self) -> str:
+        """One line per tag: calls made, calls skipped"""
+        lines = []
+        for tag in sorted(set(self.hits) | set(self.misses)):
+            hits, misses = self.hits[tag], self.misses[tag]
+            lines.append(
+                f"{tag or 'default'}: {misses} calls, {hits} skipped"
+                f" ({hits / (hits + misses):.0%})"
+            )
+        return "\n".join(lines)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,13 +1,35 @@
 """ Interface to GPT model."""
 
-import openai
-import dotenv
+import asyncio
+import contextlib
 
-from ml_collections import config_dict
-from dataclasses import dataclass
-from gpt_text_gym import ROOT_DIR
-from typing import List, NewType, Dict, Optional
+from gpt_text_gym.gpt.backends import DEFAULT_BACKEND, Backend, OpenAIBackend, Params
+from gpt_text_gym.gpt.budget import PromptBudget
+from gpt_text_gym.gpt.cache import CompletionCache
+from gpt_text_gym.gpt.history import HistoryPolicy, TokenWindow
+from gpt_text_gym.gpt.scheduler import (
+    DEFAULT_SCHEDULER,
+    RequestScheduler,
+    estimate_tokens,
+)
+from typing import (
+    AsyncIterator,
+    Iterator,
+    List,
+    NewType,
+    Dict,
+    Optional,
+    Sequence,
+    Tuple,
+)
 from gpt_text_gym.gpt.message import Message, RawMessage, default_system_message
+from gpt_text_gym.gpt.streaming import (
+    EarlyStop,
+    acomplete_stream,
+    complete_stream,
+    early_stop_key,
+)
+from gpt_text_gym.gpt.trace import start_request
 from gpt_text_gym.gpt.utils import remove_leading_whitespace
 
 
@@ -26,10 +48,71 @@ def openai_chat_completion_create(
     n: int,
     temperature: float,
     max_tokens: Optional[int],
+    cache: Optional[CompletionCache] = None,
+    scheduler: Optional[RequestScheduler] = None,
+    backend: Backend = DEFAULT_BACKEND,
     **kwargs,
 ):
-    """Wrapper around OpenAI's ChatCompletion.create method."""
-    return openai.ChatCompletion.create(
+    """Wrapper around OpenAI's ChatCompletion.create method.
+
+    If a cache is given, identical requests are answered from it. If a
+    scheduler is given, the request is rate limited and retried through it.
+    The request is sent to `backend`, the OpenAI API by default.
+    """
+    params = dict(
+        model=model,
+        messages=messages,
+        n=n,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        **kwargs,
+    )
+    trace = start_request(params)
+    if cache is not None:
+        key = cache.key(**params)
+        response = cache.get(key)
+        if response is not None:
+            if trace is not None:
+                trace.finish(response, cache_hit=True)
+            return response
+
+    create = backend.create if trace is None else trace.count(backend.create)
+    try:
+        if scheduler is None:
+            response = create(**params)
+        else:
+            tokens = estimate_tokens(messages, max_tokens)
+            response = scheduler.call(create, tokens=tokens, **params)
+    except BaseException as error:
+        if trace is not None:
+            trace.finish(error=error)
+        raise
+
+    if trace is not None:
+        trace.finish(response)
+    if cache is not None:
+        cache.set(key, response)
+    return response
+
+
+async def openai_chat_completion_acreate(
+    model: str,
+    messages: List[RawMessage],
+    n: int,
+    temperature: float,
+    max_tokens: Optional[int],
+    cache: Optional[CompletionCache] = None,
+    scheduler: Optional[RequestScheduler] = None,
+    backend: Backend = DEFAULT_BACKEND,
+    **kwargs,
+):
+    """Wrapper around OpenAI's ChatCompletion.acreate method.
+
+    If a cache is given, identical requests are answered from it. If a
+    scheduler is given, the request is rate limited and retried through it.
+    The request is sent to `backend`, the OpenAI API by default.
+    """
+    params = dict(
         model=model,
         messages=messages,
         n=n,
@@ -37,6 +120,191 @@ def openai_chat_completion_create(
         max_tokens=max_tokens,
         **kwargs,
     )
+    trace = start_request(params)
+    if cache is not None:
+        key = cache.key(**params)
+        response = cache.get(key)
+        if response is not None:
+            if trace is not None:
+                trace.finish(response, cache_hit=True)
+            return response
+
+    acreate = backend.acreate if trace is None else trace.count(backend.acreate)
+    try:
+        if scheduler is None:
+            response = await acreate(**params)
+        else:
+            tokens = estimate_tokens(messages, max_tokens)
+            response = await scheduler.acall(acreate, tokens=tokens, **params)
+    except BaseException as error:
+        if trace is not None:
+            trace.finish(error=error)
+        raise
+
+    if trace is not None:
+        trace.finish(response)
+    if cache is not None:
+        cache.set(key, response)
+    return response
+
+
+def _stream_cache_key(cache: CompletionCache, params: Params, stop_key: str) -> str:
+    return cache.key(**params, early_stop=stop_key)
+
+
+def _streamed_response(content: str) -> Dict:
+    """A streamed reply in the cached response format"""
+    return {"choices": [{"message": {"role": "assistant", "content": content}}]}
+
+
+def openai_chat_completion_stream(
+    model: str,
+    messages: List[RawMessage],
+    temperature: float,
+    max_tokens: Optional[int],
+    cache: Optional[CompletionCache] = None,
+    stop_key: str = "",
+    scheduler: Optional[RequestScheduler] = None,
+    backend: Backend = DEFAULT_BACKEND,
+    **kwargs,
+) -> Iterator[str]:
+    """Wrapper around OpenAI's streaming ChatCompletion.create method.
+
+    Yields the content of the reply as it arrives. Closing the iterator
+    abandons the rest of the response.
+    If a cache is given, the text read before the iterator was closed (e.g.
+    by complete_stream once its early stop decided) is stored, keyed on the
+    request and `stop_key`, the identity of what decides when to stop (see
+    early_stop_key). A repeated request replays that text as a single delta.
+    """
+    params = dict(
+        model=model,
+        messages=messages,
+        n=1,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        **kwargs,
+    )
+    trace = start_request(params, stream=True)
+    if cache is not None:
+        key = _stream_cache_key(cache, params, stop_key)
+        response = cache.get(key)
+        if response is not None:
+            content = response.choices[0].message.content
+            if trace is not None:
+                trace.finish(content=content, cache_hit=True)
+            yield content
+            return
+
+    stream = backend.stream if trace is None else trace.count(backend.stream)
+    # The streamed content, kept for the trace and the cache
+    parts: Optional[List[str]] = None if trace is None and cache is None else []
+    chunks = error = None
+    try:
+        if scheduler is None:
+            chunks = stream(**params)
+        else:
+            tokens = estimate_tokens(messages, max_tokens)
+            chunks = scheduler.call(stream, tokens=tokens, **params)
+        for chunk in chunks:
+            content = chunk["choices"][0]["delta"].get("content")
+            if content:
+                if parts is not None:
+                    parts.append(content)
+                yield content
+    except GeneratorExit:
+        raise
+    except BaseException as exception:
+        error = exception
+        raise
+    finally:
+        if trace is not None:
+            trace.finish(content="".join(parts), error=error)
+        if cache is not None and error is None and parts:
+            cache.set(key, _streamed_response("".join(parts)))
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+
+
+async def openai_chat_completion_astream(
+    model: str,
+    messages: List[RawMessage],
+    temperature: float,
+    max_tokens: Optional[int],
+    cache: Optional[CompletionCache] = None,
+    stop_key: str = "",
+    scheduler: Optional[RequestScheduler] = None,
+    backend: Backend = DEFAULT_BACKEND,
+    **kwargs,
+) -> AsyncIterator[str]:
+    """Async counterpart of openai_chat_completion_stream"""
+    params = dict(
+        model=model,
+        messages=messages,
+        n=1,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        **kwargs,
+    )
+    trace = start_request(params, stream=True)
+    if cache is not None:
+        key = _stream_cache_key(cache, params, stop_key)
+        response = cache.get(key)
+        if response is not None:
+            content = response.choices[0].message.content
+            if trace is not None:
+                trace.finish(content=content, cache_hit=True)
+            yield content
+            return
+
+    astream = backend.astream if trace is None else trace.count(backend.astream)
+    # The streamed content, kept for the trace and the cache
+    parts: Optional[List[str]] = None if trace is None and cache is None else []
+    chunks = error = None
+    try:
+        if scheduler is None:
+            chunks = await astream(**params)
+        else:
+            tokens = estimate_tokens(messages, max_tokens)
+            chunks = await scheduler.acall(astream, tokens=tokens, **params)
+        async for chunk in chunks:
+            content = chunk["choices"][0]["delta"].get("content")
+            if content:
+                if parts is not None:
+                    parts.append(content)
+                yield content
+    except GeneratorExit:
+        raise
+    except BaseException as exception:
+        error = exception
+        raise
+    finally:
+        if trace is not None:
+            trace.finish(content="".join(parts), error=error)
+        if cache is not None and error is None and parts:
+            cache.set(key, _streamed_response("".join(parts)))
+        aclose = getattr(chunks, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+@contextlib.asynccontextmanager
+async def openai_aiosession(max_connections: int = 100) -> AsyncIterator:
+    """Share one aiohttp session between all async completions in this context
+
+    Without it, openai opens a new session (and TCP/TLS connection) per request.
+    """
+    import aiohttp
+    import openai
+
+    connector = aiohttp.TCPConnector(limit=max_connections)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        token = openai.aiosession.set(session)
+        try:
+            yield session
+        finally:
+            openai.aiosession.reset(token)
 
 
 class GPTChatCompleter:
@@ -46,34 +314,299 @@ class GPTChatCompleter:
         temperature: float = 0.0,
         max_tokens: Optional[int] = None,
         n: int = 1,
+        semaphore: Optional[asyncio.Semaphore] = None,
+        cache: Optional[CompletionCache] = None,
+        scheduler: RequestScheduler = DEFAULT_SCHEDULER,
+        budget: Optional[PromptBudget] = None,
+        policies: Sequence[HistoryPolicy] = (),
+        backend: Optional[Backend] = None,
     ):
-        openai.api_key = dotenv.get_key(ROOT_DIR / ".env", "API_KEY")
+        """
+        semaphore: bounds the number of in-flight agenerate_chat_completion
+            requests; share one between completers to bound them all together.
+        cache: answers repeated requests without calling the API.
+        scheduler: rate limits and retries requests; the default one is
+            shared by all completers and only retries.
+        budget: keeps the chat history within the model's context window as
+            messages are added, dropping the oldest non-system messages.
+        policies: further bound the chat history as messages are added (see
+            gpt_text_gym.gpt.history), applied in order before the budget.
+        backend: where requests go (see gpt_text_gym.gpt.backends); defaults
+            to the OpenAI API (see OpenAIBackend for the API key).
+
+        Messages must not be modified once added: their serialized form is
+        cached for as long as they stay in the chat history.
+        """
+        self.backend = OpenAIBackend() if backend is None else backend
         self.chat_history: List[Message] = []
         self.model = model
         self.temperature = temperature
         self.max_tokens = max_tokens
         self.n = n
+        self.semaphore = semaphore
+        self.cache = cache
+        self.scheduler = scheduler
+        self.budget = budget
+        self.policies = list(policies)
+        if budget is not None:
+            self.policies.append(TokenWindow(budget))
+        self._serialized: Dict[int, Tuple[Message, RawMessage]] = {}
 
     def clear(self):
         self.chat_history = []
+        self._serialized = {}
+        for policy in self.policies:
+            policy.reset()
+
+    def _messages(self) -> List[RawMessage]:
+        """The chat history as sent to the API
+
+        Each message is serialized once and reused while it stays in the
+        history, so a call only serializes what was added since the last one.
+        """
+        serialized = self._serialized
+        messages = []
+        for message in self.chat_history:
+            entry = serialized.get(id(message))
+            if entry is None:
+                entry = serialized[id(message)] = (message, message.to_dict())
+            messages.append(entry[1])
+        if len(serialized) > len(messages):
+            # Forget messages that have been dropped from the history
+            self._serialized = {
+                id(message): serialized[id(message)] for message in self.chat_history
+            }
+        return messages
+
+    def _create(self, messages: List[RawMessage], **kwargs):
+        return openai_chat_completion_create(
+            model=self.model,
+            messages=messages,
+            n=self.n,
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            cache=self.cache,
+            scheduler=self.scheduler,
+            backend=self.backend,
+            **kwargs,
+        )
 
-    def generate_chat_completion(self, **kwargs):
-        messages = [message.to_dict() for message in self.chat_history]
-        response = openai_chat_completion_create(
+    async def _acreate(self, messages: List[RawMessage], **kwargs):
+        request = openai_chat_completion_acreate(
             model=self.model,
             messages=messages,
             n=self.n,
             temperature=self.temperature,
             max_tokens=self.max_tokens,
+            cache=self.cache,
+            scheduler=self.scheduler,
+            backend=self.backend,
+            **kwargs,
+        )
+        if self.semaphore is None:
+            return await request
+        async with self.semaphore:
+            return await request
+
+    @staticmethod
+    def _choices(response) -> List[Message]:
+        return [Message.from_dict(choice["message"]) for choice in response["choices"]]
+
+    def stream_chat_completion(self, **kwargs) -> Iterator[str]:
+        """Yields the reply to the chat history as it arrives
+
+        Pass cache=self.cache and a stop_key to cache what is read of it.
+        """
+        messages = self._messages()
+        return openai_chat_completion_stream(
+            model=self.model,
+            messages=messages,
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            scheduler=self.scheduler,
+            backend=self.backend,
+            **kwargs,
+        )
+
+    def astream_chat_completion(self, **kwargs) -> AsyncIterator[str]:
+        """Async counterpart of stream_chat_completion"""
+        messages = self._messages()
+        return openai_chat_completion_astream(
+            model=self.model,
+            messages=messages,
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            scheduler=self.scheduler,
+            backend=self.backend,
             **kwargs,
         )
 
+    def generate_chat_completion(
+        self, early_stop: Optional[EarlyStop] = None, **kwargs
+    ):
+        """
+        early_stop: if given, the reply is streamed and the request cancelled as
+            soon as early_stop returns an answer, which becomes the content of
+            the returned message. The text read until then is cached.
+        """
+        if early_stop is not None:
+            deltas = self.stream_chat_completion(
+                cache=self.cache, stop_key=early_stop_key(early_stop), **kwargs
+            )
+            content = complete_stream(deltas, early_stop)
+            return Message(role="assistant", content=content)
+
+        messages = self._messages()
+        response = self._create(messages, **kwargs)
+
         choice = response["choices"][0]
         msg: Message = Message.from_dict(choice["message"])
         return msg
 
+    async def agenerate_chat_completion(
+        self, early_stop: Optional[EarlyStop] = None, **kwargs
+    ):
+        """Async counterpart of generate_chat_completion"""
+        if early_stop is not None:
+            deltas = self.astream_chat_completion(
+                cache=self.cache, stop_key=early_stop_key(early_stop), **kwargs
+            )
+            if self.semaphore is None:
+                content = await acomplete_stream(deltas, early_stop)
+            else:
+                async with self.semaphore:
+                    content = await acomplete_stream(deltas, early_stop)
+            return Message(role="assistant", content=content)
+
+        messages = self._messages()
+        response = await self._acreate(messages, **kwargs)
+
+        choice = response["choices"][0]
+        msg: Message = Message.from_dict(choice["message"])
+        return msg
+
+    def generate_chat_completions(self, **kwargs) -> List[Message]:
+        """All n choices for the chat history, e.g. for self-consistency voting"""
+        messages = self._messages()
+        return self._choices(self._create(messages, **kwargs))
+
+    def _params(self, messages: List[RawMessage], **kwargs) -> Params:
+        return dict(
+            model=self.model,
+            messages=messages,
+            n=self.n,
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            **kwargs,
+        )
+
+    def _call(self, fn, params: Params):
+        """Send one request of a batch through the scheduler"""
+        trace = start_request(params)
+        if trace is not None:
+            fn = trace.count(fn)
+        try:
+            if self.scheduler is None:
+                response = fn(**params)
+            else:
+                tokens = estimate_tokens(params["messages"], params["max_tokens"])
+                response = self.scheduler.call(fn, tokens=tokens, **params)
+        except BaseException as error:
+            if trace is not None:
+                trace.finish(error=error)
+            raise
+        if trace is not None:
+            trace.finish(response)
+        return response
+
+    async def _acall(self, fn, params: Params):
+        """Send one request of a batch through the semaphore and scheduler"""
+        async with self.semaphore or contextlib.nullcontext():
+            trace = start_request(params)
+            if trace is not None:
+                fn = trace.count(fn)
+            try:
+                if self.scheduler is None:
+                    response = await fn(**params)
+                else:
+                    tokens = estimate_tokens(params["messages"], params["max_tokens"])
+                    response = await self.scheduler.acall(fn, tokens=tokens, **params)
+            except BaseException as error:
+                if trace is not None:
+                    trace.finish(error=error)
+                raise
+            if trace is not None:
+                trace.finish(response)
+            return response
+
+    def _cached(self, requests: List[Params]) -> Tuple[List, List[Optional[str]]]:
+        """Cached responses to `requests` (None if missing) and their cache keys"""
+        if self.cache is None:
+            return [None] * len(requests), [None] * len(requests)
+        keys = [self.cache.key(**params) for params in requests]
+        responses = [self.cache.get(key) for key in keys]
+        for params, response in zip(requests, responses):
+            trace = start_request(params) if response is not None else None
+            if trace is not None:
+                trace.finish(response, cache_hit=True)
+        return responses, keys
+
+    def _store(self, keys: List[Optional[str]], responses: List):
+        if self.cache is not None:
+            for key, response in zip(keys, responses):
+                self.cache.set(key, response)
+
+    def generate_batch_chat_completions(
+        self, conversations: List[List[Message]], max_workers: int = 8, **kwargs
+    ) -> List[List[Message]]:
+        """Complete independent conversations (e.g. one per env copy) at once
+
+        Uncached requests go to the backend as one batch: remote backends send
+        them through a pool of `max_workers` threads, so a batch takes about
+        as long as its slowest request. Returns all n choices of every
+        conversation, in order. The chat history is not used.
+        """
+        requests = [
+            self._params([message.to_dict() for message in c], **kwargs)
+            for c in conversations
+        ]
+        responses, keys = self._cached(requests)
+        misses = [idx for idx, response in enumerate(responses) if response is None]
+        if misses:
+            answers = self.backend.batch(
+                [requests[idx] for idx in misses], max_workers, self._call
+            )
+            self._store([keys[idx] for idx in misses], answers)
+            for idx, response in zip(misses, answers):
+                responses[idx] = response
+        return [self._choices(response) for response in responses]
+
+    async def agenerate_batch_chat_completions(
+        self, conversations: List[List[Message]], **kwargs
+    ) -> List[List[Message]]:
+        """Async counterpart of generate_batch_chat_completions
+
+        Concurrency is bounded by the completer's semaphore, if any.
+        """
+        requests = [
+            self._params([message.to_dict() for message in c], **kwargs)
+            for c in conversations
+        ]
+        responses, keys = self._cached(requests)
+        misses = [idx for idx, response in enumerate(responses) if response is None]
+        if misses:
+            answers = await self.backend.abatch(
+                [requests[idx] for idx in misses], self._acall
+            )
+            self._store([keys[idx] for idx in misses], answers)
+            for idx, response in zip(misses, answers):
+                responses[idx] = response
+        return [self._choices(response) for response in responses]
+
     def add_message(self, message: Message):
         self.chat_history.append(message)
+        for policy in self.policies:
+            policy.apply(self.chat_history)
 
 
 if __name__ == "__main__":
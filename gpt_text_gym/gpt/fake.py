@@ -0,0 +1,111 @@
+""" Deterministic, offline stand-in for the chat completion API """
+
+import asyncio
+import contextlib
+import re
+import time
+
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+from gpt_text_gym.gpt.backends import (
+    LocalBackend,
+    Respond,
+    stream_chunk,
+    stream_pieces,
+)
+from gpt_text_gym.gpt.message import RawMessage
+
+
+class FakeLLM(LocalBackend):
+    """Scripted local backend with simulated latency
+
+    The reply is respond(messages) if given, else the reply of the first
+    (pattern, reply) rule whose pattern is found in the last message, else
+    `default`. Every request waits `latency` seconds before replying;
+    streamed replies also wait `chunk_latency` seconds per chunk. Pass it as
+    a backend, or use patch() to route every openai.ChatCompletion request
+    in the process through it, e.g. to benchmark agents without network
+    access.
+    """
+
+    def __init__(
+        self,
+        rules: Sequence[Tuple[str, str]] = (),
+        default: str = "",
+        respond: Optional[Respond] = None,
+        latency: float = 0.0,
+        chunk_latency: float = 0.0,
+    ):
+        # Requests of a batch are sent one by one, so their latencies overlap
+        # as for a remote model
+        super().__init__(respond=respond or self._scripted_reply, concurrent=True)
+        self.rules = [(re.compile(pattern), reply) for pattern, reply in rules]
+        self.default = default
+        self.latency = latency
+        self.chunk_latency = chunk_latency
+
+    def _scripted_reply(self, messages: List[RawMessage]) -> str:
+        content = messages[-1]["content"] if messages else ""
+        for pattern, reply in self.rules:
+            if pattern.search(content):
+                return reply
+        return self.default
+
+    def _stream(self, reply: str) -> Iterator[Dict]:
+        for piece in stream_pieces(reply):
+            if self.chunk_latency:
+                time.sleep(self.chunk_latency)
+            yield stream_chunk(piece)
+
+    async def _astream(self, reply: str) -> AsyncIterator[Dict]:
+        for piece in stream_pieces(reply):
+            if self.chunk_latency:
+                await asyncio.sleep(self.chunk_latency)
+            yield stream_chunk(piece)
+
+    def create(self, model: str, messages: List[RawMessage], stream=False, **kwargs):
+        if stream:
+            return self.stream(messages=messages, **kwargs)
+        if self.latency:
+            time.sleep(self.latency)
+        return super().create(model=model, messages=messages, **kwargs)
+
+    async def acreate(
+        self, model: str, messages: List[RawMessage], stream=False, **kwargs
+    ):
+        if stream:
+            return await self.astream(messages=messages, **kwargs)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return super().create(model=model, messages=messages, **kwargs)
+
+    def stream(self, messages: List[RawMessage], **kwargs) -> Iterator[Dict]:
+        if self.latency:
+            time.sleep(self.latency)
+        reply = self.reply(messages)
+        self._usage(messages, [reply])
+        return self._stream(reply)
+
+    async def astream(self, messages: List[RawMessage], **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        reply = self.reply(messages)
+        self._usage(messages, [reply])
+        return self._astream(reply)
+
+    @contextlib.contextmanager
+    def patch(self) -> Iterator["FakeLLM"]:
+        """Answer every openai.ChatCompletion request in this context"""
+        import openai
+
+        names = ("create", "acreate")
+        saved = {name: vars(openai.ChatCompletion).get(name) for name in names}
+        openai.ChatCompletion.create = self.create
+        openai.ChatCompletion.acreate = self.acreate
+        try:
+            yield self
+        finally:
+            for name, attr in saved.items():
+                if attr is None:
+                    delattr(openai.ChatCompletion, name)
+                else:
+                    setattr(openai.ChatCompletion, name, attr)
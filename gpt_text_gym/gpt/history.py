@@ -0,0 +1,119 @@
+""" Policies bounding the chat history of long-running sessions """
+
+import abc
+
+from typing import Callable, List
+from gpt_text_gym.gpt.budget import PromptBudget
+from gpt_text_gym.gpt.message import Message, is_system
+
+Pinned = Callable[[Message], bool]
+
+
+def pin(*messages: Message) -> Pinned:
+    """Pin system messages and the given messages (e.g. the mission)
+
+    Messages are matched by identity, so pass the objects added to the history.
+    """
+    ids = {id(message) for message in messages}
+
+    def pinned(message: Message) -> bool:
+        return is_system(message) or id(message) in ids
+
+    return pinned
+
+
+class HistoryPolicy(abc.ABC):
+    """Trims a chat history in place each time a message is added
+
+    Pinned messages and the latest message are never dropped.
+    """
+
+    def __init__(self, pinned: Pinned = is_system):
+        self.pinned = pinned
+
+    @abc.abstractmethod
+    def apply(self, history: List[Message]) -> List[Message]:
+        """Trim `history` in place; returns the dropped messages"""
+
+    def reset(self):
+        pass
+
+    def _unpinned(self, history: List[Message]) -> List[int]:
+        return [idx for idx, message in enumerate(history) if not self.pinned(message)]
+
+
+class FixedWindow(HistoryPolicy):
+    """Keeps the pinned messages and the last `size` other messages"""
+
+    def __init__(self, size: int, pinned: Pinned = is_system):
+        super().__init__(pinned)
+        if size < 1:
+            raise ValueError(f"Window size must be positive, got {size}")
+        self.size = size
+
+    def apply(self, history: List[Message]) -> List[Message]:
+        unpinned = self._unpinned(history)
+        drop = set(unpinned[: len(unpinned) - self.size])
+        if not drop:
+            return []
+        dropped = [history[idx] for idx in sorted(drop)]
+        history[:] = [m for idx, m in enumerate(history) if idx not in drop]
+        return dropped
+
+
+class TokenWindow(HistoryPolicy):
+    """Keeps the history within `budget`, dropping the oldest messages
+
+    Pinning and summarizing are configured on the budget. Token counts are
+    kept across calls, so only messages new to the budget are encoded.
+    """
+
+    def __init__(self, budget: PromptBudget):
+        super().__init__(budget.pinned)
+        self.budget = budget
+
+    def apply(self, history: List[Message]) -> List[Message]:
+        self.budget.sync(history)
+        return self.budget.fit(history)
+
+    def reset(self):
+        self.budget.reset()
+
+
+class Compaction(HistoryPolicy):
+    """Periodically folds the older messages into one summary message
+
+    Once more than `max_messages` unpinned messages have accumulated, all but
+    the last `keep_last` are replaced by summarize(messages), placed where the
+    first of them was. The summary is not pinned, so the next compaction folds
+    it in together with the messages added since.
+    """
+
+    def __init__(
+        self,
+        summarize: Callable[[List[Message]], Message],
+        max_messages: int,
+        keep_last: int = 1,
+        pinned: Pinned = is_system,
+    ):
+        super().__init__(pinned)
+        if not 0 < keep_last < max_messages:
+            raise ValueError("Need 0 < keep_last < max_messages")
+        self.summarize = summarize
+        self.max_messages = max_messages
+        self.keep_last = keep_last
+
+    def apply(self, history: List[Message]) -> List[Message]:
+        unpinned = self._unpinned(history)
+        if len(unpinned) <= self.max_messages:
+            return []
+        drop = unpinned[: -self.keep_last]
+        dropped = [history[idx] for idx in drop]
+        summary = self.summarize(dropped)
+        drop = set(drop)
+        history[:] = [
+            summary if idx == unpinned[0] else message
+            for idx, message in enumerate(history)
+            if idx == unpinned[0] or idx not in drop
+        ]
+        return dropped
@@ -22,3 +22,7 @@ class Message:
 
 def default_system_message():
     return Message(role="system", content="You are a helpful assistant.")
+
+
+def is_system(message: Message) -> bool:
+    return message.role == "system"
@@ -0,0 +1,172 @@
+""" Rate limiting and retries for API requests """
+
+import asyncio
+import functools
+import logging
+import random
+import sys
+import threading
+import time
+
+from typing import Any, Callable, List, Optional, Tuple
+from gpt_text_gym.gpt.message import RawMessage
+
+logger = logging.getLogger(__name__)
+
+# openai.error exceptions worth retrying: the same request may succeed later
+RETRYABLE_ERRORS = (
+    "RateLimitError",
+    "Timeout",
+    "TryAgain",
+    "APIError",
+    "APIConnectionError",
+    "ServiceUnavailableError",
+)
+
+
+@functools.lru_cache(maxsize=None)
+def retryable_errors() -> Tuple[type, ...]:
+    import openai
+
+    return tuple(getattr(openai.error, name) for name in RETRYABLE_ERRORS)
+
+
+def estimate_tokens(messages: List[RawMessage], max_tokens: Optional[int]) -> int:
+    """Rough token count of a request, as charged against a tokens/minute limit"""
+    prompt_tokens = sum(len(message["content"]) // 4 + 4 for message in messages)
+    return prompt_tokens + (max_tokens or 0)
+
+
+class TokenBucket:
+    """Token bucket refilled at `rate_per_minute`, holding at most `capacity`
+
+    `reserve` takes tokens immediately (the balance may go negative) and
+    returns how long the caller must wait before using them, so the same
+    bucket serves threads and coroutines alike.
+    """
+
+    def __init__(
+        self,
+        rate_per_minute: float,
+        capacity: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = rate_per_minute if capacity is None else capacity
+        self.clock = clock
+        self.tokens = self.capacity
+        self.last = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float = 1.0) -> float:
+        """Take `amount` tokens; returns the seconds to wait before using them"""
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.last) * self.rate
+            )
+            self.last = now
+            self.tokens -= amount
+            return max(0.0, -self.tokens / self.rate)
+
+
+class RequestScheduler:
+    """Runs API requests under rate limits, retrying transient failures
+
+    - requests_per_minute / tokens_per_minute: token-bucket limits applied
+      before every attempt. None disables a limit.
+    - Retryable errors (RETRYABLE_ERRORS) are retried up to `max_retries`
+      times with exponential backoff and full jitter, capped at `max_delay`.
+      A Retry-After header sent with the error takes precedence.
+    - Every other error (e.g. InvalidRequestError, AuthenticationError) is
+      raised immediately, as is the last error once retries run out.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        seed: Optional[int] = None,
+    ):
+        self.request_bucket = (
+            TokenBucket(requests_per_minute) if requests_per_minute else None
+        )
+        self.token_bucket = (
+            TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        )
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rng = random.Random(seed)
+        self.retries = 0
+
+    @staticmethod
+    def is_retryable(error: Exception) -> bool:
+        if "openai" not in sys.modules:
+            # Then it cannot be an openai error; don't import openai to check
+            return False
+        return isinstance(error, retryable_errors())
+
+    def retry_delay(self, attempt: int, error: Exception) -> float:
+        """Seconds to wait before retry number `attempt` (starting at 0)"""
+        headers = getattr(error, "headers", None) or {}
+        retry_after = headers.get("retry-after") or headers.get("Retry-After")
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), self.max_delay)
+            except ValueError:
+                pass
+        return self.rng.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def _rate_limit_delay(self, tokens: int) -> float:
+        delay = 0.0
+        if self.request_bucket is not None:
+            delay = max(delay, self.request_bucket.reserve(1))
+        if self.token_bucket is not None and tokens:
+            delay = max(delay, self.token_bucket.reserve(tokens))
+        return delay
+
+    def _on_error(self, attempt: int, error: Exception) -> float:
+        """Raise `error` if it should not be retried, else return the delay"""
+        if not self.is_retryable(error) or attempt >= self.max_retries:
+            raise error
+        delay = self.retry_delay(attempt, error)
+        self.retries += 1
+        logger.warning(
+            "%s: %s. Retrying in %.1f seconds (%d/%d)",
+            type(error).__name__,
+            error,
+            delay,
+            attempt + 1,
+            self.max_retries,
+        )
+        return delay
+
+    def call(self, fn: Callable[..., Any], *args, tokens: int = 0, **kwargs) -> Any:
+        """Call fn(*args, **kwargs); `tokens` is charged to the tokens/minute limit"""
+        for attempt in range(self.max_retries + 1):
+            delay = self._rate_limit_delay(tokens)
+            if delay:
+                time.sleep(delay)
+            try:
+                return fn(*args, **kwargs)
+            except Exception as error:
+                time.sleep(self._on_error(attempt, error))
+
+    async def acall(self, fn: Callable[..., Any], *args, tokens: int = 0, **kwargs):
+        """Async counterpart of call: awaits fn(*args, **kwargs)"""
+        for attempt in range(self.max_retries + 1):
+            delay = self._rate_limit_delay(tokens)
+            if delay:
+                await asyncio.sleep(delay)
+            try:
+                return await fn(*args, **kwargs)
+            except Exception as error:
+                await asyncio.sleep(self._on_error(attempt, error))
+
+
+# Shared by every completer that is not given its own scheduler
+DEFAULT_SCHEDULER = RequestScheduler()
@@ -0,0 +1,101 @@
+""" Early stopping of streamed completions """
+
+import re
+
+from typing import AsyncIterator, Callable, Iterator, Optional, Sequence
+
+# Maps the text streamed so far to the answer once it is decidable, else None
+EarlyStop = Callable[[str], Optional[str]]
+
+
+def match_prefix(answers: Sequence[str]) -> EarlyStop:
+    """Stop as soon as the text starts with one of `answers` (case-insensitive)
+
+    e.g. match_prefix(("yes", "no", "need more information")) for an agent
+    that only needs the first words of the reply.
+    """
+    answers = tuple(answer.lower() for answer in answers)
+
+    def early_stop(text: str) -> Optional[str]:
+        text = text.lstrip().lower()
+        for answer in answers:
+            if text.startswith(answer):
+                return answer
+        return None
+
+    early_stop.key = f"match_prefix{answers!r}"
+    return early_stop
+
+
+def match_line(pattern: str) -> EarlyStop:
+    """Stop after the first complete line matching `pattern` (case-insensitive)
+
+    Returns the text up to and including that line, e.g.
+    match_line(r"next tool to use: (.*)") for the tool choice agent.
+    """
+    regex = re.compile(pattern, re.IGNORECASE)
+
+    def early_stop(text: str) -> Optional[str]:
+        end = 0
+        for line in text.splitlines(keepends=True):
+            end += len(line)
+            if not line.endswith("\n"):
+                break
+            if regex.search(line):
+                return text[:end].rstrip("\n")
+        return None
+
+    early_stop.key = f"match_line({pattern!r})"
+    return early_stop
+
+
+def early_stop_key(early_stop: Optional[EarlyStop]) -> str:
+    """Identity of an early stop that is stable across processes, for cache keys
+
+    match_prefix and match_line describe their arguments; any other function
+    is identified by its qualified name.
+    """
+    if early_stop is None:
+        return ""
+    key = getattr(early_stop, "key", None)
+    if key is None:
+        key = f"{early_stop.__module__}.{early_stop.__qualname__}"
+    return key
+
+
+def complete_stream(
+    deltas: Iterator[str], early_stop: Optional[EarlyStop] = None
+) -> str:
+    """Join streamed text; cancel the rest of the stream once early_stop decides"""
+    text = ""
+    try:
+        for delta in deltas:
+            text += delta
+            if early_stop is not None:
+                answer = early_stop(text)
+                if answer is not None:
+                    return answer
+    finally:
+        close = getattr(deltas, "close", None)
+        if close is not None:
+            close()
+    return text
+
+
+async def acomplete_stream(
+    deltas: AsyncIterator[str], early_stop: Optional[EarlyStop] = None
+) -> str:
+    """Async counterpart of complete_stream"""
+    text = ""
+    try:
+        async for delta in deltas:
+            text += delta
+            if early_stop is not None:
+                answer = early_stop(text)
+                if answer is not None:
+                    return answer
+    finally:
+        aclose = getattr(deltas, "aclose", None)
+        if aclose is not None:
+            await aclose()
+    return text
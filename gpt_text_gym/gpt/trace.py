@@ -0,0 +1,291 @@
+""" JSON Lines trace of completion requests, for cost and latency analysis
+
+Tracing is off by default. While a TraceWriter is enabled (enable_tracing or
+the tracing context manager), every request sent through the completion
+helpers appends one record:
+
+    time, agent, episode, step, prompt_hash, model, stream, latency, retries,
+    prompt_tokens, completion_tokens, cache_hit
+
+plus `error` for requests that failed, and any fields set with trace_context. agent, episode and step come from
+trace_context, set by the agents and the episode runner. Records are
+buffered in memory and written by a background thread, so tracing does not
+block the agents (or the event loop) on file I/O. While disabled, the
+helpers only check that no writer is enabled.
+"""
+
+import collections
+import contextlib
+import contextvars
+import hashlib
+import json
+import queue
+import threading
+import time
+
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+from gpt_text_gym.gpt.message import RawMessage
+
+_TRACER: Optional["TraceWriter"] = None
+# Fields added to every record, e.g. agent, episode and step
+_CONTEXT: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar(
+    "trace_context", default={}
+)
+_NO_CONTEXT = contextlib.nullcontext()
+
+
+class TraceWriter:
+    """Buffered, append-only JSON Lines writer
+
+    Records are serialized and written by a background thread once
+    `buffer_size` records are buffered, or every `flush_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        buffer_size: int = 256,
+        flush_interval: float = 1.0,
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.records = 0
+        self._buffer: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread = threading.Thread(
+            target=self._run, name="trace-writer", daemon=True
+        )
+        self._thread.start()
+
+    def write(self, record: Dict[str, Any]):
+        with self._lock:
+            self._buffer.append(record)
+            self.records += 1
+            if len(self._buffer) < self.buffer_size:
+                return
+            batch, self._buffer = self._buffer, []
+        self._queue.put(batch)
+
+    def _take(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        return batch
+
+    def flush(self):
+        """Write every record so far; blocks until they are on disk"""
+        if not self._thread.is_alive():
+            # Closed: close() already wrote everything
+            return
+        done = threading.Event()
+        self._queue.put(self._take())
+        self._queue.put(done)
+        done.wait()
+
+    def _run(self):
+        with open(self.path, "a") as file:
+            while True:
+                try:
+                    item = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    item = self._take()
+                if item is None:
+                    break
+                if isinstance(item, threading.Event):
+                    item.set()
+                    continue
+                if item:
+                    file.write("".join(json.dumps(record) + "\n" for record in item))
+                    file.flush()
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(self._take())
+            self._queue.put(None)
+            self._thread.join()
+
+    def __enter__(self) -> "TraceWriter":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def get_tracer() -> Optional[TraceWriter]:
+    return _TRACER
+
+
+def enable_tracing(path: Union[str, Path], **kwargs) -> TraceWriter:
+    """Trace requests to `path` until disable_tracing; kwargs go to TraceWriter"""
+    global _TRACER
+    disable_tracing()
+    _TRACER = TraceWriter(path, **kwargs)
+    return _TRACER
+
+
+def disable_tracing():
+    global _TRACER
+    tracer, _TRACER = _TRACER, None
+    if tracer is not None:
+        tracer.close()
+
+
+@contextlib.contextmanager
+def tracing(path: Union[str, Path], **kwargs) -> Iterator[TraceWriter]:
+    """Trace requests to `path` within this context"""
+    tracer = enable_tracing(path, **kwargs)
+    try:
+        yield tracer
+    finally:
+        if _TRACER is tracer:
+            disable_tracing()
+        else:
+            tracer.close()
+
+
+def trace_context(**fields: Any):
+    """Add `fields` to the records of requests made in this context
+
+    Contexts nest, and each asyncio task (e.g. each episode) has its own.
+    """
+    if _TRACER is None:
+        return _NO_CONTEXT
+    return _context(fields)
+
+
+@contextlib.contextmanager
+def _context(fields: Dict[str, Any]) -> Iterator[None]:
+    token = _CONTEXT.set({**_CONTEXT.get(), **fields})
+    try:
+        yield
+    finally:
+        _CONTEXT.reset(token)
+
+
+def prompt_hash(messages: List[RawMessage]) -> str:
+    digest = hashlib.blake2b(digest_size=8)
+    for message in messages:
+        digest.update(message["role"].encode())
+        digest.update(b"\0")
+        digest.update(message["content"].encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def record(**fields: Any):
+    """Append a record (with the current trace_context) if tracing is enabled"""
+    tracer = _TRACER
+    if tracer is not None:
+        tracer.write({"time": time.time(), **_CONTEXT.get(), **fields})
+
+
+class RequestTrace:
+    """Measures one request of a completion helper; see start_request"""
+
+    def __init__(self, tracer: TraceWriter, params: Dict[str, Any], stream: bool):
+        self.tracer = tracer
+        self.params = params
+        self.stream = stream
+        self.attempts = 0
+        self.start = time.perf_counter()
+
+    def count(self, fn: Callable) -> Callable:
+        """fn, counting the attempts the scheduler makes"""
+
+        def counted(*args, **kwargs):
+            self.attempts += 1
+            return fn(*args, **kwargs)
+
+        return counted
+
+    def finish(
+        self,
+        response=None,
+        content: Optional[str] = None,
+        cache_hit=False,
+        error: Optional[BaseException] = None,
+    ):
+        """Record the request, given its response or, if streamed, its content
+
+        A request that raised `error` is recorded with what it cost until then
+        (attempts, latency, any streamed content) and the error.
+        """
+        messages = self.params["messages"]
+        usage = response.get("usage") if response is not None else None
+        if usage is not None:
+            prompt_tokens = usage["prompt_tokens"]
+            completion_tokens = usage.get("completion_tokens", 0)
+        else:
+            # Streamed replies have no usage: same estimate as the scheduler
+            prompt_tokens = sum(len(m["content"]) // 4 + 4 for m in messages)
+            completion_tokens = len(content or "") // 4 + 1
+            if error is not None and not content:
+                completion_tokens = 0
+        entry = {
+            "time": time.time(),
+            **_CONTEXT.get(),
+            "prompt_hash": prompt_hash(messages),
+            "model": self.params["model"],
+            "stream": self.stream,
+            "latency": time.perf_counter() - self.start,
+            "retries": max(0, self.attempts - 1),
+            "prompt_tokens": 0 if cache_hit else prompt_tokens,
+            "completion_tokens": 0 if cache_hit else completion_tokens,
+            "cache_hit": cache_hit,
+        }
+        if error is not None:
+            entry["error"] = f"{type(error).__name__}: {error}"
+        self.tracer.write(entry)
+
+
+def start_request(params: Dict[str, Any], stream: bool = False):
+    """A RequestTrace for a request with `params`, or None if tracing is off"""
+    tracer = _TRACER
+    if tracer is None:
+        return None
+    return RequestTrace(tracer, params, stream)
+
+
+def load_trace(path: Union[str, Path]) -> List[Dict[str, Any]]:
+    with open(path) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def summarize_trace(records: List[Dict[str, Any]], by: str = "agent") -> str:
+    """Table of requests, cache hits, retries, tokens and latency per `by`"""
+    groups: Dict[Any, List[Dict[str, Any]]] = collections.defaultdict(list)
+    for entry in records:
+        groups[entry.get(by) or "-"].append(entry)
+    total_latency = sum(entry.get("latency", 0.0) for entry in records) or 1.0
+    lines = [
+        f"{by:<20} {'requests':>8} {'cached':>7} {'retries':>7}"
+        f" {'tokens':>9} {'latency (s)':>11} {'share':>6}"
+    ]
+    for key, entries in sorted(
+        groups.items(), key=lambda item: -sum(e.get("latency", 0.0) for e in item[1])
+    ):
+        latency = sum(entry.get("latency", 0.0) for entry in entries)
+        tokens = sum(
+            entry.get("prompt_tokens", 0) + entry.get("completion_tokens", 0)
+            for entry in entries
+        )
+        lines.append(
+            f"{str(key):<20} {len(entries):>8}"
+            f" {sum(bool(entry.get('cache_hit')) for entry in entries):>7}"
+            f" {sum(entry.get('retries', 0) for entry in entries):>7}"
+            f" {tokens:>9} {latency:>11.2f} {latency / total_latency:>6.0%}"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarize a trace file")
+    parser.add_argument("path")
+    parser.add_argument("--by", default="agent")
+    args = parser.parse_args()
+    print(summarize_trace(load_trace(args.path), by=args.by))
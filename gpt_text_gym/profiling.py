@@ -0,0 +1,327 @@
+""" Low-overhead timers and counters for the agent loop
+
+Profiling is off by default: timer() then returns a shared no-op context
+manager and count() returns at once. While a Profiler is enabled
+(enable_profiling or the profiling context manager), every
+
+    with timer("env.step"):
+        ...
+
+adds its duration to the histogram of "env.step", and count(name, value)
+adds to a counter. summary() tabulates both; with `trace_events=True` each
+timed span is also kept for write_chrome_trace, which writes a file that
+chrome://tracing and Perfetto open.
+"""
+
+import contextlib
+import json
+import os
+import threading
+import time
+import numpy as np
+
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+_PROFILER: Optional["Profiler"] = None
+_NO_TIMER = contextlib.nullcontext()
+_now = time.perf_counter_ns
+
+# Histogram buckets: 2**SUB_BITS buckets per power of two, i.e. values are
+# known within 1/2**SUB_BITS of their magnitude (12.5%)
+SUB_BITS = 3
+
+
+class Histogram:
+    """Log-linear histogram of non-negative integers (e.g. nanoseconds)
+
+    record() only appends; values are folded into buckets in batches, which
+    keeps recording cheap enough for the hot path.
+    """
+
+    __slots__ = ("pending", "buckets", "_count", "_total", "_min", "_max", "_lock")
+
+    FOLD_EVERY = 4096
+
+    def __init__(self):
+        self.pending: List[int] = []
+        self.buckets: Dict[int, int] = {}
+        self._count = 0
+        self._total = 0
+        self._min: Optional[int] = None
+        self._max = 0
+        self._lock = threading.Lock()
+
+    def record(self, value: int):
+        pending = self.pending
+        pending.append(value)
+        if len(pending) >= self.FOLD_EVERY:
+            self.fold()
+
+    def fold(self):
+        """Move the pending values into the buckets
+
+        The pending list is never replaced, so timers can keep a reference to
+        it. Values appended by another thread while this runs stay pending.
+        """
+        with self._lock:
+            pending = self.pending[:]
+            del self.pending[: len(pending)]
+            if pending:
+                self._fold(pending)
+
+    def _fold(self, pending: List[int]):
+        values = np.array(pending, dtype=np.int64)
+        # frexp's exponent is the bit length (exact below 2**53)
+        bits = np.frexp(values)[1]
+        shifted = values >> np.maximum(bits - SUB_BITS - 1, 0)
+        bucket_ids = np.where(
+            bits > SUB_BITS,
+            ((bits - SUB_BITS) << SUB_BITS) | (shifted & ((1 << SUB_BITS) - 1)),
+            values,
+        )
+        buckets = self.buckets
+        for bucket, count in zip(*np.unique(bucket_ids, return_counts=True)):
+            bucket = int(bucket)
+            buckets[bucket] = buckets.get(bucket, 0) + int(count)
+        self._count += len(values)
+        self._total += int(values.sum())
+        low, high = int(values.min()), int(values.max())
+        self._min = low if self._min is None else min(self._min, low)
+        self._max = max(self._max, high)
+
+    @staticmethod
+    def _bounds(bucket: int) -> Tuple[int, int]:
+        """Smallest and largest value counted in `bucket`"""
+        if bucket < 1 << SUB_BITS:
+            return bucket, bucket
+        shift = (bucket >> SUB_BITS) - 1
+        low = ((1 << SUB_BITS) | (bucket & ((1 << SUB_BITS) - 1))) << shift
+        return low, low + (1 << shift) - 1
+
+    def percentile(self, q: float) -> float:
+        """Approximate q-th percentile (0 <= q <= 100)"""
+        self.fold()
+        if not self._count:
+            return 0.0
+        rank = q / 100 * self._count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                low, high = self._bounds(bucket)
+                return min(max((low + high) / 2, self._min), self._max)
+        return float(self._max)
+
+    @property
+    def count(self) -> int:
+        self.fold()
+        return self._count
+
+    @property
+    def total(self) -> int:
+        self.fold()
+        return self._total
+
+    @property
+    def min(self) -> Optional[int]:
+        self.fold()
+        return self._min
+
+    @property
+    def max(self) -> int:
+        self.fold()
+        return self._max
+
+    @property
+    def mean(self) -> float:
+        self.fold()
+        return self._total / self._count if self._count else 0.0
+
+
+class _Timer:
+    """The reusable timer of one name; see Profiler.timer
+
+    Spans of the same name may nest or overlap (e.g. the LLM waits of
+    concurrent episodes): each exit is matched with the latest start. Counts
+    and totals are exact; when overlapping spans end out of order, their
+    individual durations are swapped.
+    """
+
+    __slots__ = ("histogram", "pending", "starts")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+        self.pending = histogram.pending
+        self.starts: List[int] = []
+
+    def __enter__(self):
+        self.starts.append(_now())
+
+    def __exit__(self, exc_type, exc, traceback):
+        pending = self.pending
+        pending.append(_now() - self.starts.pop())
+        if len(pending) >= Histogram.FOLD_EVERY:
+            self.histogram.fold()
+
+
+class _TracedTimer:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler: "Profiler", name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = _now()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.profiler.add(self.name, _now() - self.start, self.start)
+
+
+class Profiler:
+    """Durations (histograms) and counters by name
+
+    trace_events: also keep every span for write_chrome_trace; memory then
+        grows with the number of spans.
+    """
+
+    def __init__(self, trace_events: bool = False):
+        self.timers: Dict[str, Histogram] = {}
+        # One reusable _Timer per name, unless trace_events
+        self._timers: Dict[str, _Timer] = {}
+        self.counters: Dict[str, float] = {}
+        self.trace_events = trace_events
+        self.events: List[Tuple[str, int, int, int]] = []
+        self.start = _now()
+
+    def histogram(self, name: str) -> Histogram:
+        histogram = self.timers.get(name)
+        if histogram is None:
+            histogram = self.timers[name] = Histogram()
+        return histogram
+
+    def timer(self, name: str):
+        if self.trace_events:
+            return _TracedTimer(self, name)
+        timer = self._timers.get(name)
+        if timer is None:
+            timer = self._timers[name] = _Timer(self.histogram(name))
+        return timer
+
+    def add(self, name: str, duration_ns: int, start_ns: Optional[int] = None):
+        """Record a span of `duration_ns` nanoseconds under `name`"""
+        self.histogram(name).record(duration_ns)
+        if self.trace_events:
+            if start_ns is None:
+                start_ns = _now() - duration_ns
+            self.events.append((name, start_ns, duration_ns, threading.get_ident()))
+
+    def count(self, name: str, value: float = 1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def reset(self):
+        self.timers.clear()
+        self._timers.clear()
+        self.counters.clear()
+        self.events.clear()
+        self.start = _now()
+
+    def summary(self) -> str:
+        """Table of timers (slowest total first), then counters
+
+        share: the timer's total over the time since profiling started; it
+        exceeds 100% when spans overlap, e.g. LLM waits of concurrent episodes.
+        """
+        elapsed = max(_now() - self.start, 1)
+        for histogram in self.timers.values():
+            histogram.fold()
+        lines = [
+            f"{'timer':<24} {'calls':>8} {'total (s)':>10} {'share':>6}"
+            f" {'mean (us)':>10} {'p50 (us)':>9} {'p90 (us)':>9}"
+            f" {'p99 (us)':>9} {'max (us)':>9}"
+        ]
+        for name, histogram in sorted(
+            self.timers.items(), key=lambda item: -item[1].total
+        ):
+            lines.append(
+                f"{name:<24} {histogram.count:>8} {histogram.total / 1e9:>10.3f}"
+                f" {histogram.total / elapsed:>6.1%} {histogram.mean / 1e3:>10.1f}"
+                f" {histogram.percentile(50) / 1e3:>9.1f}"
+                f" {histogram.percentile(90) / 1e3:>9.1f}"
+                f" {histogram.percentile(99) / 1e3:>9.1f}"
+                f" {histogram.max / 1e3:>9.1f}"
+            )
+        if self.counters:
+            lines.append(f"{'counter':<24} {'value':>8}")
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"{name:<24} {value:>8g}")
+        return "\n".join(lines)
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """Spans as Chrome trace events (complete events, in microseconds)"""
+        pid = os.getpid()
+        events = [
+            {
+                "name": name,
+                "ph": "X",
+                "ts": (start - self.start) / 1e3,
+                "dur": duration / 1e3,
+                "pid": pid,
+                "tid": tid,
+            }
+            for name, start, duration, tid in self.events
+        ]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, path: Union[str, Path]):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as file:
+            json.dump(self.chrome_trace(), file)
+
+
+def get_profiler() -> Optional[Profiler]:
+    return _PROFILER
+
+
+def enable_profiling(trace_events: bool = False) -> Profiler:
+    global _PROFILER
+    _PROFILER = Profiler(trace_events=trace_events)
+    return _PROFILER
+
+
+def disable_profiling():
+    global _PROFILER
+    _PROFILER = None
+
+
+@contextlib.contextmanager
+def profiling(trace_events: bool = False) -> Iterator[Profiler]:
+    """Profile within this context; the profiler stays readable afterwards"""
+    profiler = enable_profiling(trace_events)
+    try:
+        yield profiler
+    finally:
+        if _PROFILER is profiler:
+            disable_profiling()
+
+
+def timer(name: str):
+    """Time the enclosed block under `name` if profiling is enabled"""
+    profiler = _PROFILER
+    if profiler is None:
+        return _NO_TIMER
+    # Profiler.timer, inlined for the common case
+    timer = profiler._timers.get(name)
+    if timer is None:
+        return profiler.timer(name)
+    return timer
+
+
+def count(name: str, value: float = 1):
+    """Add `value` to the counter `name` if profiling is enabled"""
+    profiler = _PROFILER
+    if profiler is not None:
+        profiler.count(name, value)
@@ -0,0 +1,272 @@
+""" Concurrent episode runner for LLM agents """
+
+import abc
+import asyncio
+import dataclasses
+import json
+import logging
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from gpt_text_gym.gpt.trace import trace_context
+from gpt_text_gym.profiling import count, timer
+
+if TYPE_CHECKING:
+    import gymnasium as gym
+
+logger = logging.getLogger(__name__)
+
+# Maps an env and its raw observation to what the agent receives. It runs
+# where the env lives, so it can read env state that is not in the observation.
+Observe = Callable[["gym.Env", Any], Any]
+
+# Envs living in this process, keyed by (pool, episode)
+_ENVS: Dict[Tuple[int, int], "gym.Env"] = {}
+
+
+def _observe_raw(env: "gym.Env", obs: Any) -> Any:
+    return obs
+
+
+def _env_reset(env_fn, observe: Observe, key: Tuple[int, int], seed: Optional[int]):
+    env = _ENVS.get(key)
+    if env is None:
+        env = _ENVS[key] = env_fn()
+    obs, info = env.reset(seed=seed)
+    return observe(env, obs), info
+
+
+def _env_step(observe: Observe, key: Tuple[int, int], action: Any):
+    env = _ENVS[key]
+    obs, reward, terminated, truncated, info = env.step(action)
+    return observe(env, obs), float(reward), terminated, truncated, info
+
+
+def _env_close(key: Tuple[int, int]):
+    env = _ENVS.pop(key, None)
+    if env is not None:
+        env.close()
+
+
+class EnvPool:
+    """Envs of concurrent episodes, stepped in worker processes
+
+    Each episode's env is created in one worker and stays there, so only
+    actions and observations cross process boundaries. With `num_workers=0`
+    envs are stepped in the calling thread instead, which is cheaper than
+    pickling for envs as fast as Minigrid's.
+    """
+
+    def __init__(
+        self,
+        env_fn: Callable[[], "gym.Env"],
+        num_workers: int = 0,
+        observe: Observe = _observe_raw,
+    ):
+        """
+        env_fn, observe: must be picklable (e.g. module-level functions)
+            when num_workers > 0.
+        """
+        self.env_fn = env_fn
+        self.observe = observe
+        # One single-process executor per worker keeps each env in one process
+        self.executors = [
+            ProcessPoolExecutor(max_workers=1) for _ in range(num_workers)
+        ]
+
+    async def _call(self, episode: int, fn: Callable, *args):
+        if not self.executors:
+            return fn(*args)
+        executor = self.executors[episode % len(self.executors)]
+        return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+
+    async def reset(self, episode: int, seed: Optional[int] = None):
+        key = (id(self), episode)
+        return await self._call(
+            episode, _env_reset, self.env_fn, self.observe, key, seed
+        )
+
+    async def step(self, episode: int, action: Any):
+        key = (id(self), episode)
+        return await self._call(episode, _env_step, self.observe, key, action)
+
+    async def close_env(self, episode: int):
+        await self._call(episode, _env_close, (id(self), episode))
+
+    def close(self):
+        for executor in self.executors:
+            executor.shutdown()
+        self.executors = []
+
+
+class EpisodeAgent(abc.ABC):
+    """Chooses the actions of one episode
+
+    LLM calls should be awaited, so that other episodes progress meanwhile.
+    """
+
+    async def reset(self, obs: Any):
+        pass
+
+    @abc.abstractmethod
+    async def act(self, obs: Any) -> Any:
+        ...
+
+    async def observe(self, obs: Any, reward: float, terminated: bool, truncated: bool):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        """Extra fields recorded in the episode's result"""
+        return {}
+
+
+@dataclasses.dataclass
+class EpisodeResult:
+    episode: int
+    seed: Optional[int]
+    steps: int = 0
+    reward: float = 0.0
+    terminated: bool = False
+    truncated: bool = False
+    elapsed: float = 0.0
+    error: Optional[str] = None
+    stats: Dict[str, Any] = dataclasses.field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dataclasses.asdict(self)
+
+
+class JSONLSink:
+    """Appends each result to a JSON Lines file as soon as its episode ends"""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a")
+
+    def __call__(self, result: EpisodeResult):
+        self._file.write(json.dumps(result.to_dict()) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self) -> "JSONLSink":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class EpisodeRunner:
+    """Runs many episodes concurrently: one coroutine per episode
+
+    While an episode awaits its agent (i.e. the LLM), the others step. Every
+    episode ends when the env terminates or truncates, or after `max_steps`
+    steps (counted as truncated). An episode that raises is recorded with
+    its error instead of stopping the run.
+    """
+
+    def __init__(
+        self,
+        env_fn: Callable[[], "gym.Env"],
+        agent_fn: Callable[[Optional[int]], EpisodeAgent],
+        max_steps: Optional[int] = None,
+        max_concurrency: int = 16,
+        num_workers: int = 0,
+        observe: Observe = _observe_raw,
+        sink: Optional[Callable[[EpisodeResult], None]] = None,
+    ):
+        """
+        agent_fn: creates the agent of an episode, given the episode's seed.
+        max_concurrency: episodes in flight at once.
+        num_workers: processes stepping the envs; 0 steps them in-process.
+        observe: what agents see of the env (see Observe).
+        sink: called with each result as soon as its episode ends.
+        """
+        self.env_fn = env_fn
+        self.agent_fn = agent_fn
+        self.max_steps = max_steps
+        self.max_concurrency = max_concurrency
+        self.num_workers = num_workers
+        self.observe = observe
+        self.sink = sink
+
+    async def _episode(
+        self,
+        envs: EnvPool,
+        semaphore: asyncio.Semaphore,
+        episode: int,
+        seed: Optional[int],
+    ) -> EpisodeResult:
+        result = EpisodeResult(episode=episode, seed=seed)
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                agent = self.agent_fn(seed)
+                with timer("env.reset"):
+                    obs, _ = await envs.reset(episode, seed)
+                with trace_context(episode=episode, seed=seed, step=0):
+                    with timer("agent.reset"):
+                        await agent.reset(obs)
+                while not (result.terminated or result.truncated):
+                    if self.max_steps is not None and result.steps >= self.max_steps:
+                        result.truncated = True
+                        break
+                    with trace_context(
+                        episode=episode, seed=seed, step=result.steps + 1
+                    ):
+                        with timer("agent.act"):
+                            action = await agent.act(obs)
+                        with timer("env.step"):
+                            obs, reward, terminated, truncated, _ = await envs.step(
+                                episode, action
+                            )
+                        count("steps")
+                        result.steps += 1
+                        result.reward += reward
+                        result.terminated = terminated
+                        result.truncated = truncated
+                        with timer("agent.observe"):
+                            await agent.observe(obs, reward, terminated, truncated)
+                result.stats = agent.stats()
+            except Exception as error:
+                logger.exception("Episode %d (seed %s) failed", episode, seed)
+                result.error = f"{type(error).__name__}: {error}"
+            finally:
+                await envs.close_env(episode)
+                result.elapsed = time.perf_counter() - start
+
+        if self.sink is not None:
+            self.sink(result)
+        return result
+
+    async def arun(self, seeds: Sequence[Optional[int]]) -> List[EpisodeResult]:
+        """Run one episode per seed; results are in the order of `seeds`"""
+        envs = EnvPool(self.env_fn, self.num_workers, self.observe)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        try:
+            return await asyncio.gather(
+                *(
+                    self._episode(envs, semaphore, episode, seed)
+                    for episode, seed in enumerate(seeds)
+                )
+            )
+        finally:
+            envs.close()
+
+    def run(self, seeds: Sequence[Optional[int]]) -> List[EpisodeResult]:
+        return asyncio.run(self.arun(seeds))
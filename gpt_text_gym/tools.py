@@ -0,0 +1,287 @@
+""" Tools that agents can call from their replies, without eval()
+
+A ToolRegistry declares each tool's signature (from its annotations):
+
+    TOOLS = ToolRegistry()
+
+    @TOOLS.tool()
+    def get_coordinate(index, object_name: str) -> Tuple[int, int]:
+        ...
+
+Every tool takes a context (e.g. the state of the current step) as its
+first argument; the model supplies the others. parse() turns a reply such as
+
+    Next tool to use: is_next_to(get_coordinate("red key"), (2, 3))
+
+into ToolCalls. Only registered tools and literals are accepted, so nothing
+in the reply is ever executed as code. A ToolSession runs parsed calls
+against one context and memoizes each (tool, arguments) result, so repeated
+or nested calls within a step are computed once.
+"""
+
+import ast
+import inspect
+import re
+import typing
+
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# Parsed replies kept per registry; replies repeat a lot across steps
+PARSE_CACHE_SIZE = 1024
+# Lines that name a tool invocation; a line may hold several, comma-separated
+TOOL_LINE = re.compile(r"next tool to use:\s*(.+)", re.IGNORECASE)
+
+
+class ToolError(ValueError):
+    """A tool call that cannot be parsed, does not match its tool, or failed"""
+
+
+class ToolCall(NamedTuple):
+    """Invocation of a tool; arguments are literals or other ToolCalls"""
+
+    name: str
+    args: Tuple[Any, ...]
+
+    def __str__(self) -> str:
+        return f"{self.name}({', '.join(map(_format_arg, self.args))})"
+
+
+def _format_arg(arg: Any) -> str:
+    return str(arg) if isinstance(arg, ToolCall) else repr(arg)
+
+
+class Tool(NamedTuple):
+    name: str
+    function: Callable[..., Any]
+    # (name, annotation, default) of the arguments after the context; the
+    # default is inspect.Parameter.empty for required arguments
+    params: Tuple[Tuple[str, Any, Any], ...]
+    returns: Any
+    doc: str
+
+    @property
+    def signature(self) -> str:
+        params = ", ".join(
+            f"{name}: {_format_type(annotation)}"
+            + ("" if default is inspect.Parameter.empty else f" = {default!r}")
+            for name, annotation, default in self.params
+        )
+        return f"{self.name}({params}) -> {_format_type(self.returns)}"
+
+
+def _format_type(annotation: Any) -> str:
+    if isinstance(annotation, type):
+        return annotation.__name__
+    return str(annotation).replace("typing.", "")
+
+
+class ToolResult(NamedTuple):
+    call: ToolCall
+    value: Any = None
+    error: Optional[ToolError] = None
+
+    def __str__(self) -> str:
+        if self.error is not None:
+            return f"The call {self.call} failed: {self.error}."
+        return f"The result of {self.call} is {self.value}."
+
+
+class ToolRegistry:
+    """Tools by name, and a parser for invocations of them"""
+
+    def __init__(self):
+        self.tools: Dict[str, Tool] = {}
+        self._parsed: Dict[str, List[ToolCall]] = {}
+
+    def register(self, function: Callable, name: Optional[str] = None) -> Tool:
+        signature = inspect.signature(function)
+        hints = typing.get_type_hints(function)
+        params = [
+            (param.name, hints.get(param.name, Any), param.default)
+            for param in signature.parameters.values()
+        ][1:]
+        tool = Tool(
+            name or function.__name__,
+            function,
+            tuple(params),
+            hints.get("return", Any),
+            inspect.getdoc(function) or "",
+        )
+        self.tools[tool.name] = tool
+        self._parsed.clear()
+        return tool
+
+    def tool(self, name: Optional[str] = None):
+        """Decorator form of register(); the function is returned unchanged"""
+
+        def decorator(function: Callable) -> Callable:
+            self.register(function, name)
+            return function
+
+        return decorator
+
+    def describe(self) -> str:
+        """Signatures of all tools, as listed in prompts"""
+        return ", ".join(tool.signature for tool in self.tools.values())
+
+    def parse(self, text: str) -> List[ToolCall]:
+        """Tool calls on the 'Next tool to use:' lines of a reply
+
+        A text without such lines is parsed as invocations itself. Raises
+        ToolError if an invocation is not a registered tool called with
+        literals (or other tool calls) in the right number.
+        """
+        calls = self._parsed.get(text)
+        if calls is None:
+            expressions = TOOL_LINE.findall(text) or [text]
+            calls = [
+                call for expression in expressions for call in self._parse(expression)
+            ]
+            if len(self._parsed) >= PARSE_CACHE_SIZE:
+                self._parsed.clear()
+            self._parsed[text] = calls
+        return list(calls)
+
+    def _parse(self, expression: str) -> List[ToolCall]:
+        expression = expression.strip(" `.;")
+        try:
+            node = ast.parse(expression, mode="eval").body
+        except SyntaxError as error:
+            raise ToolError(f"cannot parse {expression!r}") from error
+        # "a(...), b(...)" is a batch of calls, not one tuple
+        nodes = node.elts if isinstance(node, ast.Tuple) else [node]
+        if not nodes or not all(isinstance(node, ast.Call) for node in nodes):
+            raise ToolError(f"{expression!r} is not a tool call")
+        return [self._call(node) for node in nodes]
+
+    def _call(self, node: ast.Call) -> ToolCall:
+        if not isinstance(node.func, ast.Name) or node.func.id not in self.tools:
+            name = ast.unparse(node.func)
+            raise ToolError(f"unknown tool {name!r}; tools: {', '.join(self.tools)}")
+        tool = self.tools[node.func.id]
+        args: List[Any] = [self._arg(arg) for arg in node.args]
+        by_name = {keyword.arg: keyword.value for keyword in node.keywords}
+        if len(args) > len(tool.params):
+            raise ToolError(f"{tool.signature} called as {ast.unparse(node)}")
+        # Omitted arguments are filled in, so equal calls have equal ToolCalls
+        for name, _, default in tool.params[len(args) :]:
+            if name in by_name:
+                args.append(self._arg(by_name.pop(name)))
+            elif default is not inspect.Parameter.empty:
+                args.append(default)
+            else:
+                raise ToolError(f"{tool.signature} called as {ast.unparse(node)}")
+        if by_name:
+            raise ToolError(f"{tool.signature} called as {ast.unparse(node)}")
+        return ToolCall(tool.name, tuple(args))
+
+    def _arg(self, node: ast.expr) -> Any:
+        if isinstance(node, ast.Call):
+            return self._call(node)
+        try:
+            value = _freeze(ast.literal_eval(node))
+            hash(value)
+        except (TypeError, ValueError) as error:
+            raise ToolError(f"{ast.unparse(node)} is not a literal") from error
+        return value
+
+    def session(self, context: Any) -> "ToolSession":
+        return ToolSession(self, context)
+
+
+def _freeze(value: Any) -> Any:
+    """Lists to tuples, so arguments can key the memo"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _conform(value: Any, annotation: Any) -> Any:
+    """`value` as `annotation` (e.g. a list as a tuple); ToolError if it is not"""
+    if annotation is Any:
+        return value
+    origin = typing.get_origin(annotation)
+    if origin is typing.Union:
+        for option in typing.get_args(annotation):
+            try:
+                return _conform(value, option)
+            except ToolError:
+                pass
+    elif origin is tuple:
+        types = typing.get_args(annotation)
+        if isinstance(value, (list, tuple)):
+            if len(types) == 2 and types[1] is Ellipsis:
+                return tuple(_conform(item, types[0]) for item in value)
+            if not types or len(types) == len(value):
+                return tuple(
+                    _conform(item, item_type)
+                    for item, item_type in zip(value, types or [Any] * len(value))
+                )
+    elif annotation is None or annotation is type(None):
+        if value is None:
+            return value
+    elif annotation is float:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return value
+    elif annotation is int:
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+    elif isinstance(annotation, type):
+        if isinstance(value, annotation):
+            return value
+    else:
+        return value
+    raise ToolError(f"expected {_format_type(annotation)}, got {value!r}")
+
+
+class ToolSession:
+    """Runs tool calls against one context, computing each distinct call once"""
+
+    def __init__(self, registry: ToolRegistry, context: Any):
+        self.registry = registry
+        self.context = context
+        self.results: Dict[ToolCall, Any] = {}
+        self.calls = 0
+        self.hits = 0
+
+    def call(self, call: ToolCall) -> Any:
+        """Result of `call`; raises ToolError if it or a nested call fails"""
+        self.calls += 1
+        try:
+            result = self.results[call]
+        except KeyError:
+            pass
+        else:
+            self.hits += 1
+            if isinstance(result, ToolError):
+                raise result
+            return result
+        tool = self.registry.tools[call.name]
+        try:
+            args = [
+                _conform(self.call(arg) if isinstance(arg, ToolCall) else arg, param)
+                for arg, (_, param, _) in zip(call.args, tool.params)
+            ]
+            result = tool.function(self.context, *args)
+        except ToolError as error:
+            result = error
+        except Exception as error:
+            result = ToolError(f"{type(error).__name__}: {error}")
+        self.results[call] = result
+        if isinstance(result, ToolError):
+            raise result
+        return result
+
+    def run(self, calls: Iterable[ToolCall]) -> List[ToolResult]:
+        """Run a batch of calls; a failing call does not stop the others"""
+        results = []
+        for call in calls:
+            try:
+                results.append(ToolResult(call, self.call(call)))
+            except ToolError as error:
+                results.append(ToolResult(call, error=error))
+        return results
+
+    def run_reply(self, text: str) -> List[ToolResult]:
+        """Parse a reply (see ToolRegistry.parse) and run its calls"""
+        return self.run(self.registry.parse(text))
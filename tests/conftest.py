@@ -0,0 +1,22 @@
+import pytest
+
+from gpt_text_gym.examples import minigrid_tools
+from gpt_text_gym.gpt import PromptMemo, RequestScheduler
+
+
+@pytest.fixture
+def offline_llm(monkeypatch):
+    """Answers minigrid_tools' LLM calls with the given backend (e.g. a FakeLLM)
+
+    No completion cache, no rate limits, and a fresh prompt memo
+    (memo_size=0 turns memoization off). Returns the backend.
+    """
+
+    def use(llm, memo_size: int = 1024):
+        monkeypatch.setattr(minigrid_tools, "LLM_BACKEND", llm)
+        monkeypatch.setattr(minigrid_tools, "COMPLETION_CACHE", None)
+        monkeypatch.setattr(minigrid_tools, "PROMPT_MEMO", PromptMemo(memo_size))
+        monkeypatch.setattr(minigrid_tools, "OPENAI_SCHEDULER", RequestScheduler())
+        return llm
+
+    return use
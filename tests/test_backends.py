@@ -0,0 +1,139 @@
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+from gpt_text_gym.gpt import (
+    Backend,
+    CompletionCache,
+    GPTChatCompleter,
+    HTTPBackend,
+    LocalBackend,
+    Message,
+    complete_stream,
+    openai_chat_completion_create,
+    openai_chat_completion_stream,
+)
+
+
+def echo(messages):
+    return f"echo: {messages[-1]['content']}"
+
+
+class TestBackend(unittest.TestCase):
+    def test_incomplete_backend_fails_at_construction(self):
+        class CreateOnly(Backend):
+            def create(self, **params):
+                return None
+
+        with self.assertRaises(TypeError):
+            CreateOnly()
+
+
+class TestLocalBackend(unittest.TestCase):
+    def setUp(self):
+        self.backend = LocalBackend(echo)
+        self.messages = [{"role": "user", "content": "hello there"}]
+
+    def test_create(self):
+        response = openai_chat_completion_create(
+            model="local",
+            messages=self.messages,
+            n=2,
+            temperature=0,
+            max_tokens=None,
+            backend=self.backend,
+        )
+        self.assertEqual(
+            [choice.message.content for choice in response.choices],
+            ["echo: hello there"] * 2,
+        )
+        self.assertEqual(self.backend.calls, 1)
+
+    def test_stream(self):
+        deltas = openai_chat_completion_stream(
+            model="local",
+            messages=self.messages,
+            temperature=0,
+            max_tokens=None,
+            backend=self.backend,
+        )
+        self.assertEqual(complete_stream(deltas), "echo: hello there")
+
+    @patch("dotenv.get_key", return_value="dummy_api_key")
+    def test_chat_completer(self, mock_get_key):
+        chat_completer = GPTChatCompleter(backend=self.backend)
+        mock_get_key.assert_not_called()
+        chat_completer.add_message(Message("user", "hi"))
+        self.assertEqual(
+            chat_completer.generate_chat_completion(), Message("assistant", "echo: hi")
+        )
+        self.assertEqual(
+            chat_completer.generate_chat_completion(early_stop=lambda text: None),
+            Message("assistant", "echo: hi"),
+        )
+        reply = asyncio.run(chat_completer.agenerate_chat_completion())
+        self.assertEqual(reply, Message("assistant", "echo: hi"))
+
+    def test_respond_batch(self):
+        respond_batch = MagicMock(side_effect=lambda batch: [echo(m) for m in batch])
+        backend = LocalBackend(echo, respond_batch=respond_batch)
+        chat_completer = GPTChatCompleter(backend=backend)
+        conversations = [[Message("user", str(idx))] for idx in range(5)]
+        replies = chat_completer.generate_batch_chat_completions(conversations)
+        self.assertEqual(
+            replies, [[Message("assistant", f"echo: {idx}")] for idx in range(5)]
+        )
+        respond_batch.assert_called_once()
+        replies = asyncio.run(
+            chat_completer.agenerate_batch_chat_completions(conversations)
+        )
+        self.assertEqual(len(replies), 5)
+        self.assertEqual(respond_batch.call_count, 2)
+
+    def test_concurrent_batch(self):
+        backend = LocalBackend(echo, concurrent=True)
+        call = MagicMock(side_effect=lambda fn, params: fn(**params))
+        requests = [
+            {"model": "local", "messages": [{"role": "user", "content": str(idx)}]}
+            for idx in range(3)
+        ]
+        responses = backend.batch(requests, call=call)
+        self.assertEqual(call.call_count, 3)
+        self.assertEqual(responses[2].choices[0].message.content, "echo: 2")
+
+        async def acall(fn, params):
+            return await fn(**params)
+
+        responses = asyncio.run(backend.abatch(requests, call=acall))
+        self.assertEqual(len(responses), 3)
+        self.assertEqual(backend.calls, 6)
+
+    def test_batch_uses_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = CompletionCache(Path(tmp) / "cache.sqlite")
+            chat_completer = GPTChatCompleter(backend=self.backend, cache=cache)
+            conversations = [[Message("user", str(idx))] for idx in range(3)]
+            chat_completer.generate_batch_chat_completions(conversations[:2])
+            replies = chat_completer.generate_batch_chat_completions(conversations)
+            cache.close()
+        self.assertEqual(self.backend.calls, 3)
+        self.assertEqual(replies[2], [Message("assistant", "echo: 2")])
+
+
+class TestHTTPBackend(unittest.TestCase):
+    @patch("openai.ChatCompletion.create")
+    def test_requests_go_to_base_url(self, mock_create):
+        backend = HTTPBackend("http://localhost:1234/v1")
+        messages = [{"role": "user", "content": "hi"}]
+        backend.create(model="local", messages=messages)
+        mock_create.assert_called_once_with(
+            model="local",
+            messages=messages,
+            api_key="local",
+            api_base="http://localhost:1234/v1",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
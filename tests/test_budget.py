@@ -0,0 +1,86 @@
+import unittest
+from unittest.mock import patch
+from gpt_text_gym.gpt import (
+    GPTChatCompleter,
+    Message,
+    PromptBudget,
+    limit_tokens_from_string,
+    prompt_limit,
+)
+from gpt_text_gym.gpt.budget import TOKENS_PER_MESSAGE, TOKENS_PER_REPLY
+
+
+def count_words(text: str, model: str) -> int:
+    return len(text.split())
+
+
+class TestPromptBudget(unittest.TestCase):
+    def setUp(self):
+        # Room for the system message and two 10-word messages
+        self.limit = 3 * (10 + TOKENS_PER_MESSAGE) + TOKENS_PER_REPLY
+        self.system = Message("system", " ".join(["rule"] * 10))
+        self.messages = [Message("user", " ".join([f"m{i}"] * 10)) for i in range(4)]
+
+    def make_budget(self, **kwargs):
+        return PromptBudget("gpt-4", limit=self.limit, count=count_words, **kwargs)
+
+    def test_fit_drops_oldest_non_system_messages(self):
+        budget = self.make_budget()
+        history = []
+        for message in [self.system] + self.messages:
+            history.append(message)
+            budget.add(message)
+            budget.fit(history)
+        self.assertEqual(history, [self.system] + self.messages[2:])
+        self.assertEqual(budget.total, 3 * (10 + TOKENS_PER_MESSAGE))
+        self.assertLessEqual(budget.total, budget.limit)
+
+    def test_fit_summarizes_dropped_messages(self):
+        def summarize(dropped):
+            return Message("user", f"summary of {len(dropped)}")
+
+        budget = self.make_budget(summarize=summarize)
+        history = [self.system] + self.messages[:3]
+        budget.reset(history)
+        dropped = budget.fit(history)
+        self.assertEqual(dropped, self.messages[:2])
+        self.assertEqual(
+            history, [self.system, Message("user", "summary of 2"), self.messages[2]]
+        )
+        self.assertEqual(budget.total, sum(map(budget.message_tokens, history)))
+
+    def test_latest_message_is_kept(self):
+        budget = self.make_budget()
+        history = [Message("user", " ".join(["word"] * 100))]
+        budget.reset(history)
+        self.assertEqual(budget.fit(history), [])
+        self.assertEqual(len(history), 1)
+
+    @patch("dotenv.get_key", return_value="dummy_api_key")
+    def test_chat_completer_budget(self, mock_get_key):
+        chat_completer = GPTChatCompleter(budget=self.make_budget())
+        for message in [self.system] + self.messages:
+            chat_completer.add_message(message)
+        self.assertEqual(chat_completer.chat_history, [self.system] + self.messages[2:])
+        chat_completer.clear()
+        self.assertEqual(chat_completer.budget.total, 0)
+
+
+class TestLimitTokens(unittest.TestCase):
+    def test_short_string_is_unchanged(self):
+        self.assertEqual(limit_tokens_from_string("hello", "gpt-4", 10), "hello")
+
+    def test_long_string_is_truncated(self):
+        trimmed = limit_tokens_from_string("word " * 1000, "gpt-4", 100)
+        self.assertLess(len(trimmed), len("word " * 1000))
+        self.assertTrue(("word " * 1000).startswith(trimmed))
+
+    def test_prompt_limit(self):
+        self.assertEqual(
+            prompt_limit("gpt-4", 100),
+            8192 - 100 - TOKENS_PER_MESSAGE - TOKENS_PER_REPLY,
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+from gpt_text_gym.gpt import (
+    CompletionCache,
+    FakeLLM,
+    Message,
+    PromptMemo,
+    complete_stream,
+    early_stop_key,
+    match_prefix,
+    openai_chat_completion_create,
+    openai_chat_completion_stream,
+)
+
+
+class TestCompletionCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmpdir.name) / "completions.sqlite"
+        self.cache = CompletionCache(self.path)
+        self.messages = [Message("user", "Hello").to_dict()]
+        self.response = {
+            "choices": [{"message": Message("assistant", "Bonjour").to_dict()}]
+        }
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmpdir.cleanup()
+
+    def create(self, cache, **kwargs):
+        return openai_chat_completion_create(
+            model="gpt-4",
+            messages=self.messages,
+            n=1,
+            temperature=0.0,
+            max_tokens=None,
+            cache=cache,
+            **kwargs,
+        )
+
+    def test_key_is_stable(self):
+        self.assertEqual(
+            CompletionCache.key(model="gpt-4", n=1, messages=self.messages),
+            CompletionCache.key(messages=self.messages, n=1, model="gpt-4"),
+        )
+        self.assertNotEqual(
+            CompletionCache.key(model="gpt-4", n=1),
+            CompletionCache.key(model="gpt-4", n=2),
+        )
+
+    def test_replay_makes_no_calls(self):
+        with patch("openai.ChatCompletion.create", return_value=self.response) as mock:
+            first = self.create(self.cache)
+            self.cache.close()
+            replay_cache = CompletionCache(self.path)
+            second = self.create(replay_cache)
+            third = self.create(replay_cache, stop=None)
+        # Only the request with the extra stop kwarg went to the API again
+        self.assertEqual(mock.call_count, 2)
+        self.assertEqual(first, self.response)
+        self.assertEqual(second, self.response)
+        self.assertEqual(second.choices[0].message.content, "Bonjour")
+        self.assertEqual((replay_cache.hits, replay_cache.misses), (1, 1))
+        self.assertEqual(len(replay_cache), 2)
+        replay_cache.close()
+
+    def test_streamed_replay_makes_no_calls(self):
+        llm = FakeLLM(default="No, the key is still on the floor")
+
+        def answer(cache, early_stop):
+            deltas = openai_chat_completion_stream(
+                model="gpt-4",
+                messages=self.messages,
+                temperature=0.0,
+                max_tokens=None,
+                cache=cache,
+                stop_key=early_stop_key(early_stop),
+                backend=llm,
+            )
+            return complete_stream(deltas, early_stop)
+
+        yes_no = match_prefix(("yes", "no"))
+        self.assertEqual(answer(self.cache, yes_no), "no")
+        self.cache.close()
+        replay_cache = CompletionCache(self.path)
+        self.assertEqual(answer(replay_cache, match_prefix(("yes", "no"))), "no")
+        self.assertEqual(llm.calls, 1)
+        self.assertEqual(replay_cache.hits, 1)
+        # Another early stop reads more of the reply, so it is not replayed
+        self.assertEqual(
+            answer(replay_cache, match_prefix(("no, the key",))), "no, the key"
+        )
+        self.assertEqual(llm.calls, 2)
+        replay_cache.close()
+
+    def test_max_age(self):
+        cache = CompletionCache(self.path, max_age=60.0)
+        cache.set("key", self.response)
+        self.assertIsNotNone(cache.get("key"))
+        with patch("time.time", return_value=1e12):
+            self.assertIsNone(cache.get("key"))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        cache.close()
+
+    def test_max_entries(self):
+        cache = CompletionCache(self.path, max_entries=3)
+        cache.EVICT_EVERY = 1
+        for i in range(5):
+            cache.set(f"key{i}", self.response)
+        self.assertEqual(len(cache), 3)
+        self.assertIsNone(cache.get("key0"))
+        self.assertIsNotNone(cache.get("key4"))
+        cache.close()
+
+
+class TestPromptMemo(unittest.TestCase):
+    def test_hits_and_misses_per_tag(self):
+        memo = PromptMemo()
+        self.assertIsNone(memo.get("prompt", tag="planning"))
+        memo.set("prompt", "answer")
+        self.assertEqual(memo.get("prompt", tag="planning"), "answer")
+        self.assertEqual(memo.get("prompt", tag="evaluation"), "answer")
+        self.assertEqual(memo.hits, {"planning": 1, "evaluation": 1})
+        self.assertEqual(memo.misses, {"planning": 1})
+        self.assertIn("planning: 1 calls, 1 skipped (50%)", memo.summary())
+        memo.reset_stats()
+        self.assertEqual(memo.summary(), "")
+        self.assertEqual(len(memo), 1)
+
+    def test_lru_eviction(self):
+        memo = PromptMemo(max_size=2)
+        memo.set("a", 1)
+        memo.set("b", 2)
+        memo.get("a")
+        memo.set("c", 3)
+        self.assertIsNone(memo.get("b"))
+        self.assertEqual(memo.get("a"), 1)
+        self.assertEqual(memo.get("c"), 3)
+
+    def test_ttl(self):
+        memo = PromptMemo(ttl=10.0)
+        with patch("time.monotonic", return_value=0.0):
+            memo.set("a", 1)
+        with patch("time.monotonic", return_value=5.0):
+            self.assertEqual(memo.get("a"), 1)
+        with patch("time.monotonic", return_value=20.0):
+            self.assertIsNone(memo.get("a"))
+        self.assertEqual(len(memo), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
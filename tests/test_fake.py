@@ -0,0 +1,83 @@
+import asyncio
+import time
+import unittest
+import openai
+from gpt_text_gym.gpt import (
+    FakeLLM,
+    complete_stream,
+    match_line,
+    openai_chat_completion_acreate,
+    openai_chat_completion_create,
+    openai_chat_completion_stream,
+)
+
+MESSAGES = [{"role": "user", "content": "Has the goal been achieved?"}]
+
+
+class TestFakeLLM(unittest.TestCase):
+    def setUp(self):
+        self.llm = FakeLLM(
+            rules=[("goal", "no"), ("tool", "Next tool to use: look()\nmore")],
+            default="ok",
+        )
+
+    def test_rules_and_default(self):
+        self.assertEqual(self.llm.reply(MESSAGES), "no")
+        self.assertEqual(self.llm.reply([{"role": "user", "content": "hi"}]), "ok")
+
+    def test_respond(self):
+        llm = FakeLLM(respond=lambda messages: str(len(messages)))
+        self.assertEqual(llm.reply(MESSAGES * 3), "3")
+
+    def test_patch(self):
+        original = openai.ChatCompletion.create
+        with self.llm.patch():
+            response = openai_chat_completion_create(
+                model="gpt-4", messages=MESSAGES, n=2, temperature=0, max_tokens=None
+            )
+        self.assertEqual(openai.ChatCompletion.create, original)
+        self.assertEqual(response.choices[1].message.content, "no")
+        self.assertEqual(self.llm.calls, 1)
+        self.assertEqual(
+            response["usage"]["total_tokens"],
+            self.llm.prompt_tokens + self.llm.completion_tokens,
+        )
+
+    def test_stream(self):
+        messages = [{"role": "user", "content": "which tool?"}]
+        with self.llm.patch():
+            deltas = openai_chat_completion_stream(
+                model="gpt-4", messages=messages, temperature=0, max_tokens=None
+            )
+            self.assertEqual(
+                complete_stream(deltas, match_line(r"next tool to use: (.*)")),
+                "Next tool to use: look()",
+            )
+
+    def test_acreate_latency(self):
+        llm = FakeLLM(default="ok", latency=0.05)
+
+        async def run():
+            return await asyncio.gather(
+                *(
+                    openai_chat_completion_acreate(
+                        model="gpt-4",
+                        messages=MESSAGES,
+                        n=1,
+                        temperature=0,
+                        max_tokens=None,
+                    )
+                    for _ in range(10)
+                )
+            )
+
+        start = time.perf_counter()
+        with llm.patch():
+            responses = asyncio.run(run())
+        self.assertLess(time.perf_counter() - start, 0.25)
+        self.assertEqual(llm.calls, 10)
+        self.assertEqual(responses[0].choices[0].message.content, "ok")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,15 @@
+import asyncio
+import time
 import unittest
+import openai
 from unittest.mock import patch, MagicMock
-from gpt_text_gym.gpt import GPTChatCompleter, openai_chat_completion_create, Message
+from gpt_text_gym import get_api_key
+from gpt_text_gym.gpt import (
+    GPTChatCompleter,
+    openai_aiosession,
+    openai_chat_completion_create,
+    Message,
+)
 
 
 class TestMessage(unittest.TestCase):
@@ -39,6 +48,27 @@ class TestGPTChatCompleter(unittest.TestCase):
         self.assertIsNone(chat_completer.max_tokens)
         self.assertEqual(chat_completer.n, self.n)
         self.assertEqual(chat_completer.chat_history, [])
+        # The API key is only resolved when a request is made
+        mock_get_key.assert_not_called()
+
+    @patch("openai.ChatCompletion.create")
+    @patch("dotenv.get_key", return_value="dummy_api_key")
+    def test_api_key_is_read_once(self, mock_get_key, mock_create):
+        mock_create.return_value = {
+            "choices": [{"message": {"role": "assistant", "content": "hi"}}]
+        }
+        api_key = openai.api_key
+        openai.api_key = None
+        get_api_key.cache_clear()
+        try:
+            for _ in range(3):
+                chat_completer = GPTChatCompleter()
+                chat_completer.add_message(self.messages[0])
+                chat_completer.generate_chat_completion()
+            self.assertEqual(openai.api_key, "dummy_api_key")
+        finally:
+            openai.api_key = api_key
+            get_api_key.cache_clear()
         mock_get_key.assert_called_once()
 
     @patch("dotenv.get_key", return_value="dummy_api_key")
@@ -99,5 +129,102 @@ class TestGPTChatCompleter(unittest.TestCase):
         )
 
 
+class TestBatchGPTChatCompleter(unittest.TestCase):
+    latency = 0.05
+
+    def fake_create(self, messages, n, **kwargs):
+        time.sleep(self.latency)
+        content = messages[-1]["content"]
+        return {
+            "choices": [
+                {"message": {"role": "assistant", "content": f"{content} {i}"}}
+                for i in range(n)
+            ]
+        }
+
+    @patch("dotenv.get_key", return_value="dummy_api_key")
+    def test_generate_chat_completions(self, mock_get_key):
+        chat_completer = GPTChatCompleter(n=3)
+        chat_completer.add_message(Message("user", "vote"))
+        with patch("openai.ChatCompletion.create", side_effect=self.fake_create):
+            replies = chat_completer.generate_chat_completions()
+        self.assertEqual([r.content for r in replies], ["vote 0", "vote 1", "vote 2"])
+
+    @patch("dotenv.get_key", return_value="dummy_api_key")
+    def test_generate_batch_chat_completions(self, mock_get_key):
+        chat_completer = GPTChatCompleter(n=2)
+        conversations = [[Message("user", f"env {i}")] for i in range(16)]
+        start = time.perf_counter()
+        with patch("openai.ChatCompletion.create", side_effect=self.fake_create):
+            replies = chat_completer.generate_batch_chat_completions(
+                conversations, max_workers=16
+            )
+        elapsed = time.perf_counter() - start
+        self.assertEqual(
+            [[r.content for r in choices] for choices in replies],
+            [[f"env {i} 0", f"env {i} 1"] for i in range(16)],
+        )
+        self.assertLess(elapsed, 4 * self.latency)
+        self.assertEqual(chat_completer.chat_history, [])
+
+
+class TestAsyncGPTChatCompleter(unittest.IsolatedAsyncioTestCase):
+    latency = 0.1
+
+    def setUp(self):
+        self.message = Message("assistant", "Bonjour")
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def fake_acreate(self, **kwargs):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.latency)
+        self.in_flight -= 1
+        return {"choices": [{"message": self.message.to_dict()}]}
+
+    async def run_completers(self, n_requests, semaphore=None):
+        completers = [GPTChatCompleter(semaphore=semaphore) for _ in range(n_requests)]
+        for completer in completers:
+            completer.add_message(Message("user", "Hello"))
+        start = time.perf_counter()
+        replies = await asyncio.gather(
+            *(completer.agenerate_chat_completion() for completer in completers)
+        )
+        return replies, time.perf_counter() - start
+
+    @patch("dotenv.get_key", return_value="dummy_api_key")
+    async def test_agenerate_chat_completion_concurrent(self, mock_get_key):
+        with patch("openai.ChatCompletion.acreate", side_effect=self.fake_acreate):
+            replies, elapsed = await self.run_completers(20)
+        self.assertEqual(replies, [self.message] * 20)
+        self.assertEqual(self.max_in_flight, 20)
+        self.assertLess(elapsed, 2 * self.latency)
+
+    @patch("dotenv.get_key", return_value="dummy_api_key")
+    async def test_agenerate_chat_completion_semaphore(self, mock_get_key):
+        with patch("openai.ChatCompletion.acreate", side_effect=self.fake_acreate):
+            _, elapsed = await self.run_completers(8, asyncio.Semaphore(4))
+        self.assertEqual(self.max_in_flight, 4)
+        self.assertGreaterEqual(elapsed, 2 * self.latency)
+
+    @patch("dotenv.get_key", return_value="dummy_api_key")
+    async def test_agenerate_batch_chat_completions(self, mock_get_key):
+        chat_completer = GPTChatCompleter(semaphore=asyncio.Semaphore(5))
+        conversations = [[Message("user", f"env {i}")] for i in range(10)]
+        with patch("openai.ChatCompletion.acreate", side_effect=self.fake_acreate):
+            replies = await chat_completer.agenerate_batch_chat_completions(
+                conversations
+            )
+        self.assertEqual(replies, [[self.message]] * 10)
+        self.assertEqual(self.max_in_flight, 5)
+
+    async def test_openai_aiosession(self):
+        self.assertIsNone(openai.aiosession.get())
+        async with openai_aiosession() as session:
+            self.assertIs(openai.aiosession.get(), session)
+        self.assertIsNone(openai.aiosession.get())
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,162 @@
+import unittest
+from unittest.mock import patch
+from gpt_text_gym.gpt import (
+    Compaction,
+    FixedWindow,
+    GPTChatCompleter,
+    HistoryPolicy,
+    Message,
+    PromptBudget,
+    TokenWindow,
+    pin,
+)
+from gpt_text_gym.gpt.budget import TOKENS_PER_MESSAGE, TOKENS_PER_REPLY
+
+
+def count_words(text: str, model: str) -> int:
+    return len(text.split())
+
+
+def summarize(messages):
+    return Message("user", "summary: " + " ".join(m.content for m in messages))
+
+
+class TestHistoryPolicies(unittest.TestCase):
+    def setUp(self):
+        self.system = Message("system", "rules")
+        self.mission = Message("user", "mission")
+        self.messages = [Message("user", f"m{i}") for i in range(6)]
+
+    def fill(self, policy, messages):
+        history = []
+        for message in messages:
+            history.append(message)
+            policy.apply(history)
+        return history
+
+    def test_fixed_window(self):
+        history = self.fill(FixedWindow(2), [self.system] + self.messages)
+        self.assertEqual(history, [self.system] + self.messages[-2:])
+
+    def test_fixed_window_keeps_pinned_messages(self):
+        policy = FixedWindow(2, pinned=pin(self.mission))
+        history = self.fill(policy, [self.system, self.mission] + self.messages)
+        self.assertEqual(history, [self.system, self.mission] + self.messages[-2:])
+
+    def test_pin_matches_identity(self):
+        pinned = pin(self.mission)
+        self.assertTrue(pinned(self.mission))
+        self.assertTrue(pinned(Message("system", "other")))
+        self.assertFalse(pinned(Message("user", "mission")))
+
+    def test_compaction(self):
+        policy = Compaction(summarize, max_messages=3, keep_last=1)
+        history = self.fill(policy, [self.system] + self.messages[:4])
+        self.assertEqual(
+            history,
+            [self.system, Message("user", "summary: m0 m1 m2"), self.messages[3]],
+        )
+        # The summary is folded into the next compaction
+        history = self.fill(policy, [self.system] + self.messages)
+        self.assertEqual(history[0], self.system)
+        self.assertEqual(history[1].content, "summary: summary: m0 m1 m2 m3 m4")
+        self.assertEqual(history[2:], [self.messages[5]])
+
+    def test_token_window(self):
+        # Room for three messages of one word
+        limit = 3 * (1 + TOKENS_PER_MESSAGE) + TOKENS_PER_REPLY
+        budget = PromptBudget("gpt-4", limit=limit, count=count_words)
+        history = self.fill(TokenWindow(budget), [self.system] + self.messages)
+        self.assertEqual(history, [self.system] + self.messages[-2:])
+        self.assertEqual(budget.total, 3 * (1 + TOKENS_PER_MESSAGE))
+
+    def test_token_window_counts_each_message_once(self):
+        counted = []
+
+        def count(text, model):
+            counted.append(text)
+            return 1
+
+        budget = PromptBudget("gpt-4", limit=1000, count=count)
+        self.fill(TokenWindow(budget), self.messages)
+        self.assertEqual(counted, [m.content for m in self.messages])
+
+    def test_token_window_only_syncs_new_messages(self):
+        class History(list):
+            scans = 0
+
+            def __iter__(self):
+                History.scans += 1
+                return super().__iter__()
+
+        budget = PromptBudget("gpt-4", limit=1000, count=count_words)
+        policy = TokenWindow(budget)
+        history = History()
+        for message in self.messages:
+            history.append(message)
+            policy.apply(history)
+        # Appending never walks the whole history
+        self.assertEqual(History.scans, 0)
+        self.assertEqual(budget.total, 6 * (1 + TOKENS_PER_MESSAGE))
+
+        # Other changes are recounted
+        del history[2]
+        history.append(Message("user", "three words here"))
+        policy.apply(history)
+        self.assertEqual(budget.total, 6 * (1 + TOKENS_PER_MESSAGE) + 2)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            FixedWindow(0)
+        with self.assertRaises(ValueError):
+            Compaction(summarize, max_messages=2, keep_last=2)
+        # A policy must implement apply
+        with self.assertRaises(TypeError):
+            HistoryPolicy()
+
+
+class TestChatCompleterHistory(unittest.TestCase):
+    @patch("dotenv.get_key", return_value="dummy_api_key")
+    def test_policies_then_budget(self, mock_get_key):
+        system = Message("system", "rules")
+        limit = 4 * (1 + TOKENS_PER_MESSAGE) + TOKENS_PER_REPLY
+        budget = PromptBudget("gpt-4", limit=limit, count=count_words)
+        chat_completer = GPTChatCompleter(
+            policies=[Compaction(summarize, max_messages=2)], budget=budget
+        )
+        for message in [system] + [Message("user", f"m{i}") for i in range(3)]:
+            chat_completer.add_message(message)
+        summary = Message("user", "summary: m0 m1")
+        self.assertEqual(
+            chat_completer.chat_history, [system, summary, Message("user", "m2")]
+        )
+        self.assertEqual(budget.total, 2 * (1 + TOKENS_PER_MESSAGE) + 3 + 4)
+        # The next summary is too long for the budget, which drops it
+        chat_completer.add_message(Message("user", "a b c d e f g"))
+        self.assertEqual(chat_completer.chat_history[0], system)
+        self.assertEqual(len(chat_completer.chat_history), 2)
+        self.assertLessEqual(budget.total, budget.limit)
+        chat_completer.clear()
+        self.assertEqual(budget.total, 0)
+
+    @patch("dotenv.get_key", return_value="dummy_api_key")
+    def test_serialized_messages_are_reused(self, mock_get_key):
+        chat_completer = GPTChatCompleter(policies=[FixedWindow(2)])
+        chat_completer.add_message(Message("system", "rules"))
+        chat_completer.add_message(Message("user", "a"))
+        first = chat_completer._messages()
+        chat_completer.add_message(Message("user", "b"))
+        second = chat_completer._messages()
+        self.assertEqual(second, [m.to_dict() for m in chat_completer.chat_history])
+        self.assertIs(second[0], first[0])
+        self.assertIs(second[1], first[1])
+
+        chat_completer.add_message(Message("user", "c"))
+        third = chat_completer._messages()
+        self.assertEqual([m["content"] for m in third], ["rules", "b", "c"])
+        self.assertIs(third[1], second[2])
+        self.assertEqual(len(chat_completer._serialized), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
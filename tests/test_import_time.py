@@ -0,0 +1,42 @@
+import os
+import subprocess
+import sys
+
+# Cumulative import time budget of gpt_text_gym.gpt, in microseconds
+IMPORT_BUDGET_US = 250_000
+HEAVY_MODULES = ("openai", "dotenv", "aiohttp", "ml_collections", "sympy", "tiktoken")
+
+
+def run_python(*args: str) -> subprocess.CompletedProcess:
+    env = dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT="1")
+    return subprocess.run(
+        [sys.executable, *args], capture_output=True, text=True, env=env, check=True
+    )
+
+
+def import_time(module: str) -> int:
+    """Cumulative microseconds reported by `python -X importtime`"""
+    stderr = run_python("-X", "importtime", "-c", f"import {module}").stderr
+    for line in stderr.splitlines():
+        fields = [field.strip() for field in line.split("|")]
+        if len(fields) == 3 and fields[2] == module:
+            return int(fields[1])
+    raise AssertionError(f"{module} not in -X importtime output:\n{stderr}")
+
+
+def test_gpt_import_time():
+    # Best of 3, as the first run also pays for cold file system caches
+    elapsed = min(import_time("gpt_text_gym.gpt") for _ in range(3))
+    assert elapsed < IMPORT_BUDGET_US, f"import took {elapsed / 1000:.1f} ms"
+
+
+def test_imports_are_lazy():
+    code = (
+        "import sys\n"
+        "import gpt_text_gym.gpt, gpt_text_gym.runner\n"
+        "import gpt_text_gym.examples.minigrid_tools\n"
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n"
+    )
+    result = run_python("-c", code)
+    assert result.stdout.strip() == ""
+    assert "API_KEY" not in result.stdout + result.stderr
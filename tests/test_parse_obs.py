@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+
+from gpt_text_gym.envs.minigrid.parse_obs import (
+    PREFIX_TABLE,
+    get_grid_objects,
+    get_object_array,
+    get_objects,
+    get_objects_batch,
+    get_objects_reference,
+)
+
+
+def random_img_obs(rows: int, cols: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return np.stack(
+        [
+            rng.integers(0, 11, (rows, cols)),
+            rng.integers(0, 6, (rows, cols)),
+            rng.integers(0, 3, (rows, cols)),
+        ],
+        axis=-1,
+    ).astype(np.uint8)
+
+
+@pytest.mark.parametrize("rows, cols", [(1, 1), (5, 5), (7, 11), (19, 19)])
+def test_get_objects_matches_reference(rows, cols):
+    img_obs = random_img_obs(rows, cols)
+    assert get_objects(img_obs) == get_objects_reference(img_obs)
+
+
+def test_get_objects_fully_observed_env():
+    import minigrid  # noqa
+    import gymnasium as gym
+
+    env = gym.make("MiniGrid-DoorKey-8x8-v0", render_mode=None)
+    env = minigrid.wrappers.FullyObsWrapper(env)
+    obs, _ = env.reset(seed=0)
+    assert get_objects(obs["image"]) == get_objects_reference(obs["image"])
+
+
+def test_get_objects_text():
+    img_obs = np.array(
+        [[[0, 2, 0], [1, 0, 0]], [[4, 0, 1], [5, 4, 0]]],
+        dtype=np.uint8,
+    )
+    assert get_objects(img_obs) == [
+        "unseen at (0, 0)",
+        "red empty at (0, 1)",
+        "closed red door at (1, 0)",
+        "yellow key at (1, 1)",
+    ]
+
+
+def test_get_objects_exclude():
+    img_obs = random_img_obs(9, 9)
+    exclude = ("unseen", "empty", "wall")
+    expected = [
+        text
+        for text in get_objects_reference(img_obs)
+        if text.split(" at ")[0].split(" ")[-1] not in exclude
+    ]
+    assert get_objects(img_obs, exclude=exclude) == expected
+
+
+@pytest.mark.parametrize("exclude", [(), ("unseen", "empty", "wall")])
+def test_get_objects_batch(exclude):
+    img_obs = np.stack([random_img_obs(7, 9, seed) for seed in range(16)])
+    assert get_objects_batch(img_obs, exclude) == [
+        get_objects(obs, exclude) for obs in img_obs
+    ]
+
+
+@pytest.mark.parametrize("exclude", [(), ("unseen", "empty", "wall")])
+def test_get_objects_empty_batch(exclude):
+    img_obs = np.zeros((0, 7, 9, 3), dtype=np.uint8)
+    assert get_objects_batch(img_obs, exclude) == []
+
+
+def test_get_object_array():
+    img_obs = np.stack([random_img_obs(7, 7, seed) for seed in range(4)])
+    exclude = ("unseen", "empty", "wall")
+    objects = get_object_array(img_obs, exclude)
+    texts = get_objects_batch(img_obs, exclude)
+    assert len(objects) == sum(len(t) for t in texts)
+    for env, env_texts in enumerate(texts):
+        records = objects[objects["env"] == env]
+        assert [
+            f"{PREFIX_TABLE[r['type'], r['color'], r['state']]} at ({r['row']}, {r['col']})"
+            for r in records
+        ] == env_texts
+
+
+@pytest.mark.parametrize("size, num_objs", [(6, 2), (8, 3), (12, 5)])
+def test_get_grid_objects(size, num_objs):
+    from minigrid.envs import PutNearEnv
+
+    env = PutNearEnv(size=size, numObjs=num_objs)
+    env.reset(seed=0)
+    objects = get_grid_objects(env.unwrapped.grid)
+    assert len(objects) == num_objs
+    for obj in objects:
+        cell = env.unwrapped.grid.get(obj.x, obj.y)
+        assert (obj.type, obj.color, obj.state) == (cell.type, cell.color, "")
+    assert [(obj.y, obj.x) for obj in objects] == sorted(
+        (obj.y, obj.x) for obj in objects
+    )
+
+
+def test_get_grid_objects_door_state():
+    import minigrid  # noqa
+    import gymnasium as gym
+
+    env = gym.make("MiniGrid-DoorKey-5x5-v0", render_mode=None)
+    env.reset(seed=0)
+    objects = get_grid_objects(env.unwrapped.grid)
+    assert sorted(obj.type for obj in objects) == ["door", "goal", "key"]
+    door = next(obj for obj in objects if obj.type == "door")
+    assert door.state == "locked"
+    assert str(door) == f"{door.color} door at ({door.x}, {door.y})"
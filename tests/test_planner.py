@@ -0,0 +1,120 @@
+from minigrid.core.grid import Grid
+from minigrid.core.world_object import Ball, Door, Key
+
+from gpt_text_gym.envs.minigrid.planner import (
+    Subgoal,
+    decomposition_prompt,
+    describe_scene,
+    parse_plan,
+    scene_signature,
+)
+from gpt_text_gym.envs.minigrid.spatial import SpatialIndex
+from gpt_text_gym.examples import minigrid_tools
+from gpt_text_gym.gpt import FakeLLM, PromptMemo
+
+REPLY = """Thought: the key opens the door.
+Thought: then the ball can be reached.
+
+The objectives are:
+1. Pick up the yellow key.
+2. open the locked door
+3) go to the ball at (4, 2)
+4. find a way out
+"""
+
+
+def make_index(ball_x=4, key_x=1):
+    grid = Grid(7, 5)
+    grid.wall_rect(0, 0, 7, 5)
+    grid.set(key_x, 1, Key("yellow"))
+    grid.set(3, 2, Door("yellow", is_locked=True))
+    grid.set(ball_x, 2, Ball("blue"))
+    grid.set(5, 3, Ball("blue"))
+    return SpatialIndex(grid, (1, 2), 0)
+
+
+def test_decomposition_prompt():
+    prompt = decomposition_prompt("pick up the box", "box\nYou are holding: nothing")
+    assert "The overall mission is: \npick up the box\n" in prompt
+    assert "The environment consists of:\nbox\nYou are holding: nothing\n" in prompt
+    # The template's own "..." are left alone
+    assert "[repeat above any number of times needed...]" in prompt
+
+
+def test_parse_plan():
+    assert parse_plan(REPLY) == [
+        Subgoal("pick up the yellow key", "pick up", "yellow key"),
+        Subgoal("open the locked door", "open", "locked door"),
+        Subgoal("go to the ball at (4, 2)", "go to", "ball", (4, 2)),
+        Subgoal("find a way out"),
+    ]
+    assert parse_plan("1. go to the key\n2. pick up the key") == [
+        Subgoal("go to the key", "go to", "key"),
+        Subgoal("pick up the key", "pick up", "key"),
+    ]
+    assert parse_plan("I cannot help with that.") == []
+
+
+def test_scene_signature():
+    index = make_index()
+    assert describe_scene(index) == (
+        "blue ball at (4, 2)\n"
+        "blue ball at (5, 3)\n"
+        "locked yellow door\n"
+        "yellow key\n"
+        "You are holding: nothing"
+    )
+    # Where the one key is does not matter; where each ball is does
+    assert scene_signature(make_index(key_x=2)) == scene_signature(index)
+    assert scene_signature(make_index(ball_x=5)) != scene_signature(index)
+
+
+def test_plans_are_cached_per_scene(offline_llm, monkeypatch):
+    llm = FakeLLM(
+        rules=[
+            ("intermediate objectives", "The objectives are:\n1. go to the box"),
+            ("Describe the next goal", "explore"),
+        ],
+        default="no",
+    )
+    offline_llm(llm)
+    monkeypatch.setattr(minigrid_tools, "PLAN_CACHE", PromptMemo())
+    env = minigrid_tools.make_env()
+
+    # Seeds 2 and 18 give the same mission and objects, at other positions
+    obs, _ = env.reset(seed=2)
+    plan, goal = minigrid_tools.plan_episode(env, obs)
+    assert (plan, goal, llm.calls) == ([], "go to the box", 1)
+    # Once the plan runs out, the planning agent takes over
+    assert minigrid_tools.next_goal(env, obs, plan, goal) == "explore"
+    assert llm.calls == 2
+
+    obs, _ = env.reset(seed=18)
+    assert minigrid_tools.plan_episode(env, obs)[1] == "go to the box"
+    assert llm.calls == 2
+    assert minigrid_tools.PLAN_CACHE.hits["decomposition_agent"] == 1
+
+    monkeypatch.setattr(minigrid_tools, "PLAN_EPISODES", False)
+    assert minigrid_tools.plan_episode(env, obs) == ([], "explore")
+
+
+def test_unparseable_plans_are_not_cached(offline_llm, monkeypatch):
+    llm = FakeLLM(
+        rules=[
+            ("intermediate objectives", "I cannot help with that."),
+            ("Describe the next goal", "explore"),
+        ],
+        default="no",
+    )
+    offline_llm(llm, memo_size=0)
+    monkeypatch.setattr(minigrid_tools, "PLAN_CACHE", PromptMemo())
+    env = minigrid_tools.make_env()
+
+    obs, _ = env.reset(seed=2)
+    assert minigrid_tools.plan_episode(env, obs) == ([], "explore")
+    assert llm.calls == 2
+    # The same scene is planned again
+    obs, _ = env.reset(seed=18)
+    assert minigrid_tools.plan_episode(env, obs) == ([], "explore")
+    assert llm.calls == 4
+    assert len(minigrid_tools.PLAN_CACHE) == 0
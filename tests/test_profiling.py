@@ -0,0 +1,67 @@
+import json
+import random
+
+from gpt_text_gym import profiling
+from gpt_text_gym.profiling import Histogram, count, get_profiler, timer
+
+
+def test_disabled_by_default():
+    assert get_profiler() is None
+    with timer("env.step"):
+        count("steps")
+    assert get_profiler() is None
+
+
+def test_timers_and_counters():
+    with profiling.profiling() as profiler:
+        for _ in range(3):
+            with timer("env.step"):
+                pass
+            count("steps")
+        count("tokens", 2.5)
+    assert get_profiler() is None
+    assert profiler.timers["env.step"].mean >= 0
+    assert profiler.timers["env.step"].count == 3
+    assert profiler.counters == {"steps": 3, "tokens": 2.5}
+    lines = profiler.summary().splitlines()
+    assert lines[1].split()[:2] == ["env.step", "3"]
+    assert lines[-1].split() == ["tokens", "2.5"]
+
+
+def test_one_timer_per_name():
+    with profiling.profiling() as profiler:
+        assert timer("env.step") is timer("env.step")
+        with timer("llm_wait"):
+            with timer("llm_wait"):
+                pass
+    histogram = profiler.timers["llm_wait"]
+    assert histogram.count == 2
+    assert histogram.max >= histogram.min >= 0
+
+
+def test_histogram_percentiles():
+    rng = random.Random(0)
+    values = sorted(rng.randrange(10**7) for _ in range(10000))
+    histogram = Histogram()
+    for value in values:
+        histogram.record(value)
+    assert histogram.count == len(values)
+    assert (histogram.min, histogram.max) == (values[0], values[-1])
+    for q in (50, 90, 99):
+        exact = values[int(q / 100 * len(values)) - 1]
+        assert abs(histogram.percentile(q) - exact) <= exact / 8
+
+
+def test_chrome_trace(tmp_path):
+    with profiling.profiling(trace_events=True) as profiler:
+        with timer("agent.observe"):
+            with timer("llm_wait"):
+                pass
+    path = tmp_path / "trace.json"
+    profiler.write_chrome_trace(path)
+    events = json.loads(path.read_text())["traceEvents"]
+    assert [event["name"] for event in events] == ["llm_wait", "agent.observe"]
+    inner, outer = events
+    assert outer["ts"] <= inner["ts"]
+    assert inner["ts"] + inner["dur"] <= outer["ts"] + outer["dur"]
+    assert all(event["ph"] == "X" for event in events)
@@ -0,0 +1,66 @@
+import numpy as np
+
+from gpt_text_gym.envs.minigrid.recording import (
+    FrameRecorder,
+    Recording,
+    encode_grid,
+    write_video,
+)
+from gpt_text_gym.examples import minigrid_tools
+from gpt_text_gym.gpt import FakeLLM
+
+ACTIONS = [0, 2, 2, 1, 3, 2, 4, 1, 2]
+
+
+def recorded_env(seed=3):
+    env = FrameRecorder(minigrid_tools.PutNearEnv(size=6, numObjs=2, max_steps=8))
+    env.reset(seed=seed)
+    renders = [env.unwrapped.get_full_render(False, 16)]
+    for action in ACTIONS:
+        _, _, terminated, truncated, _ = env.step(action)
+        renders.append(env.unwrapped.get_full_render(False, 16))
+        if terminated or truncated:
+            env.reset()
+            renders.append(env.unwrapped.get_full_render(False, 16))
+    return env, renders
+
+
+def test_encode_grid():
+    env, _ = recorded_env()
+    grid = env.unwrapped.grid
+    assert np.array_equal(encode_grid(grid), grid.encode())
+
+
+def test_frames_match_env_render(tmp_path):
+    env, renders = recorded_env()
+    recording = env.recording()
+    assert len(recording) == len(renders)
+    assert recording.episode.tolist()[-1] == len(recording.missions) - 1
+    assert recording.step[0] == 0 and recording.step[1] == 1
+    for frame, render in zip(recording.frames(tile_size=16), renders):
+        assert np.array_equal(frame, render)
+
+    path = tmp_path / "frames.npz"
+    recording.save(path)
+    loaded = Recording.load(path)
+    assert loaded.missions == recording.missions
+    assert np.array_equal(loaded.grids, recording.grids)
+    assert np.array_equal(loaded.carrying, recording.carrying)
+
+
+def test_write_png_frames(tmp_path):
+    env, _ = recorded_env()
+    write_video(env.recording(), tmp_path / "frames", tile_size=8)
+    assert len(list((tmp_path / "frames").glob("*.png"))) == len(env.recording())
+
+
+def test_headless_main(tmp_path, offline_llm):
+    llm = offline_llm(
+        FakeLLM(rules=[("Answer the question", "no")], default="go to the key")
+    )
+    path = tmp_path / "run.npz"
+    minigrid_tools.main(max_episodes=2, headless=True, record_path=str(path))
+    recording = Recording.load(path)
+    # Two finished episodes, and the reset after the last one
+    assert len(recording.missions) == 3
+    assert llm.calls > 0
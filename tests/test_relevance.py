@@ -0,0 +1,71 @@
+from minigrid.core.actions import Actions
+
+from gpt_text_gym.envs.minigrid.relevance import EvaluationFilter, classify_goal
+from gpt_text_gym.envs.minigrid.spatial import SpatialIndex
+from gpt_text_gym.examples import minigrid_tools
+from gpt_text_gym.gpt import FakeLLM
+
+
+def test_classify_goal():
+    assert classify_goal("Pick up the red key.") == ("pick up", ("red key",))
+    assert classify_goal("go to the ball at (1, 2)") == ("go to", ("ball",))
+    assert classify_goal("open the locked door") == ("open", ("locked door",))
+    assert classify_goal("put the red key near the blue ball") == (
+        "put near",
+        ("red key", "blue ball"),
+    )
+    assert classify_goal("explore the room") == (None, ())
+
+
+def step(env, action):
+    env.step(action)
+    return SpatialIndex.of(env)
+
+
+def test_turns_do_not_trigger_carrying_goals():
+    env = minigrid_tools.make_env()
+    env.reset(seed=0)
+    name = SpatialIndex.of(env).objects[0].name
+    evaluation_filter = EvaluationFilter(step_budget=3)
+    assert evaluation_filter.should_evaluate(f"pick up the {name}", step(env, 0))
+    for _ in range(3):
+        index = step(env, Actions.left)
+        assert not evaluation_filter.should_evaluate(f"pick up the {name}", index)
+        # A goal that depends on where the agent faces is evaluated
+        assert evaluation_filter.should_evaluate("explore the room", index)
+        assert evaluation_filter.should_evaluate(f"pick up the {name}", index)
+    # A new goal is always evaluated
+    assert evaluation_filter.should_evaluate(f"go to the {name}", index)
+    assert not evaluation_filter.should_evaluate(f"go to the {name}", index)
+    assert evaluation_filter.evaluated == 8 and evaluation_filter.skipped == 4
+
+
+def test_step_budget():
+    env = minigrid_tools.make_env()
+    env.reset(seed=0)
+    index = SpatialIndex.of(env)
+    evaluation_filter = EvaluationFilter(step_budget=2)
+    decisions = [evaluation_filter.should_evaluate("explore", index) for _ in range(7)]
+    assert decisions == [True, False, False, True, False, False, True]
+    evaluation_filter.reset()
+    assert (evaluation_filter.evaluated, evaluation_filter.skipped) == (0, 0)
+    # A budget of 0 evaluates every step
+    assert all(EvaluationFilter(0).should_evaluate("explore", index) for _ in range(3))
+
+
+def test_agent_reports_skipped_evaluations(offline_llm, monkeypatch):
+    llm = offline_llm(FakeLLM(default="no"), memo_size=0)
+    monkeypatch.setattr(minigrid_tools, "PLAN_EPISODES", False)
+    runner = minigrid_tools.EpisodeRunner(
+        minigrid_tools.make_env,
+        minigrid_tools.PutNearAgent,
+        max_steps=30,
+        observe=minigrid_tools.observe_env,
+    )
+    (result,) = runner.run([0])
+    assert result.error is None
+    stats = result.stats
+    assert stats["evaluations"] + stats["evaluations_skipped"] == result.steps
+    assert stats["evaluations_skipped"] > 0
+    # One planning call, then one call per evaluation
+    assert llm.calls == 1 + stats["evaluations"]
@@ -0,0 +1,107 @@
+import asyncio
+import json
+import time
+import gymnasium as gym
+import pytest
+
+from gpt_text_gym.runner import EpisodeAgent, EpisodeRunner, JSONLSink
+
+
+class CountdownEnv(gym.Env):
+    """Terminates after `seed` steps; observations count the steps left"""
+
+    observation_space = gym.spaces.Discrete(100)
+    action_space = gym.spaces.Discrete(2)
+
+    def reset(self, seed=None, options=None):
+        self.left = seed
+        return self.left, {}
+
+    def step(self, action):
+        self.left -= 1
+        return self.left, float(action), self.left == 0, False, {}
+
+
+class SleepyAgent(EpisodeAgent):
+    """Awaits `delay` seconds per action, like an LLM call"""
+
+    def __init__(self, seed, delay=0.0):
+        self.delay = delay
+        self.observed = []
+
+    async def act(self, obs):
+        await asyncio.sleep(self.delay)
+        return 1
+
+    async def observe(self, obs, reward, terminated, truncated):
+        self.observed.append(obs)
+
+    def stats(self):
+        return {"observed": self.observed}
+
+
+class FailingAgent(EpisodeAgent):
+    async def act(self, obs):
+        raise ValueError("Invalid response")
+
+
+def double_obs(env, obs):
+    return 2 * obs
+
+
+def test_episodes_end_on_termination():
+    runner = EpisodeRunner(CountdownEnv, SleepyAgent)
+    results = runner.run([3, 1, 2])
+    assert [result.seed for result in results] == [3, 1, 2]
+    assert [result.steps for result in results] == [3, 1, 2]
+    assert [result.reward for result in results] == [3.0, 1.0, 2.0]
+    assert all(result.terminated and not result.truncated for result in results)
+    assert results[0].stats == {"observed": [2, 1, 0]}
+
+
+def test_max_steps_truncates():
+    results = EpisodeRunner(CountdownEnv, SleepyAgent, max_steps=2).run([5, 1])
+    assert [result.steps for result in results] == [2, 1]
+    assert results[0].truncated and not results[0].terminated
+    assert results[1].terminated
+
+
+def test_episodes_overlap():
+    runner = EpisodeRunner(
+        CountdownEnv, lambda seed: SleepyAgent(seed, delay=0.05), max_concurrency=8
+    )
+    start = time.perf_counter()
+    runner.run([2] * 8)
+    # 8 sequential episodes would take 0.8s
+    assert time.perf_counter() - start < 0.4
+
+
+def test_errors_are_recorded():
+    results = EpisodeRunner(CountdownEnv, lambda seed: FailingAgent()).run([1, 2])
+    assert [result.error for result in results] == ["ValueError: Invalid response"] * 2
+
+
+def test_agents_must_act():
+    class Idle(EpisodeAgent):
+        pass
+
+    with pytest.raises(TypeError):
+        Idle()
+
+
+@pytest.mark.parametrize("num_workers", [0, 2])
+def test_observe_and_workers(num_workers):
+    runner = EpisodeRunner(
+        CountdownEnv, SleepyAgent, num_workers=num_workers, observe=double_obs
+    )
+    results = runner.run([2, 3])
+    assert [result.stats["observed"] for result in results] == [[2, 0], [4, 2, 0]]
+
+
+def test_jsonl_sink(tmp_path):
+    path = tmp_path / "results.jsonl"
+    with JSONLSink(path) as sink:
+        EpisodeRunner(CountdownEnv, SleepyAgent, sink=sink).run([1, 2])
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert sorted(record["seed"] for record in records) == [1, 2]
+    assert all(record["error"] is None for record in records)
@@ -0,0 +1,29 @@
+import pytest
+
+from gpt_text_gym.envs.minigrid.parse_obs import get_objects
+from gpt_text_gym.envs.minigrid.scene import Scene, object_text
+from tests.test_parse_obs import random_img_obs
+
+
+@pytest.mark.parametrize("exclude", [(), ("unseen", "empty", "wall")])
+def test_scene_matches_get_objects(exclude):
+    img_obs = random_img_obs(9, 7)
+    scene = Scene.from_img_obs(img_obs, exclude)
+    expected = get_objects(img_obs, exclude)
+    assert scene.texts() == expected
+    assert list(scene) == expected
+    assert len(scene) == len(expected)
+    assert scene[3] == expected[3]
+    assert str(scene) == "\n".join(expected)
+    assert scene.nbytes == 5 * len(expected)
+
+
+def test_scene_equality():
+    img_obs = random_img_obs(5, 5)
+    assert Scene.from_img_obs(img_obs) == Scene.from_img_obs(img_obs.copy())
+    assert Scene.from_img_obs(img_obs) != Scene.from_img_obs(random_img_obs(5, 5, 1))
+
+
+def test_object_text_is_cached():
+    assert object_text(4, 0, 1) == "closed red door"
+    assert object_text(4, 0, 1) is object_text(4, 0, 1)
@@ -0,0 +1,105 @@
+import numpy as np
+
+from gpt_text_gym.envs.minigrid.parse_obs import get_objects
+from gpt_text_gym.envs.minigrid.scene_diff import IncrementalDescriber
+
+
+def make_img_obs():
+    # 3x3 room: walls around an empty cell, a closed red door and a yellow key
+    img_obs = np.zeros((3, 3, 3), dtype=np.uint8)
+    img_obs[..., 0] = 2
+    img_obs[..., 1] = 5
+    img_obs[1, 1] = (1, 0, 0)
+    img_obs[1, 2] = (4, 0, 1)
+    img_obs[2, 1] = (5, 4, 0)
+    return img_obs
+
+
+def test_incremental_describer_delta():
+    img_obs = make_img_obs()
+    describer = IncrementalDescriber(exclude=("wall", "empty"))
+    assert describer.reset(img_obs) == [
+        "closed red door at (1, 2)",
+        "yellow key at (2, 1)",
+    ]
+
+    img_obs[1, 2, 2] = 0  # open the door
+    img_obs[2, 1] = (1, 0, 0)  # pick up the key
+    img_obs[1, 1] = (6, 2, 0)  # a blue ball appears
+    assert describer.update(img_obs) == [
+        "there is now a blue ball at (1, 1)",
+        "the red door at (1, 2) is now open",
+        "the yellow key at (2, 1) is gone",
+    ]
+    assert describer.objects == get_objects(img_obs, exclude=("wall", "empty"))
+    assert describer.update(img_obs) == []
+
+
+def test_incremental_describer_matches_get_objects():
+    import minigrid  # noqa
+    import gymnasium as gym
+
+    env = gym.make("MiniGrid-DoorKey-6x6-v0", render_mode=None)
+    env = minigrid.wrappers.FullyObsWrapper(env)
+    obs, _ = env.reset(seed=0)
+    env.action_space.seed(0)
+    describer = IncrementalDescriber()
+    describer.reset(obs["image"])
+    for _ in range(50):
+        obs, _, terminated, truncated, _ = env.step(env.action_space.sample())
+        describer.update(obs["image"])
+        assert describer.objects == get_objects(obs["image"])
+        if terminated or truncated:
+            break
+
+
+def test_one_describer_per_env():
+    from minigrid.core.actions import Actions
+    from gpt_text_gym.examples.minigrid_tools import make_env
+
+    env = make_env()
+    env.reset(seed=0)
+    describer = IncrementalDescriber.of(env)
+    assert describer.objects == ["blue key at (1, 4)", "red box at (3, 1)"]
+    env.step(Actions.pickup)
+    env.step(Actions.forward)
+    env.step(Actions.pickup)
+    assert IncrementalDescriber.of(env) is describer
+    assert describer.delta == ["the red box at (3, 1) is gone"]
+    # Asked again within the same step, the delta is kept
+    assert IncrementalDescriber.of(env).delta == ["the red box at (3, 1) is gone"]
+    env.step(Actions.left)
+    assert IncrementalDescriber.of(env).delta == []
+    # A reset starts a new description
+    env.reset(seed=1)
+    assert IncrementalDescriber.of(env).objects == [
+        "purple ball at (1, 1)",
+        "purple box at (1, 4)",
+    ]
+    assert describer.delta == []
+
+
+def test_steps_update_only_the_cells_they_change(monkeypatch):
+    from minigrid.core.actions import Actions
+    from gpt_text_gym.envs.minigrid import recording, scene_diff
+    from gpt_text_gym.examples.minigrid_tools import make_env
+
+    env = make_env()
+    env.reset(seed=0)
+    describer = IncrementalDescriber.of(env)
+
+    def encode_whole_grid(grid):
+        raise AssertionError("the whole grid was encoded")
+
+    monkeypatch.setattr(scene_diff, "encode_grid", encode_whole_grid)
+    env.step(Actions.pickup)
+    env.step(Actions.forward)
+    env.step(Actions.pickup)
+    # Updated by the last step only, without asking for the describer
+    assert describer.delta == ["the red box at (3, 1) is gone"]
+    env.step(Actions.drop)
+    assert IncrementalDescriber.of(env).delta == ["there is now a red box at (3, 1)"]
+    assert describer.objects == get_objects(
+        recording.encode_grid(env.unwrapped.grid),
+        exclude=scene_diff.BACKGROUND_TYPES,
+    )
@@ -0,0 +1,95 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+import openai
+from gpt_text_gym.gpt import RequestScheduler, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_reserve(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate_per_minute=60, capacity=2, clock=clock)
+        self.assertEqual(bucket.reserve(), 0.0)
+        self.assertEqual(bucket.reserve(), 0.0)
+        self.assertAlmostEqual(bucket.reserve(), 1.0)
+        self.assertAlmostEqual(bucket.reserve(), 2.0)
+        clock.now = 10.0
+        self.assertEqual(bucket.reserve(), 0.0)
+
+
+class TestRequestScheduler(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = RequestScheduler(max_retries=3, base_delay=1.0, seed=0)
+        self.rate_limit_error = openai.error.RateLimitError("slow down")
+
+    @patch("time.sleep")
+    def test_retries_transient_errors(self, mock_sleep):
+        fn = MagicMock(side_effect=[self.rate_limit_error, openai.error.Timeout(), 42])
+        self.assertEqual(self.scheduler.call(fn, 1, key="value"), 42)
+        fn.assert_called_with(1, key="value")
+        self.assertEqual(fn.call_count, 3)
+        self.assertEqual(self.scheduler.retries, 2)
+        delays = [call.args[0] for call in mock_sleep.call_args_list]
+        self.assertTrue(0 <= delays[0] <= 1.0 and 0 <= delays[1] <= 2.0)
+
+    @patch("time.sleep")
+    def test_non_retryable_error_raises_immediately(self, mock_sleep):
+        fn = MagicMock(side_effect=openai.error.InvalidRequestError("bad", "param"))
+        with self.assertRaises(openai.error.InvalidRequestError):
+            self.scheduler.call(fn)
+        fn.assert_called_once()
+        mock_sleep.assert_not_called()
+
+    @patch("time.sleep")
+    def test_retry_budget(self, mock_sleep):
+        fn = MagicMock(side_effect=self.rate_limit_error)
+        with self.assertRaises(openai.error.RateLimitError):
+            self.scheduler.call(fn)
+        self.assertEqual(fn.call_count, 4)
+
+    @patch("time.sleep")
+    def test_retry_after_header(self, mock_sleep):
+        error = openai.error.RateLimitError("slow down", headers={"retry-after": "7"})
+        fn = MagicMock(side_effect=[error, "ok"])
+        self.assertEqual(self.scheduler.call(fn), "ok")
+        mock_sleep.assert_called_once_with(7.0)
+
+    @patch("time.sleep")
+    def test_rate_limit(self, mock_sleep):
+        scheduler = RequestScheduler(requests_per_minute=60, tokens_per_minute=600)
+        for bucket in (scheduler.request_bucket, scheduler.token_bucket):
+            bucket.clock, bucket.last = FakeClock(), 0.0
+        scheduler.request_bucket.tokens = 1
+        scheduler.call(lambda: None, tokens=100)
+        mock_sleep.assert_not_called()
+        scheduler.call(lambda: None, tokens=100)
+        mock_sleep.assert_called_once_with(1.0)
+
+
+class TestAsyncRequestScheduler(unittest.IsolatedAsyncioTestCase):
+    @patch("asyncio.sleep")
+    async def test_acall_retries(self, mock_sleep):
+        attempts = []
+
+        async def fn():
+            attempts.append(None)
+            if len(attempts) < 2:
+                raise openai.error.ServiceUnavailableError("busy")
+            return "ok"
+
+        scheduler = RequestScheduler(seed=0)
+        self.assertEqual(await scheduler.acall(fn), "ok")
+        self.assertEqual(len(attempts), 2)
+        mock_sleep.assert_awaited_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
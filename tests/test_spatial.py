@@ -0,0 +1,111 @@
+import pytest
+
+from minigrid.core.grid import Grid
+from minigrid.core.world_object import Ball, Box, Key
+
+from gpt_text_gym.envs.minigrid.parse_obs import GridObject
+from gpt_text_gym.envs.minigrid.spatial import SpatialIndex, resolve_goal
+from gpt_text_gym.examples import minigrid_tools
+from gpt_text_gym.gpt import FakeLLM
+
+
+def make_index(holding_ball=False):
+    grid = Grid(6, 6)
+    grid.wall_rect(0, 0, 6, 6)
+    grid.set(1, 1, Key("red"))
+    grid.set(4, 4, Box("green"))
+    carrying = None
+    if holding_ball:
+        carrying = GridObject("ball", "blue", "", -1, -1)
+    else:
+        grid.set(2, 2, Ball("blue"))
+    # Facing up, towards the red key
+    return SpatialIndex(grid, (1, 2), 3, carrying)
+
+
+def test_lookups():
+    index = make_index()
+    assert index.get_coordinate("The red key.") == (1, 1)
+    assert index.get_coordinate("ball") == (2, 2)
+    assert index.get_coordinate("yellow key") is None
+    assert index.find("agent") == [(1, 2)]
+    assert index.front_pos == (1, 1)
+    assert index.is_facing("red key") and not index.is_facing("ball")
+    assert [obj.name for obj in index.neighbors((1, 2))] == ["red key", "blue ball"]
+    assert index.neighbors((4, 4)) == []
+    # Walls are background, so not indexed
+    assert index.at((0, 0)) is None and index.occupancy.sum() == 3
+
+
+def test_is_next_to():
+    index = make_index()
+    assert index.is_next_to("red key", "blue ball")
+    assert index.is_next_to("key", (2, 2))
+    assert not index.is_next_to("blue ball", "green box")
+    assert index.is_next_to("red key", "purple box") is None
+
+
+@pytest.mark.parametrize(
+    "goal, achieved",
+    [
+        ("Put the red key near the blue ball.", True),
+        ("place the blue ball next to the green box", False),
+        ("is the red key next to the blue ball", True),
+        ("go to the red key", True),
+        ("go to the green box", False),
+        ("pick up the red key", False),
+        ("am I holding the key", False),
+        ("drop the blue ball", True),
+        ("put the purple box near the red key", None),
+        ("explore the room", None),
+    ],
+)
+def test_resolve_goal(goal, achieved):
+    assert resolve_goal(goal, make_index()) is achieved
+
+
+def test_resolve_goal_while_carrying():
+    index = make_index(holding_ball=True)
+    assert resolve_goal("pick up the blue ball", index) is True
+    # Carried objects are not near anything until dropped
+    assert resolve_goal("put the blue ball near the red key", index) is False
+    assert resolve_goal("is the ball next to the key", index) is None
+
+
+def test_evaluation_agent_resolves_locally(offline_llm, monkeypatch):
+    llm = offline_llm(FakeLLM(default="no"))
+    env = minigrid_tools.make_env()
+    obs, _ = env.reset(seed=0)
+    name = SpatialIndex.of(env).objects[0].name
+    assert minigrid_tools.evaluation_agent(env, obs, f"pick up the {name}") == "no"
+    assert llm.calls == 0
+    assert minigrid_tools.evaluation_agent(env, obs, "explore the room") == "no"
+    assert llm.calls == 1
+
+    monkeypatch.setattr(minigrid_tools, "RESOLVE_GOALS_LOCALLY", False)
+    minigrid_tools.evaluation_agent(env, obs, f"pick up the {name}")
+    assert llm.calls == 2
+
+
+def test_tools_use_the_index():
+    env = minigrid_tools.make_env()
+    obs, _ = env.reset(seed=0)
+    obs = minigrid_tools.observe_env(env, obs)
+    first, second = obs["index"].objects[:2]
+    response = (
+        f'next tool to use: is_next_to(get_coordinate("{first.name}"), '
+        f'get_coordinate("{second.name}"))'
+    )
+    expected = obs["index"].is_next_to(first.name, second.name)
+    assert minigrid_tools.run_tool_choice(obs, response).endswith(f"is {expected}.")
+
+
+@pytest.mark.parametrize("name", ["yellow key", "wall"])
+def test_tools_report_unknown_objects(name):
+    # Absent (or ambiguous) objects are reported back to the model
+    obs = {"index": make_index()}
+    response = f'next tool to use: is_next_to(get_coordinate("{name}"), (1, 1))'
+    assert minigrid_tools.run_tool_choice(obs, response) == (
+        f"The call is_next_to(get_coordinate('{name}'), (1, 1)) failed:"
+        f" there is no single object called '{name}'."
+    )
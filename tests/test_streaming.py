@@ -0,0 +1,101 @@
+import unittest
+from unittest.mock import patch
+from gpt_text_gym.gpt import (
+    GPTChatCompleter,
+    Message,
+    complete_stream,
+    match_line,
+    match_prefix,
+)
+
+
+def make_chunks(deltas, consumed):
+    """Fake streaming response recording how many chunks were read"""
+    for delta in deltas:
+        consumed.append(delta)
+        yield {"choices": [{"delta": {"content": delta}}]}
+
+
+async def make_achunks(deltas, consumed):
+    for chunk in make_chunks(deltas, consumed):
+        yield chunk
+
+
+class TestEarlyStop(unittest.TestCase):
+    def test_match_prefix(self):
+        early_stop = match_prefix(("yes", "no", "need more information"))
+        self.assertIsNone(early_stop(" Ne"))
+        self.assertEqual(early_stop(" Need more information"), "need more information")
+        self.assertEqual(early_stop("No"), "no")
+
+    def test_match_line(self):
+        early_stop = match_line(r"next tool to use: (.*)")
+        self.assertIsNone(early_stop("we need the key.\nNext tool to use: get_coo"))
+        self.assertEqual(
+            early_stop("we need the key.\nNext tool to use: f(1)\nmore"),
+            "we need the key.\nNext tool to use: f(1)",
+        )
+
+    def test_complete_stream_cancels(self):
+        consumed = []
+
+        def deltas():
+            for delta in ["Y", "es", ", because", " of", " reasons"]:
+                consumed.append(delta)
+                yield delta
+
+        stream = deltas()
+        self.assertEqual(complete_stream(stream, match_prefix(("yes",))), "yes")
+        self.assertEqual(consumed, ["Y", "es"])
+        self.assertIsNone(next(stream, None))
+
+    def test_complete_stream_without_early_stop(self):
+        self.assertEqual(complete_stream(iter(["a", "b"])), "ab")
+
+
+class TestStreamingGPTChatCompleter(unittest.IsolatedAsyncioTestCase):
+    deltas = ["No", ", the", " key", " is", " still", " on", " the", " floor"]
+
+    @patch("dotenv.get_key", return_value="dummy_api_key")
+    def test_generate_chat_completion_early_stop(self, mock_get_key):
+        consumed = []
+        chat_completer = GPTChatCompleter()
+        chat_completer.add_message(Message("user", "Is the goal achieved?"))
+        with patch(
+            "openai.ChatCompletion.create",
+            return_value=make_chunks(self.deltas, consumed),
+        ) as mock_create:
+            reply = chat_completer.generate_chat_completion(
+                early_stop=match_prefix(("yes", "no"))
+            )
+        self.assertEqual(reply, Message("assistant", "no"))
+        self.assertEqual(consumed, ["No"])
+        self.assertTrue(mock_create.call_args.kwargs["stream"])
+
+    @patch("dotenv.get_key", return_value="dummy_api_key")
+    def test_stream_chat_completion(self, mock_get_key):
+        chat_completer = GPTChatCompleter()
+        with patch(
+            "openai.ChatCompletion.create",
+            return_value=make_chunks(self.deltas, []),
+        ):
+            self.assertEqual(list(chat_completer.stream_chat_completion()), self.deltas)
+
+    @patch("dotenv.get_key", return_value="dummy_api_key")
+    async def test_agenerate_chat_completion_early_stop(self, mock_get_key):
+        consumed = []
+        chat_completer = GPTChatCompleter()
+
+        async def fake_acreate(**kwargs):
+            return make_achunks(self.deltas, consumed)
+
+        with patch("openai.ChatCompletion.acreate", side_effect=fake_acreate):
+            reply = await chat_completer.agenerate_chat_completion(
+                early_stop=match_prefix(("yes", "no"))
+            )
+        self.assertEqual(reply.content, "no")
+        self.assertEqual(consumed, ["No"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+import pytest
+
+from typing import Optional, Tuple
+
+from gpt_text_gym.examples import minigrid_tools
+from gpt_text_gym.gpt import FakeLLM
+from gpt_text_gym.tools import ToolCall, ToolError, ToolRegistry
+
+TOOLS = ToolRegistry()
+
+
+@TOOLS.tool()
+def position(positions: dict, name: str) -> Tuple[int, int]:
+    positions["lookups"] = positions.get("lookups", 0) + 1
+    return positions[name]
+
+
+@TOOLS.tool("distance")
+def manhattan(positions: dict, a: Tuple[int, int], b: Tuple[int, int]) -> int:
+    return abs(a[0] - b[0]) + abs(a[1] - b[1])
+
+
+@TOOLS.tool()
+def scale(positions: dict, value: float, factor: Optional[float] = None) -> float:
+    return value * (2 if factor is None else factor)
+
+
+def test_describe():
+    assert TOOLS.describe() == (
+        "position(name: str) -> Tuple[int, int], "
+        "distance(a: Tuple[int, int], b: Tuple[int, int]) -> int, "
+        "scale(value: float, factor: Optional[float] = None) -> float"
+    )
+
+
+def test_parse():
+    reply = (
+        "Rationale: we need both positions.\n"
+        'Next tool to use: `distance(position("key"), b=[1, 2])`.\n'
+        "Next tool to use: scale(1.5, 3), scale(2, None)"
+    )
+    assert TOOLS.parse(reply) == [
+        ToolCall("distance", (ToolCall("position", ("key",)), (1, 2))),
+        ToolCall("scale", (1.5, 3)),
+        ToolCall("scale", (2, None)),
+    ]
+    assert TOOLS.parse("scale(2)") == TOOLS.parse("scale(factor=None, value=2)")
+    assert str(TOOLS.parse(reply)[0]) == "distance(position('key'), (1, 2))"
+    assert TOOLS.parse('position("key")') == [ToolCall("position", ("key",))]
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        'eval("1 + 1")',
+        '__import__("os").system("true")',
+        "position(name)",
+        'position("key", "ball")',
+        "distance((1, 2))",
+        'position(label="key")',
+        "position({'a': 1})",
+        "(1, 2)",
+        "position(",
+    ],
+)
+def test_parse_rejects(text):
+    with pytest.raises(ToolError):
+        TOOLS.parse(text)
+
+
+def test_session_memoizes_and_batches():
+    positions = {"key": (1, 1), "ball": [4, 5]}
+    session = TOOLS.session(positions)
+    results = session.run_reply(
+        'distance(position("key"), position("ball")), position("key"), '
+        'position("box"), distance(position("ball"), 7), scale(1)'
+    )
+    assert [result.value for result in results] == [7, (1, 1), None, None, 2]
+    assert [result.error is None for result in results] == [
+        True,
+        True,
+        False,
+        False,
+        True,
+    ]
+    assert str(results[0]) == (
+        "The result of distance(position('key'), position('ball')) is 7."
+    )
+    assert str(results[3]).startswith("The call distance(position('ball'), 7) failed")
+    # key, ball and box looked up once each, though key and ball are used twice
+    assert positions["lookups"] == 3
+    assert session.hits == 2
+
+
+@pytest.fixture
+def offline(offline_llm, monkeypatch):
+    # Every goal goes to the evaluation agent
+    monkeypatch.setattr(minigrid_tools, "RESOLVE_GOALS_LOCALLY", False)
+    return offline_llm
+
+
+def test_evaluation_agent_uses_tools(offline):
+    llm = offline(
+        FakeLLM(
+            rules=[
+                ("The result of is_next_to", "yes"),
+                (
+                    "Identify the appropriate tool",
+                    "Next tool to use: is_next_to((1, 1), (2, 2))",
+                ),
+            ],
+            default="need more information",
+        )
+    )
+    env = minigrid_tools.make_env()
+    obs, _ = env.reset(seed=0)
+    assert minigrid_tools.evaluation_agent(env, obs, "explore") == "yes"
+    # evaluation, tool choice, evaluation with the tool's result
+    assert llm.calls == 3
+
+
+def test_evaluation_agent_limits_tool_rounds(offline, monkeypatch):
+    llm = offline(FakeLLM(default="need more information"))
+    monkeypatch.setattr(minigrid_tools, "MAX_TOOL_ROUNDS", 2)
+    env = minigrid_tools.make_env()
+    obs, _ = env.reset(seed=0)
+    assert minigrid_tools.evaluation_agent(env, obs, "explore") == "no"
+    # Three evaluations and two tool choices, whose replies name no tool
+    assert llm.calls == 5
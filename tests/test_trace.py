@@ -0,0 +1,192 @@
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import openai
+from gpt_text_gym.gpt import (
+    FakeLLM,
+    GPTChatCompleter,
+    Message,
+    RequestScheduler,
+    TraceWriter,
+    disable_tracing,
+    load_trace,
+    openai_chat_completion_acreate,
+    openai_chat_completion_create,
+    openai_chat_completion_stream,
+    summarize_trace,
+    trace_context,
+    tracing,
+)
+from gpt_text_gym.gpt.trace import get_tracer
+
+MESSAGES = [{"role": "user", "content": "Has the goal been achieved?"}]
+
+
+class TestTraceWriter(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.dir.name) / "trace.jsonl"
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_buffers_until_flush(self):
+        with TraceWriter(self.path, buffer_size=3, flush_interval=60) as writer:
+            writer.write({"idx": 0})
+            writer.write({"idx": 1})
+            writer.flush()
+            self.assertEqual(load_trace(self.path), [{"idx": 0}, {"idx": 1}])
+            for idx in range(2, 5):
+                writer.write({"idx": idx})
+        self.assertEqual(
+            [entry["idx"] for entry in load_trace(self.path)], [0, 1, 2, 3, 4]
+        )
+        self.assertEqual(writer.records, 5)
+
+    def test_flush_after_close(self):
+        writer = TraceWriter(self.path, flush_interval=60)
+        writer.write({"idx": 0})
+        writer.close()
+        # Returns instead of waiting for the stopped writer thread
+        writer.flush()
+        writer.close()
+        self.assertEqual(load_trace(self.path), [{"idx": 0}])
+
+
+class TestTracing(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.dir.name) / "trace.jsonl"
+        self.llm = FakeLLM(default="no")
+
+    def tearDown(self):
+        disable_tracing()
+        self.dir.cleanup()
+
+    def create(self, **kwargs):
+        return openai_chat_completion_create(
+            model="gpt-4",
+            messages=MESSAGES,
+            n=1,
+            temperature=0,
+            max_tokens=None,
+            backend=self.llm,
+            **kwargs,
+        )
+
+    def test_disabled_by_default(self):
+        self.assertIsNone(get_tracer())
+        with trace_context(agent="planning_agent"):
+            self.create()
+        self.assertFalse(self.path.exists())
+
+    def test_records_requests(self):
+        with tracing(self.path):
+            with trace_context(agent="planning_agent", episode=3):
+                with trace_context(step=7):
+                    self.create()
+            self.create()
+        self.assertIsNone(get_tracer())
+        first, second = load_trace(self.path)
+        self.assertEqual(
+            (first["agent"], first["episode"], first["step"]),
+            ("planning_agent", 3, 7),
+        )
+        self.assertNotIn("agent", second)
+        self.assertEqual(first["prompt_hash"], second["prompt_hash"])
+        self.assertEqual(first["model"], "gpt-4")
+        self.assertEqual(first["retries"], 0)
+        self.assertFalse(first["cache_hit"])
+        self.assertFalse(first["stream"])
+        self.assertEqual(
+            first["prompt_tokens"] + first["completion_tokens"],
+            self.llm.prompt_tokens / 2 + self.llm.completion_tokens / 2,
+        )
+        self.assertGreaterEqual(first["latency"], 0.0)
+
+    @patch("time.sleep")
+    def test_counts_retries(self, mock_sleep):
+        create = self.llm.create
+        errors = [openai.error.RateLimitError("slow down")] * 2
+
+        def flaky(**params):
+            if errors:
+                raise errors.pop()
+            return create(**params)
+
+        self.llm.create = flaky
+        with tracing(self.path):
+            self.create(scheduler=RequestScheduler(seed=0))
+        self.assertEqual(load_trace(self.path)[0]["retries"], 2)
+
+    @patch("time.sleep")
+    def test_records_failed_requests(self, mock_sleep):
+        def overloaded(**params):
+            raise openai.error.RateLimitError("slow down")
+
+        self.llm.create = overloaded
+        with tracing(self.path):
+            with self.assertRaises(openai.error.RateLimitError):
+                self.create(scheduler=RequestScheduler(max_retries=2, seed=0))
+        (entry,) = load_trace(self.path)
+        self.assertEqual(entry["retries"], 2)
+        self.assertEqual(entry["error"], "RateLimitError: slow down")
+        self.assertEqual(entry["completion_tokens"], 0)
+        self.assertGreaterEqual(entry["latency"], 0.0)
+
+    def test_streamed_requests(self):
+        self.llm.default = "need more information"
+        with tracing(self.path):
+            deltas = openai_chat_completion_stream(
+                model="gpt-4",
+                messages=MESSAGES,
+                temperature=0,
+                max_tokens=None,
+                backend=self.llm,
+            )
+            self.assertEqual(next(deltas), "need")
+            deltas.close()
+        (entry,) = load_trace(self.path)
+        self.assertTrue(entry["stream"])
+        self.assertEqual(entry["completion_tokens"], 2)
+
+    def test_async_contexts_are_per_task(self):
+        async def episode(idx):
+            with trace_context(episode=idx):
+                await asyncio.sleep(0.01 * (2 - idx))
+                return await openai_chat_completion_acreate(
+                    model="gpt-4",
+                    messages=MESSAGES,
+                    n=1,
+                    temperature=0,
+                    max_tokens=None,
+                    backend=self.llm,
+                )
+
+        async def run():
+            return await asyncio.gather(episode(0), episode(1))
+
+        with tracing(self.path):
+            asyncio.run(run())
+        self.assertEqual([entry["episode"] for entry in load_trace(self.path)], [1, 0])
+
+    def test_batches_and_summary(self):
+        completer = GPTChatCompleter(backend=self.llm)
+        conversations = [[Message(role="user", content=str(idx))] for idx in range(3)]
+        with tracing(self.path):
+            with trace_context(agent="evaluation_agent"):
+                completer.generate_batch_chat_completions(conversations)
+            with trace_context(agent="planning_agent"):
+                self.create()
+        records = load_trace(self.path)
+        self.assertEqual(len(records), 4)
+        lines = summarize_trace(records).splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(any(line.startswith("evaluation_agent") for line in lines))
+
+
+if __name__ == "__main__":
+    unittest.main()
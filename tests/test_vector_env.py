@@ -0,0 +1,94 @@
+import gymnasium as gym
+import numpy as np
+
+from gpt_text_gym.envs.minigrid.recording import encode_grid
+from gpt_text_gym.envs.minigrid.vector import PutNearVectorEnv
+from gpt_text_gym.examples.minigrid_tools import PutNearEnv
+
+NUM_ENVS = 8
+
+
+def make_env():
+    return PutNearEnv(size=6, numObjs=2, max_steps=20)
+
+
+def test_steps_match_put_near_env():
+    """Same states and actions give the same transitions, step for step"""
+    references = [make_env() for _ in range(NUM_ENVS)]
+    vector_env = PutNearVectorEnv(NUM_ENVS, size=6, numObjs=2, max_steps=20)
+    vector_env.reset(seed=0)
+    seeds = iter(range(10**6))
+    for index, env in enumerate(references):
+        env.reset(seed=next(seeds))
+        vector_env.load_state(index, env)
+
+    rng = np.random.default_rng(0)
+    rewarded = wrong_pickups = 0
+    for _ in range(1500):
+        actions = rng.integers(0, 7, NUM_ENVS)
+        obs, rewards, terminated, truncated, info = vector_env.step(actions)
+        for index, env in enumerate(references):
+            expected = env.step(int(actions[index]))
+            done = terminated[index] or truncated[index]
+            observation = (
+                info["final_observation"][index]
+                if done
+                else {key: value[index] for key, value in obs.items()}
+            )
+            assert np.array_equal(observation["image"], expected[0]["image"])
+            assert observation["direction"] == expected[0]["direction"]
+            assert observation["mission"] == expected[0]["mission"]
+            assert np.isclose(rewards[index], expected[1])
+            assert (terminated[index], truncated[index]) == expected[2:4]
+            rewarded += expected[1] > 0
+            wrong_pickups += expected[2] and actions[index] == 3
+            if done:
+                env.reset(seed=next(seeds))
+                vector_env.load_state(index, env)
+            else:
+                assert np.array_equal(vector_env.grid[index], encode_grid(env.grid))
+    # Both endings were exercised
+    assert rewarded > 0 and wrong_pickups > 0
+
+
+def test_generated_layouts():
+    vector_env = PutNearVectorEnv(64, size=6, numObjs=3)
+    obs, info = vector_env.reset(seed=1)
+    assert info == {}
+    assert obs["image"].shape == (64, 7, 7, 3) and obs["direction"].shape == (64,)
+    assert vector_env.observation_space["image"].contains(obs["image"])
+    for index in range(64):
+        grid = vector_env.grid[index]
+        cells = np.argwhere(np.isin(grid[..., 0], (5, 6, 7)))
+        assert len(cells) == 3
+        assert len({tuple(grid[x, y, :2]) for x, y in cells}) == 3
+        # No two objects next to each other
+        for a in range(3):
+            for b in range(a):
+                assert np.abs(cells[a] - cells[b]).max() > 1
+        x, y = vector_env.agent_pos[index]
+        assert grid[x, y, 0] == 1
+        assert tuple(vector_env.target_pos[index]) in {tuple(cell) for cell in cells}
+        assert obs["mission"][index].startswith("put the ")
+
+
+def test_autoreset_matches_sync_vector_env():
+    vector_env = PutNearVectorEnv(NUM_ENVS, max_steps=3)
+    sync_env = gym.vector.SyncVectorEnv([lambda: PutNearEnv(max_steps=3)] * NUM_ENVS)
+    vector_env.reset(seed=0)
+    sync_env.reset(seed=0)
+    actions = np.zeros(NUM_ENVS, dtype=np.int64)
+    for _ in range(3):
+        ours = vector_env.step(actions)
+        theirs = sync_env.step(actions)
+    assert set(ours[0]) == set(theirs[0])
+    for key in ("image", "direction"):
+        assert ours[0][key].shape == theirs[0][key].shape
+        assert ours[0][key].dtype == theirs[0][key].dtype
+    assert isinstance(ours[0]["mission"], tuple)
+    assert ours[3].all() and theirs[3].all()
+    assert set(ours[4]) == set(theirs[4])
+    assert ours[4]["_final_observation"].all()
+    # The returned observations start new episodes
+    assert (vector_env.step_count == 0).all()
+    assert vector_env.single_action_space == sync_env.single_action_space